@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "user",
     "router",
     "services"
@@ -111,6 +112,7 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": ["user.authentication.JWTAuthentication"],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
 }
@@ -133,6 +135,31 @@ JWT_ALGORITHM = "HS256"
 
 
 JWT_EXPIRATION_DELTA = timedelta(minutes=480)
+
+# Lead list totals are cached this many seconds; any write to a lead invalidates them
+LEAD_COUNT_CACHE_TTL = 30
+# count=estimate falls back to an exact count below this many estimated rows
+LEAD_COUNT_ESTIMATE_THRESHOLD = 10000
+# followup tab counts are cached this many seconds for polling clients; followup writes invalidate them
+FOLLOWUP_COUNT_CACHE_TTL = 5
+# dotted path of the function API responses are encoded with; None uses orjson when installed
+JSON_RENDERER = None
+# divisions, subdivisions, branches, roles and dealers are kept in process memory (user/refdata.py).
+# Writes bump a version in the cache; with a cache shared between processes every process sees the
+# bump at once, otherwise a process picks up other processes' writes after the TTL. An id missing
+# from the local copy is always checked against the database before it is treated as missing.
+REFERENCE_CACHE_TTL = 300
+# also store the loaded rows in the cache so processes share them instead of each querying once
+REFERENCE_CACHE_SHARED = False
+# user_id -> (status, role, dealer) of authenticated requests is cached per process (user/authentication.py).
+# A user's save invalidates their entry through the cache; without a shared CACHES backend other
+# processes only see the change when the entry expires, so keep this short.
+PRINCIPAL_CACHE_TTL = 10
+PRINCIPAL_CACHE_SIZE = 4096
+# a running import job whose worker has not reported for this long is handed to another worker
+IMPORT_JOB_LEASE_SECONDS = 300
+# each process picks up tokens revoked by other processes within this many seconds
+REVOCATION_REFRESH_SECONDS = 2
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
@@ -0,0 +1,71 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Followup
+
+
+#Lead columns a calendar card shows, next to the followup's own
+AGENDA_FIELDS = {
+    'followup_id': "followup_id",
+    'followup_date': "followup_date",
+    'followup_type': "followup_type",
+    'followup_remarks': "followup_remarks",
+    'lead_id': "lead_id",
+    'name': "lead__name",
+    'contact': "lead__contact",
+    'company_name': "lead__company_name",
+    'city': "lead__city",
+    'lead_type': "lead__lead_type",
+}
+
+AGENDA_WINDOWS = ("today", "week", "overdue")
+OPEN_FOLLOWUP_TYPES = ("pending", "overdue")
+
+
+def parse_agenda_date(value):
+    try:
+        return datetime.fromisoformat(value).date()
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date {value!r}, use YYYY-MM-DD.")
+
+
+#(start, end) of the requested window. from=/to= (inclusive dates) take precedence over window=,
+#which defaults to today. overdue is everything open and due before now.
+def agenda_window(params):
+    midnight = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    if params.get("from") or params.get("to"):
+        start = end = None
+        if params.get("from"):
+            start = timezone.make_aware(datetime.combine(parse_agenda_date(params["from"]), time.min))
+        if params.get("to"):
+            end = timezone.make_aware(datetime.combine(parse_agenda_date(params["to"]), time.min)) + timedelta(days=1)
+        return start, end
+
+    window = params.get("window", "today")
+    if window == "today":
+        return midnight, midnight + timedelta(days=1)
+    if window == "week":
+        return midnight, midnight + timedelta(days=7)
+    if window == "overdue":
+        return None, timezone.now()
+    raise ValueError(f"Unknown window. Use one of: {', '.join(AGENDA_WINDOWS)}")
+
+
+#A user's followups in [start, end) ordered by time, a range scan of the followup_user_date index
+def agenda_queryset(user_id, start=None, end=None, followup_types=None):
+    followups = Followup.objects.filter(user_id=user_id, followup_date__isnull=False)
+    if start is not None:
+        followups = followups.filter(followup_date__gte=start)
+    if end is not None:
+        followups = followups.filter(followup_date__lt=end)
+    if followup_types:
+        followups = followups.filter(followup_type__in=followup_types)
+    return followups.order_by(F("followup_date").asc(), "followup_id").values(*AGENDA_FIELDS.values())
+
+
+#Rows of the agenda, read in chunks through a server-side cursor
+def agenda_rows(followups, chunk_size=500):
+    for row in followups.iterator(chunk_size=chunk_size):
+        yield {field: row[path] for field, path in AGENDA_FIELDS.items()}
@@ -0,0 +1,61 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from user.refdata import reference_version
+from .lead_list import filter_signature
+from .models import Lead
+
+
+#Weak ETag and Last-Modified of one page of a lead list, from the page's keyset (lead_id,
+#created_at, updated_at rows as paginate_leads returns them) and one aggregate over the followups
+#and logs of those leads, plus the filter signature and the query string.
+#The list total is only mixed in when the response carries an exact one (page= mode), so cursor=
+#and count=estimate keep skipping the COUNT. Nothing comes from a per-process cache, so a write
+#through any worker changes the tag.
+def list_validators(request, leads, page, meta):
+    lead_ids = [row["lead_id"] for row in page]
+    related = Lead.objects.filter(pk__in=lead_ids).aggregate(
+        followup_count=Count("followups", distinct=True),
+        followups_modified=Max("followups__updated_at"),
+        log_count=Count("lead_logs", distinct=True),
+        logs_modified=Max("lead_logs__entry_date"),
+    )
+    total = None if meta.get("count_is_estimate") else meta.get("total_leads")
+    last_modified = max(
+        [row["updated_at"] for row in page if row["updated_at"]] +
+        [related[key] for key in ("followups_modified", "logs_modified") if related[key]],
+        default=None,
+    )
+    keyset = [(row["lead_id"], row["updated_at"]) for row in page]
+    params = sorted(request.GET.lists())
+    raw = f"{filter_signature(leads)}|{total}|{keyset}|{sorted(related.items())}|{params}"
+    etag = f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
+    return etag, (int(last_modified.timestamp()) if last_modified else None)
+
+
+#Validators of a reference-data list from its version stamp and rows, no query is run
+def reference_validators(request, table, rows):
+    params = sorted(request.GET.lists())
+    raw = f"{table}|{reference_version(table)}|{params}"
+    etag = f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
+    last_modified = max((row.updated_at for row in rows if row.updated_at), default=None)
+    return etag, (int(last_modified.timestamp()) if last_modified else None)
+
+
+#304 Not Modified when the client already holds this version, else None
+def not_modified(request, etag, last_modified):
+    if request.method not in ("GET", "HEAD"):
+        return None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+#Attaches the validators; no-cache makes clients revalidate instead of reusing the body blindly
+def with_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,245 @@
+import csv
+import io
+
+from django.db import connection, transaction
+
+from user.models import Users
+from .imports_helper.helper import normalize_lead_type
+from .lead_import import IMPORT_COLUMNS, missing_import_columns
+from .lead_list import bump_lead_list_generation
+from .models import AssignToUser, Branch, Division, Followup, Lead, LeadLog, LeadVisibility, SubDivision
+
+
+STAGING_TABLE = "lead_import_staging"
+
+#lead_import.EMAIL_PATTERN with the trailing hyphen moved, Postgres reads "9-." as a range
+EMAIL_PATTERN = r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9.-]+$"
+
+#Whole-number ids as the spreadsheet may have written them ("3" or "3.0"), anything else is no id
+ID_SQL = "CASE WHEN s.{col} ~ '^\\d{{1,9}}(\\.0+)?$' THEN split_part(s.{col}, '.', 1)::int END"
+
+#Checks in the order the row-by-row importer ran them, the first failing one is kept
+VALIDATIONS = [
+    ("name IS NULL", "Name is required"),
+    ("contact_digits IS NULL OR length(contact_digits) <> 10", "Contact number must be 10 digits"),
+    (None, "Contact number already exists"),
+    (f"email IS NULL OR email !~ '{EMAIL_PATTERN}'", "Invalid email format"),
+    ("gender IS NULL OR lower(gender) NOT IN ('male', 'female')", "Gender must be male or female"),
+    ("(tentetive_visit_date IS NOT NULL AND services_try_timestamptz(tentetive_visit_date) IS NULL) OR "
+     "(tentetive_purchase_date IS NOT NULL AND services_try_timestamptz(tentetive_purchase_date) IS NULL)",
+     "Invalid tentetive date, use YYYY-MM-DD or YYYY-MM-DD HH:MM"),
+]
+
+
+#Staging column per CSV column: known import columns keep their name, others are loaded and ignored
+def staging_columns(header):
+    columns, seen = [], set()
+    for i, name in enumerate(header):
+        columns.append(name if name in IMPORT_COLUMNS and name not in seen else f"ignored_{i}")
+        seen.add(name)
+    return columns
+
+
+#Text lines of an uploaded or opened CSV, bytes decoded as UTF-8 with or without a BOM
+def text_lines(file):
+    if isinstance(file.read(0), bytes):
+        return io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    return file
+
+
+#Rows of the CSV rewritten for COPY, one line each with exactly `width` fields plus the error
+#column. COPY aborts the whole load on one bad line, so the shape is fixed here instead:
+#blank lines are skipped as read_csv skips them (and do not count as rows), short rows are
+#padded, NUL characters (which Postgres text cannot hold) are dropped and a row with more
+#fields than the header is loaded empty with its error, to be reported like any other rejection.
+def copy_lines(reader, width):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for fields in reader:
+        if not fields or (len(fields) == 1 and not fields[0].strip()):
+            continue
+        if len(fields) > width:
+            row = [""] * width + [f"Row has {len(fields)} fields, the header has {width}"]
+        else:
+            row = [field.replace("\x00", "") for field in fields] + [""] * (width - len(fields)) + [""]
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+#Read-only file over an iterator of text lines, what copy_expert pulls the data from
+class LineReader:
+    def __init__(self, lines):
+        self.lines = lines
+        self.pending = ""
+
+    def read(self, size=-1):
+        parts, length = [self.pending], len(self.pending)
+        while size < 0 or length < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            parts.append(line)
+            length += len(line)
+        data = "".join(parts)
+        if size < 0:
+            self.pending = ""
+            return data
+        self.pending = data[size:]
+        return data[:size]
+
+
+#High-volume import: the CSV is streamed with COPY into a temporary (unlogged, session-private)
+#staging table, validated and deduplicated with set-based UPDATEs and written with INSERT ... SELECT.
+#Everything runs in one transaction. Returns (rows imported, [{"row", "message"} of rejected rows]).
+def copy_import_leads(file, created_by_id):
+    reader = csv.reader(text_lines(file))
+    header = [name.strip().lstrip("\ufeff") for name in next(reader, [])]
+    missing = missing_import_columns(header)
+    if missing:
+        raise ValueError(f"Column {missing[0]} not found in file")
+    columns = staging_columns(header)
+    extra = [col for col in IMPORT_COLUMNS if col not in columns]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                row_no bigint GENERATED ALWAYS AS IDENTITY (MINVALUE 0 START WITH 0),
+                {", ".join(f'"{col}" text' for col in columns + extra)},
+                contact_digits text, lead_type_normalized text, error text,
+                lead_id integer, followup_id integer
+            ) ON COMMIT DROP
+        """)
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({', '.join(f'{chr(34)}{col}{chr(34)}' for col in columns)}, error) "
+            "FROM STDIN WITH (FORMAT csv)",
+            LineReader(copy_lines(reader, len(columns))),
+        )
+
+        validate_staging(cursor)
+        imported = insert_staged_leads(cursor, int(created_by_id))
+
+        cursor.execute(f"SELECT row_no, error FROM {STAGING_TABLE} WHERE error IS NOT NULL ORDER BY row_no")
+        rejected = [{"row": row, "message": message} for row, message in cursor.fetchall()]
+        cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+
+    if imported:
+        transaction.on_commit(bump_lead_list_generation)
+    return imported, rejected
+
+
+def validate_staging(cursor):
+    # blank and "null" cells count as empty, like clean_values
+    cursor.execute(f"""
+        UPDATE {STAGING_TABLE} SET {", ".join(f"{col} = NULLIF(NULLIF(trim({col}), ''), 'null')" for col in IMPORT_COLUMNS)}
+    """)
+    cursor.execute(f"""
+        UPDATE {STAGING_TABLE}
+        SET contact_digits = NULLIF(regexp_replace(regexp_replace(contact, '\\.0+$', ''), '\\D', '', 'g'), '')
+    """)
+    cursor.execute(f"CREATE INDEX ON {STAGING_TABLE} (contact_digits)")
+    cursor.execute(f"ANALYZE {STAGING_TABLE}")
+
+    for condition, message in VALIDATIONS:
+        if condition is None:
+            mark_duplicate_contacts(cursor, message, [c for c, m in VALIDATIONS if c])
+            continue
+        cursor.execute(f"UPDATE {STAGING_TABLE} SET error = %s WHERE error IS NULL AND ({condition})", [message])
+
+    # lead_type goes through the same normalization as Lead.save, computed once per distinct spelling
+    cursor.execute(f"SELECT DISTINCT lead_type FROM {STAGING_TABLE} WHERE error IS NULL")
+    spellings = [row[0] for row in cursor.fetchall()]
+    if spellings:
+        cursor.execute(f"""
+            UPDATE {STAGING_TABLE} s SET lead_type_normalized = CASE
+                WHEN lower(s.is_customer) = 'true' THEN 'completed' ELSE m.normalized END
+            FROM (SELECT unnest(%s::text[]) AS spelling, unnest(%s::text[]) AS normalized) m
+            WHERE s.error IS NULL AND s.lead_type IS NOT DISTINCT FROM m.spelling
+        """, [spellings, [normalize_lead_type(spelling) for spelling in spellings]])
+
+
+#A contact is taken when a stored lead has it, or an earlier row of the file that passes every
+#other check has it (that row is the one imported)
+def mark_duplicate_contacts(cursor, message, conditions):
+    # one window pass over the staged rows, an OR of correlated EXISTS would rescan the table per row
+    cursor.execute(f"""
+        UPDATE {STAGING_TABLE} s SET error = %s
+        FROM (
+            SELECT row_no, contact_digits, min(row_no) FILTER (
+                WHERE NOT ({" OR ".join(f"coalesce({c}, true)" for c in conditions)})
+            ) OVER (PARTITION BY contact_digits) AS first_row
+            FROM {STAGING_TABLE} WHERE error IS NULL
+        ) w
+        WHERE s.row_no = w.row_no AND (
+            w.first_row < w.row_no
+            OR EXISTS (SELECT 1 FROM {Lead._meta.db_table} l WHERE l.contact_normalized = w.contact_digits)
+        )
+    """, [message])
+
+
+def insert_staged_leads(cursor, created_by_id):
+    lead, followup = Lead._meta.db_table, Followup._meta.db_table
+    cursor.execute(f"""
+        WITH inserted AS (
+            INSERT INTO {lead} (
+                name, contact, contact_normalized, email, gender, address, is_customer, lead_type,
+                source, category, pan_vat, company_name, city, landmark, subbranch,
+                tentetive_visit_date, tentetive_purchase_date, division_id, subdivision_id, branch_id,
+                assign_to_id, created_by_id, created_at, updated_at
+            )
+            SELECT s.name, s.contact_digits::bigint, s.contact_digits, s.email, lower(s.gender), s.address,
+                   coalesce(lower(s.is_customer) = 'true', false), s.lead_type_normalized,
+                   s.source, s.category, s.pan_vat, s.company_name, s.city, s.landmark, s.subbranch,
+                   services_try_timestamptz(s.tentetive_visit_date), services_try_timestamptz(s.tentetive_purchase_date),
+                   d.division_id, sd.subdivision_id, b.branch_id, u.user_id, %s, now(), now()
+            FROM {STAGING_TABLE} s
+            LEFT JOIN {Division._meta.db_table} d ON d.division_id = {ID_SQL.format(col="division")}
+            LEFT JOIN {SubDivision._meta.db_table} sd ON sd.subdivision_id = {ID_SQL.format(col="subdivision")}
+            LEFT JOIN {Branch._meta.db_table} b ON b.branch_id = {ID_SQL.format(col="branch")}
+            LEFT JOIN {Users._meta.db_table} u ON u.user_id = {ID_SQL.format(col="assign_to")}
+            WHERE s.error IS NULL
+            ORDER BY s.row_no
+            RETURNING lead_id, contact_normalized
+        )
+        UPDATE {STAGING_TABLE} s SET lead_id = i.lead_id
+        FROM inserted i WHERE s.error IS NULL AND s.contact_digits = i.contact_normalized
+    """, [created_by_id])
+    imported = cursor.rowcount
+
+    # accepted contacts are unique, so each staged row owns exactly one new lead and at most one followup
+    cursor.execute(f"""
+        WITH inserted AS (
+            INSERT INTO {followup} (lead_id, user_id, followup_date, followup_type, followup_remarks, entry_date, updated_at)
+            SELECT s.lead_id, %s, services_try_timestamptz(s.followup_date), s.followup_type, s.followup_remarks,
+                   now(), now()
+            FROM {STAGING_TABLE} s
+            WHERE s.lead_id IS NOT NULL AND s.followup_type IS NOT NULL AND s.followup_remarks IS NOT NULL
+              AND s.followup_date ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}} \\d{{2}}:\\d{{2}}$'
+              AND services_try_timestamptz(s.followup_date) IS NOT NULL
+            RETURNING followup_id, lead_id
+        )
+        UPDATE {STAGING_TABLE} s SET followup_id = i.followup_id FROM inserted i WHERE s.lead_id = i.lead_id
+    """, [created_by_id])
+    cursor.execute(f"""
+        INSERT INTO {LeadLog._meta.db_table} (lead_id, user_id, remarks, followup_id, entry_date)
+        SELECT lead_id, %s, remarks, followup_id, now() FROM {STAGING_TABLE}
+        WHERE lead_id IS NOT NULL AND remarks IS NOT NULL
+    """, [created_by_id])
+    cursor.execute(f"""
+        INSERT INTO {AssignToUser._meta.db_table} (lead_id, user_id, created_at, updated_at)
+        SELECT l.lead_id, l.assign_to_id, now(), now() FROM {lead} l
+        JOIN {STAGING_TABLE} s ON s.lead_id = l.lead_id
+        WHERE l.assign_to_id IS NOT NULL
+    """)
+    # creator and assignee of the new leads, see services.visibility
+    cursor.execute(f"""
+        INSERT INTO {LeadVisibility._meta.db_table} (lead_id, user_id)
+        SELECT s.lead_id, %s FROM {STAGING_TABLE} s WHERE s.lead_id IS NOT NULL
+        UNION
+        SELECT l.lead_id, l.assign_to_id FROM {lead} l
+        JOIN {STAGING_TABLE} s ON s.lead_id = l.lead_id
+        WHERE l.assign_to_id IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """, [created_by_id])
+    return imported
@@ -0,0 +1,102 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from user.models import Users
+from .lead_list import bump_lead_list_generation
+from .models import Followup, LeadLog
+
+
+BATCH_FOLLOWUP_LIMIT = 1000
+FOLLOWUP_OPERATIONS = ("complete", "reschedule", "reassign")
+
+
+def parse_followup_date(value):
+    try:
+        followup_date = Followup._meta.get_field("followup_date").to_python(value)
+    except ValidationError:
+        followup_date = None
+    if followup_date is None:
+        raise ValueError("followup_date is required, use YYYY-MM-DD HH:MM")
+    if timezone.is_naive(followup_date):
+        followup_date = timezone.make_aware(followup_date)
+    return followup_date
+
+
+#Applies one operation to a loaded followup and returns (changed fields, log remarks).
+#Everything is validated before the followup is touched.
+def apply_operation(followup, operation, users):
+    op = operation.get("op")
+    if op == "complete":
+        followup.followup_type = "completed"
+        followup.status = "completed"
+        followup.completed_at = followup.completed_at or timezone.now()
+        if "notes" in operation:
+            followup.notes = operation["notes"]
+        return {"followup_type", "status", "completed_at", "notes"}, "Followup completed"
+
+    if op == "reschedule":
+        if followup.followup_type == "completed":
+            raise ValueError("Followup is already completed")
+        followup.followup_date = parse_followup_date(operation.get("followup_date"))
+        followup.followup_type = "pending"
+        if "followup_remarks" in operation:
+            followup.followup_remarks = operation["followup_remarks"]
+        return {"followup_date", "followup_type", "followup_remarks"}, \
+            f"Followup rescheduled to {followup.followup_date:%Y-%m-%d %H:%M}"
+
+    if op == "reassign":
+        user = users.get(str(operation.get("user_id")))
+        if user is None:
+            raise ValueError("User not found")
+        followup.user_id = user[0]
+        return {"user"}, f"Followup reassigned to {user[1]}"
+
+    raise ValueError(f"Unknown op. Use one of: {', '.join(FOLLOWUP_OPERATIONS)}")
+
+
+#Applies a list of {"op", "followup_id", ...} operations in one transaction: the followups and
+#users are loaded in one query each, the changes go out in one bulk_update and the lead logs in
+#one bulk_create. Returns one result per operation; failed operations leave their followup as it was.
+def apply_followup_operations(operations, user_id):
+    results = []
+    with transaction.atomic():
+        followup_ids = {str(operation.get("followup_id")) for operation in operations if isinstance(operation, dict)}
+        followups = Followup.objects.select_for_update().in_bulk(
+            [int(followup_id) for followup_id in followup_ids if followup_id.isdigit()]
+        )
+        user_ids = [str(operation.get("user_id")) for operation in operations
+                    if isinstance(operation, dict) and operation.get("op") == "reassign"]
+        users = {
+            str(pk): (pk, full_name) for pk, full_name in
+            Users.objects.filter(user_id__in=[pk for pk in user_ids if pk.isdigit()]).values_list("user_id", "full_name")
+        }
+
+        changed, fields, logs = {}, {"updated_at"}, []
+        now = timezone.now()
+        for index, operation in enumerate(operations):
+            followup_id = operation.get("followup_id") if isinstance(operation, dict) else None
+            try:
+                if not isinstance(operation, dict):
+                    raise ValueError("Operation must be an object")
+                followup = followups.get(int(followup_id)) if str(followup_id).isdigit() else None
+                if followup is None:
+                    raise ValueError("Followup not found")
+                operation_fields, remarks = apply_operation(followup, operation, users)
+            except ValueError as e:
+                results.append({"index": index, "followup_id": followup_id, "success": False, "message": str(e)})
+                continue
+
+            followup.updated_at = now
+            changed[followup.pk] = followup
+            fields |= operation_fields
+            logs.append(LeadLog(lead_id=followup.lead_id, user_id=user_id, followup=followup, remarks=remarks))
+            results.append({"index": index, "followup_id": followup.pk, "success": True, "message": remarks})
+
+        if changed:
+            Followup.objects.bulk_update(changed.values(), sorted(fields))
+            LeadLog.objects.bulk_create(logs)
+            # the bulk writes bypass the signals that invalidate the lead lists. Bumped once the
+            # transaction commits, or another request could cache counts from before these writes
+            transaction.on_commit(bump_lead_list_generation)
+    return results
@@ -0,0 +1,138 @@
+from datetime import date, datetime, time
+
+import openpyxl
+import pandas as pd
+from openpyxl import load_workbook
+
+from .lead_import import IMPORT_CHUNK_SIZE
+
+try:
+    from openpyxl.worksheet._reader import DATA_TAG, ROW_TAG, WorkSheetParser
+    from openpyxl.xml.functions import iterparse
+except ImportError:
+    WorkSheetParser = None
+
+
+XLSX_EXTENSIONS = (".xlsx", ".xlsm")
+
+#openpyxl releases xlsx_rows' own row loop was checked against; requirements.txt pins one of them.
+#Any other release, or one without those internals, is read through the public iter_rows.
+ROW_PARSER_VERSIONS = ("3.1.",)
+
+
+def is_xlsx(name):
+    return (name or "").lower().endswith(XLSX_EXTENSIONS)
+
+
+#Cell value as read_csv(dtype=str) would have read it from the same sheet saved as CSV:
+#whole numbers without ".0", dates as YYYY-MM-DD HH:MM, empty cells as None
+def xlsx_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return str(value)
+
+
+#Header cells as column names, blank and repeated names renamed the way read_csv does
+def xlsx_columns(cells):
+    columns, seen = [], {}
+    for i, cell in enumerate(cells):
+        name = (xlsx_text(cell) or "").strip() or f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+#Cell values of each row of the first sheet. On the releases in ROW_PARSER_VERSIONS this is
+#ReadOnlyWorksheet.iter_rows(values_only=True) without its one leak: openpyxl clears every parsed
+#<row> but leaves it attached to <sheetData>, about 90 bytes a row, so here each row is detached
+#once parsed. It drives openpyxl's private WorkSheetParser, hence the version check.
+def xlsx_rows(workbook):
+    sheet = workbook.worksheets[0]
+    if WorkSheetParser is None or not openpyxl.__version__.startswith(ROW_PARSER_VERSIONS):
+        for row in sheet.iter_rows(values_only=True):
+            yield list(row)
+        return
+
+    with sheet._get_source() as src:
+        parser = WorkSheetParser(src, sheet._shared_strings, data_only=True, epoch=workbook.epoch,
+                                 date_formats=workbook._date_formats, timedelta_formats=workbook._timedelta_formats)
+        sheet_data = None
+        for event, element in iterparse(src, events=("start", "end")):
+            if event == "start":
+                if element.tag == DATA_TAG:
+                    sheet_data = element
+                continue
+            if element.tag != ROW_TAG:
+                continue
+            _, cells = parser.parse_row(element)
+            parser.row_dimensions.clear()
+            if sheet_data is not None:
+                sheet_data.remove(element)
+            values = []
+            for cell in cells:
+                values.extend([None] * (cell["column"] - 1 - len(values)))
+                values.append(cell["value"])
+            yield values
+
+
+#Streams the first sheet of a workbook as DataFrames of chunk_size text rows. The sheet is parsed
+#as it is iterated, so no more than one chunk of rows is held at a time (openpyxl still loads the
+#shared-string table, one copy of each distinct text). Blank rows are skipped like read_csv does
+#and the index counts data rows across chunks.
+def read_xlsx_chunks(file, chunk_size=IMPORT_CHUNK_SIZE):
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = xlsx_rows(workbook)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = xlsx_columns(header)
+        width, start, chunk = len(columns), 0, []
+        for row in rows:
+            values = [xlsx_text(value) for value in row[:width]]
+            if not any(values):
+                continue
+            chunk.append(values + [None] * (width - len(values)))
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=columns, index=range(start, start + len(chunk)), dtype="object")
+                start, chunk = start + len(chunk), []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns, index=range(start, start + len(chunk)), dtype="object")
+    finally:
+        workbook.close()
+
+
+#Rows of an uploaded lead file, CSV or XLSX by its name, in chunks numbered from 0
+def read_import_chunks(file, name, chunk_size=IMPORT_CHUNK_SIZE):
+    if is_xlsx(name):
+        yield from read_xlsx_chunks(file, chunk_size)
+        return
+    for chunk in pd.read_csv(file, dtype=str, chunksize=chunk_size):
+        if len(chunk):
+            yield chunk
+
+
+#Column names of an uploaded lead file, the file is rewound for the import that follows
+def read_import_header(file, name):
+    if is_xlsx(name):
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            columns = xlsx_columns(next(xlsx_rows(workbook), []))
+        finally:
+            workbook.close()
+    else:
+        columns = list(pd.read_csv(file, dtype=str, nrows=0).columns)
+    file.seek(0)
+    return columns
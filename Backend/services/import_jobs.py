@@ -0,0 +1,124 @@
+import csv
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .import_files import read_import_chunks
+from .lead_import import IMPORT_CHUNK_SIZE, LeadImporter, missing_import_columns
+from .models import ImportJob
+
+
+#Claims the oldest queued job, or a running one whose worker stopped renewing its heartbeat.
+#SKIP LOCKED lets several workers poll at once without waiting on, or taking, a job another
+#worker is claiming.
+def claim_import_job():
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.IMPORT_JOB_LEASE_SECONDS)
+    with transaction.atomic():
+        job = ImportJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status="queued") | Q(status="running", heartbeat_at__lt=stale)
+        ).order_by("created_at", "importjob_id").first()
+        if job is None:
+            return None
+        job.status = "running"
+        job.started_at = job.started_at or now
+        job.heartbeat_at = now
+        job.save(update_fields=["status", "started_at", "heartbeat_at", "updated_at"])
+    return job
+
+
+#Raised when another worker reclaimed the job, this worker stops without touching it further
+class ImportLeaseLost(Exception):
+    pass
+
+
+def read_job_chunks(job, chunk_size):
+    job.file.open("rb")
+    try:
+        yield from read_import_chunks(job.file, job.file.name, chunk_size)
+    finally:
+        job.file.close()
+
+
+#Imports a claimed job in one pass, chunk by chunk. Each chunk commits together with its progress
+#and heartbeat, so a reclaimed job resumes after the rows its previous worker committed; the
+#progress update only applies while processed_rows is still what this worker last wrote, which
+#fences off a worker that lost its lease. Rejected rows stream to a temporary file that is stored
+#as the error file at the end (rows rejected by a worker that died are counted but not listed).
+def run_import_job(job, chunk_size=IMPORT_CHUNK_SIZE):
+    processed = job.processed_rows
+    with tempfile.TemporaryFile("w+", newline="") as errors:
+        writer = None
+        try:
+            importer = LeadImporter(job.created_by_id, chunk_size=chunk_size)
+            for chunk in read_job_chunks(job, chunk_size):
+                missing = missing_import_columns(chunk.columns)
+                if missing:
+                    raise ValueError(f"Column {missing[0]} not found in file")
+                chunk = chunk[chunk.index >= processed]
+                if chunk.empty:
+                    continue
+
+                with transaction.atomic():
+                    results = importer.import_frame(chunk)
+                    rejected = {result["row"]: result["message"] for result in results if not result.get("success")}
+                    now = timezone.now()
+                    updated = ImportJob.objects.filter(pk=job.pk, status="running", processed_rows=processed).update(
+                        processed_rows=processed + len(chunk),
+                        accepted_rows=F("accepted_rows") + len(chunk) - len(rejected),
+                        rejected_rows=F("rejected_rows") + len(rejected),
+                        heartbeat_at=now,
+                        updated_at=now,
+                    )
+                    if not updated:
+                        raise ImportLeaseLost()
+                processed += len(chunk)
+
+                if rejected:
+                    if writer is None:
+                        writer = csv.writer(errors)
+                        writer.writerow(["row", *chunk.columns, "error"])
+                    for row, values in chunk.loc[list(rejected)].iterrows():
+                        writer.writerow([row, *values.fillna("").tolist(), rejected[row]])
+            job.refresh_from_db()
+            job.status = "completed"
+            job.total_rows = job.processed_rows
+            job.message = f"{job.accepted_rows} of {job.total_rows} rows imported"
+        except ImportLeaseLost:
+            job.refresh_from_db()
+            return job
+        except Exception as e:
+            job.refresh_from_db()
+            job.status = "failed"
+            job.message = str(e)
+
+        if writer is not None:
+            errors.seek(0)
+            job.error_file.save(f"import_{job.pk}_errors.csv", File(errors), save=False)
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+#Progress of a job as the polling endpoint returns it
+def import_job_row(job):
+    return {
+        'importjob_id': job.importjob_id,
+        'status': job.status,
+        'total_rows': job.total_rows,
+        'processed_rows': job.processed_rows,
+        'accepted_rows': job.accepted_rows,
+        'rejected_rows': job.rejected_rows,
+        # the row total is only known once the file has been read through
+        'progress': {"queued": 0.0, "completed": 100.0}.get(job.status),
+        'has_error_file': bool(job.error_file),
+        'message': job.message,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
@@ -1,5 +1,6 @@
+import re
 from datetime import datetime
-from pickle import NONE
+from user.refdata import reference_get, reference_table
 
 
 #Normalizes empty/null strings to None
@@ -18,11 +19,42 @@ def parsed_date(date_str):
     except ValueError:
         return None
 
-#Retrieves a foreign key instance from the database
+#Retrieves a foreign key instance, reference tables looked up by primary key come from memory
 def get_fk_instance(model, lookup_field, value):
     try:
         if not value:
-            return NONE
+            return None
+        table = reference_table(model)
+        if table and lookup_field == model._meta.pk.name:
+            return reference_get(table, value)
         return model.objects.get(**{lookup_field: value})
     except model.DoesNotExist:
-        return NONE
\ No newline at end of file
+        return None
+
+#Digits-only form of a phone number used for lookups and duplicate checks.
+#Country codes and separators are dropped by keeping the last 10 digits.
+def normalize_phone(value):
+    if value in [None, "", "null"]:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    digits = re.sub(r"\D", "", str(value))
+    return digits[-10:] or None
+
+#Canonical lead_type behind the stage lists. Legacy spellings collapse onto the four choices
+#by exact alias ("incomplete" is not completed), empty values, "pending" and "raw ..." count
+#as raw, anything else is kept lowercased.
+def normalize_lead_type(value):
+    value = clean_values(value)
+    if value is None:
+        return "raw"
+    key = re.sub(r"[\s_-]+", " ", str(value)).strip().lower()
+    if key in ("complete", "completed"):
+        return "completed"
+    if key in ("", "raw", "pending") or key.startswith("raw "):
+        return "raw"
+    if key.replace(" ", "") == "beforevisit":
+        return "before visit"
+    if key.replace(" ", "") == "aftervisit":
+        return "after visit"
+    return key
@@ -0,0 +1,550 @@
+import base64
+import hashlib
+import json
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.core.cache import cache
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db import connection
+from django.db.models import Case, Count, Exists, F, OuterRef, Prefetch, Q, Subquery, When
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .imports_helper.helper import normalize_phone
+from .models import Lead, LeadLog, Followup
+
+
+LEAD_PAGE_SIZE = 20
+
+#Newest first; keyset cursors seek on exactly these columns
+LEAD_ORDERING = (F("created_at").desc(nulls_last=True), F("lead_id").desc())
+LEAD_REVERSE_ORDERING = (F("created_at").asc(nulls_first=True), F("lead_id").asc())
+
+
+#Builds the queryset every lead list view pages over.
+#Relations are joined and the latest log / followup are correlated subqueries,
+#so a page costs the same handful of queries whatever its size.
+def lead_list_queryset(leads=None, with_followups=False, with_latest_followup=False, followups_queryset=None):
+    if leads is None:
+        leads = Lead.objects.all()
+
+    latest_log = LeadLog.objects.filter(lead=OuterRef("pk")).order_by("-entry_date", "-leadlog_id")
+    leads = leads.defer("search_vector").select_related(
+        "branch", "division", "subdivision", "assign_to", "created_by"
+    ).annotate(
+        latest_log_id=Subquery(latest_log.values("leadlog_id")[:1]),
+        latest_log_remarks=Subquery(latest_log.values("remarks")[:1]),
+        latest_log_entry_date=Subquery(latest_log.values("entry_date")[:1]),
+        latest_log_user=Subquery(latest_log.values("user__full_name")[:1]),
+    )
+
+    if with_latest_followup:
+        latest_followup = Followup.objects.filter(lead=OuterRef("pk")).order_by("-followup_date", "-followup_id")
+        leads = leads.annotate(
+            latest_followup_id=Subquery(latest_followup.values("followup_id")[:1]),
+            latest_followup_date=Subquery(latest_followup.values("followup_date")[:1]),
+            latest_followup_type=Subquery(latest_followup.values("followup_type")[:1]),
+            latest_followup_remarks=Subquery(latest_followup.values("followup_remarks")[:1]),
+            latest_followup_entry_date=Subquery(latest_followup.values("entry_date")[:1]),
+        )
+
+    if followups_queryset is not None:
+        leads = leads.prefetch_related(Prefetch("followups", queryset=followups_queryset))
+    elif with_followups:
+        leads = leads.prefetch_related("followups")
+
+    return order_leads(leads)
+
+
+#Followups of one type as the followup lists show them: today's first, then newest first
+def followups_of_type(followup_type):
+    return Followup.objects.filter(followup_type=followup_type).select_related("user").order_by(
+        Case(When(followup_date__date=timezone.now().date(), then=0), default=1),
+        F("followup_date").desc(nulls_last=True),
+        "-followup_id",
+    )
+
+
+#Leads with at least one followup of a type, an EXISTS over the followup_lead_type_date index
+def leads_with_followup_type(leads, followup_type):
+    return leads.filter(Exists(Followup.objects.filter(lead=OuterRef("pk"), followup_type=followup_type)))
+
+
+#List ordering; ranked searches sort by rank first
+def order_leads(leads):
+    if "search_rank" in leads.query.annotations:
+        return leads.order_by("-search_rank", *LEAD_ORDERING)
+    return leads.order_by(*LEAD_ORDERING)
+
+
+#Stage of the lead lists and the exact predicate behind it. lead_type is kept
+#normalized by Lead.save(), so these all hit the lead_type_created index.
+LEAD_STAGES = {
+    "raw": Q(lead_type="raw"),
+    "before_visit": Q(lead_type="before visit"),
+    "after_visit": Q(lead_type="after visit"),
+    "completed": Q(lead_type="completed"),
+    "customer": Q(is_customer=True),
+}
+
+
+def stage_leads(stage, leads=None):
+    if stage not in LEAD_STAGES:
+        raise ValueError(f"Unknown stage. Use one of: {', '.join(LEAD_STAGES)}")
+    if leads is None:
+        leads = Lead.objects.all()
+    return leads.filter(LEAD_STAGES[stage])
+
+
+#Ranked search over name, company, city, landmark and subbranch.
+#Whole words hit the search vector, partial words the trigram indexes.
+def search_leads(leads, q):
+    query = SearchQuery(q, config="simple", search_type="websearch")
+    return leads.filter(
+        Q(search_vector=query) |
+        Q(name__icontains=q) |
+        Q(company_name__icontains=q) |
+        Q(city__icontains=q) |
+        Q(landmark__icontains=q) |
+        Q(subbranch__icontains=q)
+    ).annotate(
+        search_rank=SearchRank(F("search_vector"), query) + TrigramSimilarity("name", q)
+    )
+
+
+#Search filters shared by every lead list endpoint
+def filter_leads(leads, params):
+    if q := params.get("q", "").strip():
+        leads = search_leads(leads, q)
+    if name := params.get("name"):
+        leads = leads.filter(name__icontains=name)
+    if contact := normalize_phone(params.get("contact")):
+        leads = leads.filter(contact_normalized__startswith=contact)
+    if city := params.get("city"):
+        leads = leads.filter(city__icontains=city)
+    if division_id := params.get("division_id"):
+        leads = leads.filter(division__division_id=division_id)
+    if subdivision_id := params.get("subdivision_id"):
+        leads = leads.filter(subdivision__subdivision_id=subdivision_id)
+    if assign_to := params.get("assign_to"):
+        leads = leads.filter(assign_to__user_id=assign_to)
+    if branch_id := params.get("branch_id"):
+        leads = leads.filter(branch__branch_id=branch_id)
+    return leads
+
+
+LEAD_LIST_GENERATION_KEY = "lead_list_generation"
+
+
+#Generation stamp of the lead lists, part of every cached count key
+def lead_list_generation():
+    generation = cache.get(LEAD_LIST_GENERATION_KEY)
+    if generation is None:
+        cache.add(LEAD_LIST_GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(LEAD_LIST_GENERATION_KEY)
+    return generation
+
+
+#Called on every write that can change a lead list; orphans all cached counts
+def bump_lead_list_generation():
+    try:
+        cache.incr(LEAD_LIST_GENERATION_KEY)
+    except ValueError:
+        cache.set(LEAD_LIST_GENERATION_KEY, time.time_ns(), None)
+
+
+#Normalized signature of the filters of a lead queryset. Only the pk is selected, so the
+#joins and annotations the list adds for its rows do not change it.
+def filter_signature(leads):
+    sql, params = leads.order_by().values("pk").query.sql_with_params()
+    return hashlib.sha1(f"{sql}|{params!r}".encode()).hexdigest()
+
+
+#Exact count of a lead queryset, cached per filter signature until the TTL runs out or a lead is written
+def cached_lead_count(leads):
+    key = f"lead_count:{lead_list_generation()}:{filter_signature(leads)}"
+    count = cache.get(key)
+    if count is None:
+        count = leads.count()
+        cache.set(key, count, settings.LEAD_COUNT_CACHE_TTL)
+    return count
+
+
+#Planner row estimate for a lead queryset, no rows are read
+def estimate_lead_count(leads):
+    sql, params = leads.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+#Buckets of the followup tabs, each a filtered COUNT of the same grouped query
+FOLLOWUP_BUCKETS = {
+    'all': None,
+    **{followup_type: Q(followup_type=followup_type) for followup_type in ("overdue", "pending", "completed")},
+    **{f"status_{status}": Q(status=status) for status in ("pending", "in_progress", "completed", "cancelled")},
+}
+
+#group_by= of the followup counts -> grouped column
+FOLLOWUP_COUNT_GROUPS = {
+    'user': "user_id",
+    'branch': "lead__branch_id",
+    'division': "lead__division_id",
+}
+
+
+#Followup counts per bucket, narrowed by user_id/branch_id/division_id and optionally grouped by
+#user, branch or division, in one aggregate query cached for FOLLOWUP_COUNT_CACHE_TTL seconds
+def followup_counts(params):
+    group_by = params.get("group_by")
+    if group_by and group_by not in FOLLOWUP_COUNT_GROUPS:
+        raise ValueError(f"Unknown group_by. Use one of: {', '.join(FOLLOWUP_COUNT_GROUPS)}")
+    filters = {
+        column: params[param]
+        for param, column in (("user_id", "user_id"), ("branch_id", "lead__branch_id"), ("division_id", "lead__division_id"))
+        if params.get(param)
+    }
+    key = "followup_counts:{}:{}".format(
+        lead_list_generation(), hashlib.sha1(json.dumps([group_by, filters], sort_keys=True).encode()).hexdigest()
+    )
+    counts = cache.get(key)
+    if counts is not None:
+        return counts
+
+    followups = Followup.objects.filter(**filters)
+    aggregates = {bucket: Count("followup_id", filter=q) for bucket, q in FOLLOWUP_BUCKETS.items()}
+    if group_by:
+        column = FOLLOWUP_COUNT_GROUPS[group_by]
+        rows = followups.values(column).annotate(**aggregates).order_by(column)
+        counts = [{f"{group_by}_id": row.pop(column), **row} for row in rows]
+    else:
+        counts = followups.aggregate(**aggregates)
+    cache.set(key, counts, settings.FOLLOWUP_COUNT_CACHE_TTL)
+    return counts
+
+
+class LeadPaginator(Paginator):
+    def __init__(self, object_list, per_page, estimate=False):
+        super().__init__(object_list, per_page)
+        self.estimate = estimate
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        if self.estimate:
+            # small estimates are unreliable and cheap to count exactly
+            estimated = estimate_lead_count(self.object_list)
+            if estimated >= settings.LEAD_COUNT_ESTIMATE_THRESHOLD:
+                self.count_is_estimate = True
+                return estimated
+        return cached_lead_count(self.object_list)
+
+
+#Pages a lead queryset and returns the page with the pagination keys of the response.
+#Passing cursor= switches to keyset pagination, otherwise page= is used.
+#count=estimate reports the planner estimate as the total on large lists.
+#With strict=True an out of range page raises EmptyPage instead of returning an empty page.
+def paginate_leads(leads, params, per_page=LEAD_PAGE_SIZE, strict=False):
+    if "cursor" in params:
+        if "search_rank" in leads.query.annotations:
+            raise ValueError("cursor pagination is not available for q= searches, use page=")
+        return cursor_paginate_leads(leads, params.get("cursor"), int(per_page))
+
+    page = params.get("page", 1)
+    paginator = LeadPaginator(leads, per_page, estimate=params.get("count") == "estimate")
+
+    try:
+        leads_page = paginator.page(page)
+    except PageNotAnInteger:
+        leads_page = paginator.page(1)
+    except EmptyPage:
+        if strict:
+            raise
+        leads_page = []
+
+    meta = {
+        'total_pages': paginator.num_pages,
+        'total_leads': paginator.count,
+        'current_page': int(page),
+    }
+    if paginator.count_is_estimate:
+        meta['count_is_estimate'] = True
+    return leads_page, meta
+
+
+#Opaque cursor for the (created_at, lead_id) position of a lead, either a model or a sparse values() row
+def encode_cursor(lead, direction):
+    if isinstance(lead, dict):
+        created_at, lead_id = lead["created_at"], lead["lead_id"]
+    else:
+        created_at, lead_id = lead.created_at, lead.lead_id
+    created_at = created_at.isoformat() if created_at else None
+    raw = json.dumps([created_at, lead_id, direction], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, lead_id, direction = json.loads(raw)
+        if direction not in ("next", "prev"):
+            raise ValueError
+        return (datetime.fromisoformat(created_at) if created_at else None), int(lead_id), direction
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+#Keyset pagination: seeks past the cursor position instead of counting and offsetting,
+#so every page costs the same. An empty cursor returns the first page.
+def cursor_paginate_leads(leads, cursor, per_page):
+    if not cursor:
+        rows = list(leads.order_by(*LEAD_ORDERING)[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        return rows, {
+            'next_cursor': encode_cursor(rows[-1], "next") if has_more else None,
+            'prev_cursor': None,
+            'page_size': per_page,
+        }
+
+    created_at, lead_id, direction = decode_cursor(cursor)
+    if direction == "next":
+        if created_at is None:
+            branches = [Q(created_at__isnull=True, lead_id__lt=lead_id)]
+        else:
+            branches = [after_key(created_at, lead_id), Q(created_at__isnull=True)]
+        rows = seek_leads(leads, branches, LEAD_ORDERING, per_page + 1)
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        return rows, {
+            'next_cursor': encode_cursor(rows[-1], "next") if has_more else None,
+            'prev_cursor': encode_cursor(rows[0], "prev") if rows else None,
+            'page_size': per_page,
+        }
+
+    if created_at is None:
+        branches = [Q(created_at__isnull=True, lead_id__gt=lead_id), Q(created_at__isnull=False)]
+    else:
+        branches = [before_key(created_at, lead_id)]
+    rows = seek_leads(leads, branches, LEAD_REVERSE_ORDERING, per_page + 1)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page][::-1]
+    return rows, {
+        'next_cursor': encode_cursor(rows[-1], "next") if rows else None,
+        'prev_cursor': encode_cursor(rows[0], "prev") if has_more else None,
+        'page_size': per_page,
+    }
+
+
+#Rows after (created_at, lead_id) in list order. The outer created_at__lte bounds the index range
+#on lead_created_order, the OR alone would only be a filter over every row before the cursor.
+def after_key(created_at, lead_id):
+    return Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(created_at=created_at, lead_id__lt=lead_id))
+
+
+#Mirror of after_key for the prev direction
+def before_key(created_at, lead_id):
+    return Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(created_at=created_at, lead_id__gt=lead_id))
+
+
+#Up to limit rows from each branch in turn. The branches are consecutive ranges of the ordering
+#(dated rows, then the NULL created_at tail), each one an index range scan of its own; the next
+#branch is only read when the page is not full yet.
+def seek_leads(leads, branches, ordering, limit):
+    rows = []
+    for branch in branches:
+        rows += leads.filter(branch).order_by(*ordering)[:limit - len(rows)]
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+#Keys a fields= request may ask for, mapped to the values() path behind each.
+#Relations are flattened to the one column a list row shows of them.
+SPARSE_LEAD_FIELDS = {
+    'lead_id': 'lead_id',
+    'name': 'name',
+    'contact': 'contact',
+    'subbranch': 'subbranch',
+    'address': 'address',
+    'email': 'email',
+    'gender': 'gender',
+    'city': 'city',
+    'landmark': 'landmark',
+    'lead_type': 'lead_type',
+    'source': 'source',
+    'category': 'category',
+    'pan_vat': 'pan_vat',
+    'company_name': 'company_name',
+    'tentetive_visit_date': 'tentetive_visit_date',
+    'tentetive_purchase_date': 'tentetive_purchase_date',
+    'is_customer': 'is_customer',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'branch_id': 'branch_id',
+    'branch_name': 'branch__name',
+    'division_id': 'division_id',
+    'division_name': 'division__name',
+    'subdivision_id': 'subdivision_id',
+    'subdivision_name': 'subdivision__name',
+    'assign_to': 'assign_to__full_name',
+    'created_by': 'created_by__full_name',
+    'remarks': 'latest_log_remarks',
+    'followup_date': 'latest_followup_date',
+    'followup_type': 'latest_followup_type',
+    'followup_remarks': 'latest_followup_remarks',
+}
+
+
+#Requested fields= keys, or None when the full rows are wanted
+def sparse_fields(params):
+    fields = [field.strip() for field in params.get("fields", "").split(",") if field.strip()]
+    if not fields:
+        return None
+    unknown = [field for field in fields if field not in SPARSE_LEAD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Use any of: {', '.join(SPARSE_LEAD_FIELDS)}")
+    return fields
+
+
+#values() projection of a lead queryset: only the requested columns are selected, only the
+#relations they come from are joined and the latest log/followup subqueries only run when asked for.
+#followups narrows which followups count as the latest one.
+def sparse_lead_queryset(leads, fields, followups=None):
+    paths = {SPARSE_LEAD_FIELDS[field] for field in fields}
+    latest_log = LeadLog.objects.filter(lead=OuterRef("pk")).order_by("-entry_date", "-leadlog_id")
+    latest_followup = (Followup.objects.all() if followups is None else followups).filter(
+        lead=OuterRef("pk")
+    ).order_by("-followup_date", "-followup_id")
+
+    annotations = {}
+    if 'latest_log_remarks' in paths:
+        annotations['latest_log_remarks'] = Subquery(latest_log.values("remarks")[:1])
+    for path in paths:
+        if path.startswith("latest_followup_"):
+            column = path.replace("latest_", "", 1)
+            annotations[path] = Subquery(latest_followup.values(column)[:1])
+
+    # lead_id and created_at are always read, the cursor is built from them
+    return order_leads(leads.annotate(**annotations)).values("lead_id", "created_at", *paths)
+
+
+#One page of sparse rows with the pagination keys of the response
+def sparse_lead_page(leads, fields, params, followups=None, **paginate_kwargs):
+    leads_page, meta = paginate_leads(sparse_lead_queryset(leads, fields, followups), params, **paginate_kwargs)
+    data = [{field: row[SPARSE_LEAD_FIELDS[field]] for field in fields} for row in leads_page]
+    return data, meta
+
+
+#One page of a lead list as (lead_id, created_at, updated_at) rows with its pagination keys.
+#The ETag is built from these before any list row is loaded, see conditional.list_validators.
+def lead_page_keys(leads, params, **paginate_kwargs):
+    return paginate_leads(order_leads(leads).values("lead_id", "created_at", "updated_at"), params, **paginate_kwargs)
+
+
+#Rows of a queryset over the leads of a page, models or values() rows, in the page's order
+def in_page_order(rows, lead_ids):
+    by_id = {(row["lead_id"] if isinstance(row, dict) else row.lead_id): row for row in rows}
+    return [by_id[lead_id] for lead_id in lead_ids if lead_id in by_id]
+
+
+#Sparse rows of the leads of a page, in the page's order
+def sparse_lead_rows(lead_ids, fields, followups=None):
+    rows = sparse_lead_queryset(Lead.objects.filter(pk__in=lead_ids), fields, followups)
+    return [{field: row[SPARSE_LEAD_FIELDS[field]] for field in fields} for row in in_page_order(rows, lead_ids)]
+
+
+#Common row for lead list responses
+def lead_row(lead, flat_branch=False, created_by=True):
+    row = {
+        'lead_id': lead.lead_id,
+        'name': lead.name,
+        'contact': lead.contact,
+        'subbranch': lead.subbranch,
+        'address': lead.address,
+        'email': lead.email,
+        'gender': lead.gender,
+        'city': lead.city,
+        'landmark': lead.landmark,
+        'lead_type': lead.lead_type,
+        'source': lead.source,
+        'category': lead.category,
+        'pan_vat': lead.pan_vat,
+        'company_name': lead.company_name,
+    }
+    if flat_branch:
+        row['branch_id'] = lead.branch.branch_id if lead.branch else None
+        row['branch_name'] = lead.branch.name if lead.branch else None
+    else:
+        row['branch'] = {
+            'branch_id': lead.branch.branch_id,
+            'branch_name': lead.branch.name
+        } if lead.branch else None
+    row.update({
+        'tentetive_visit_date': lead.tentetive_visit_date,
+        'tentetive_purchase_date': lead.tentetive_purchase_date,
+        'division': {
+            'division_id': lead.division.division_id,
+            'name': lead.division.name
+        } if lead.division else None,
+        'subdivision': {
+            'subdivision_id': lead.subdivision.subdivision_id,
+            'name': lead.subdivision.name
+        } if lead.subdivision else None,
+        'assign_to': lead.assign_to.full_name if lead.assign_to else None,
+    })
+    if created_by:
+        row['created_by'] = lead.created_by.full_name if lead.created_by else None
+    row.update({
+        'created_at': lead.created_at,
+        'updated_at': lead.updated_at,
+        'is_customer': lead.is_customer,
+    })
+    return row
+
+
+#Row of the stage lists: lead, latest remarks and all followups
+def stage_lead_row(lead, remarks_key="remarks_details", created_by=True):
+    row = lead_row(lead, created_by=created_by)
+    row[remarks_key] = remarks_details(lead)
+    row['followup'] = followup_list(lead)
+    return row
+
+
+#Latest log of a lead as read from the lead_list_queryset annotations
+def remarks_details(lead):
+    return {
+        'user': lead.latest_log_user,
+        'lead_created_date': lead.latest_log_entry_date,
+        'remarks': lead.latest_log_remarks
+    }
+
+
+#Latest followup of a lead as read from the lead_list_queryset annotations
+def latest_followup(lead):
+    if lead.latest_followup_id is None:
+        return None
+    return {
+        'followup_date': lead.latest_followup_date,
+        'followup_type': lead.latest_followup_type,
+        'followup_remarks': lead.latest_followup_remarks,
+        'entry_date': lead.latest_followup_entry_date
+    }
+
+
+#Prefetched followups of a lead
+def followup_list(lead):
+    return [
+        {
+            'followup_date': followup.followup_date,
+            'followup_type': followup.followup_type,
+            'followup_remarks': followup.followup_remarks,
+            'entry_date': followup.entry_date
+        } for followup in lead.followups.all()
+    ]
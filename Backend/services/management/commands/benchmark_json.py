@@ -0,0 +1,70 @@
+import timeit
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from services.lead_list import lead_row
+from services.models import Branch, Division, SubDivision, Lead
+from user.models import Users
+from user.renderers import orjson, orjson_dumps, stdlib_dumps
+
+
+#Representative getallleads page built in memory, so no database is needed
+def sample_page(rows, followups):
+    now = timezone.now()
+    branch = Branch(branch_id=1, name="Kathmandu")
+    division = Division(division_id=1, name="Furniture")
+    subdivision = SubDivision(subdivision_id=1, name="Doors", division=division)
+    user = Users(user_id=1, full_name="Sales Person")
+
+    data = []
+    for i in range(rows):
+        lead = Lead(
+            lead_id=i + 1, name=f"Lead {i}", contact=9800000000 + i, address="Baneshwor, Kathmandu",
+            email=f"lead{i}@example.com", gender="male", city="Kathmandu", landmark="Near the temple",
+            lead_type="raw", source="facebook", category="retail", pan_vat="601234567",
+            company_name="Everest Timber", branch=branch, subbranch="Baneshwor", division=division,
+            subdivision=subdivision, assign_to=user, created_by=user, is_customer=False,
+            tentetive_visit_date=now + timedelta(days=3), tentetive_purchase_date=now + timedelta(days=30),
+            created_at=now - timedelta(hours=i), updated_at=now,
+        )
+        row = lead_row(lead)
+        row['remarks_details'] = {'user': user.full_name, 'lead_created_date': now, 'remarks': "Asked for a quotation"}
+        row['followup'] = [
+            {
+                'followup_date': now + timedelta(days=j),
+                'followup_type': "pending",
+                'followup_remarks': f"Call back about the quotation, attempt {j}",
+                'entry_date': now,
+            }
+            for j in range(followups)
+        ]
+        data.append(row)
+    return {'data': data, 'total_pages': 50, 'total_leads': 1000, 'current_page': 1, 'message': "Leads fetched successfully"}
+
+
+class Command(BaseCommand):
+    help = "Compare encode time and payload size of the JSON renderers on a lead list page"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20)
+        parser.add_argument("--followups", type=int, default=5)
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        page = sample_page(options["rows"], options["followups"])
+        renderers = [("json", stdlib_dumps)]
+        if orjson is not None:
+            renderers.append(("orjson", orjson_dumps))
+        else:
+            self.stdout.write("orjson is not installed, only the stdlib encoder is measured")
+
+        baseline = None
+        for name, dumps in renderers:
+            seconds = min(timeit.repeat(lambda: dumps(page), number=options["iterations"], repeat=3))
+            per_encode = seconds / options["iterations"] * 1e6
+            baseline = baseline or per_encode
+            self.stdout.write(
+                f"{name:8} {per_encode:9.1f} us/encode {len(dumps(page)):8} bytes {baseline / per_encode:6.1f}x"
+            )
@@ -0,0 +1,65 @@
+import io
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from services.lead_import import LeadImporter
+from user.models import Users
+
+
+class Rollback(Exception):
+    pass
+
+
+#CSV of generated leads; every tenth row carries a followup and a remark
+def sample_csv(rows, start_contact=9000000000):
+    frame = pd.DataFrame({
+        "name": [f"Lead {i}" for i in range(rows)],
+        "contact": [str(start_contact + i) for i in range(rows)],
+        "gender": ["male" if i % 2 else "female" for i in range(rows)],
+        "address": "Baneshwor, Kathmandu",
+        "email": [f"lead{i}@example.com" for i in range(rows)],
+        "lead_type": "raw",
+        "city": "Kathmandu",
+        "followup_date": ["2030-01-31 10:00" if i % 10 == 0 else "" for i in range(rows)],
+        "followup_type": ["pending" if i % 10 == 0 else "" for i in range(rows)],
+        "followup_remarks": ["call back" if i % 10 == 0 else "" for i in range(rows)],
+        "remarks": ["imported" if i % 10 == 0 else "" for i in range(rows)],
+    })
+    return frame.to_csv(index=False).encode()
+
+
+class Command(BaseCommand):
+    help = "Time the lead importer on generated rows; the import is rolled back afterwards"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--keep", action="store_true", help="commit the imported leads")
+
+    def handle(self, *args, **options):
+        user = Users.objects.order_by("user_id").first()
+        if user is None:
+            raise CommandError("Create a user first, imported leads need a creator")
+        data = sample_csv(options["rows"])
+
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                df = pd.read_csv(io.BytesIO(data), dtype=str)
+                parsed = time.monotonic()
+                results = LeadImporter(user.user_id, chunk_size=options["chunk_size"]).import_frame(df)
+                finished = time.monotonic()
+                if not options["keep"]:
+                    raise Rollback
+        except Rollback:
+            pass
+
+        imported = sum(1 for result in results if result.get("success"))
+        seconds = finished - started
+        self.stdout.write(
+            f"{imported}/{len(results)} rows imported in {seconds:.2f}s "
+            f"(read {parsed - started:.2f}s, {len(results) / seconds:.0f} rows/s)"
+        )
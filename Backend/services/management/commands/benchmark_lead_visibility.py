@@ -0,0 +1,54 @@
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+
+from services.lead_list import LEAD_PAGE_SIZE, order_leads
+from services.models import AssignToUser, Lead, LeadVisibility
+from services.visibility import visible_leads
+
+
+#The per-request query get_leads_according_to_user ran before the visibility table
+def or_distinct_leads(user_id):
+    assigned_lead_ids = AssignToUser.objects.filter(user_id=user_id).values_list('lead_id', flat=True)
+    return Lead.objects.filter(
+        Q(assign_to_id=user_id) | Q(lead_id__in=assigned_lead_ids) | Q(created_by_id=user_id)
+    ).distinct()
+
+
+class Command(BaseCommand):
+    help = "Compare the first page and count of a user's leads: OR + DISTINCT against the visibility table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="defaults to the user who can see the most leads")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--explain", action="store_true", help="print the query plans")
+
+    def handle(self, *args, **options):
+        user_id = options["user"]
+        if user_id is None:
+            busiest = LeadVisibility.objects.values("user_id").annotate(n=Count("lead")).order_by("-n").first()
+            if busiest is None:
+                raise CommandError("No lead visibility rows, run rebuild_lead_visibility first")
+            user_id = busiest["user_id"]
+
+        candidates = [("or+distinct", or_distinct_leads(user_id)), ("visibility", visible_leads(user_id))]
+        counts = {name: leads.count() for name, leads in candidates}
+        if len(set(counts.values())) != 1:
+            raise CommandError(f"Lead counts differ: {counts}, run rebuild_lead_visibility")
+        self.stdout.write(f"user {user_id}: {counts['visibility']} leads")
+
+        baseline = None
+        for name, leads in candidates:
+            page = order_leads(leads)[:LEAD_PAGE_SIZE]
+
+            def run():
+                list(page.values_list("lead_id", flat=True))
+                leads.count()
+
+            seconds = min(timeit.repeat(run, number=options["iterations"], repeat=3))
+            per_run = seconds / options["iterations"] * 1e3
+            baseline = baseline or per_run
+            self.stdout.write(f"{name:12} {per_run:9.2f} ms/page+count {baseline / per_run:6.1f}x")
+            if options["explain"]:
+                self.stdout.write(page.values("lead_id").explain())
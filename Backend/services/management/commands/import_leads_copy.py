@@ -0,0 +1,35 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from services.copy_import import copy_import_leads
+
+
+class Command(BaseCommand):
+    help = "Import a lead CSV through COPY and set-based SQL, for very large files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--user", type=int, required=True, help="user_id the leads are created by")
+        parser.add_argument("--errors", help="write rejected rows (row, error) to this CSV")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options["path"], "rb") as file:
+                imported, rejected = copy_import_leads(file, options["user"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        seconds = time.monotonic() - started
+
+        if options["errors"] and rejected:
+            with open(options["errors"], "w", newline="") as out:
+                writer = csv.writer(out)
+                writer.writerow(["row", "error"])
+                writer.writerows((item["row"], item["message"]) for item in rejected)
+        total = imported + len(rejected)
+        self.stdout.write(
+            f"{imported}/{total} rows imported, {len(rejected)} rejected in {seconds:.2f}s "
+            f"({total / seconds if seconds else 0:.0f} rows/s)"
+        )
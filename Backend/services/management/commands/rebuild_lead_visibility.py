@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from services.visibility import check_lead_visibility, rebuild_lead_visibility
+
+
+class Command(BaseCommand):
+    help = "Check the lead visibility table against the leads and their assignments, and rebuild it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="only report differences, do not rebuild")
+
+    def handle(self, *args, **options):
+        missing, stale = check_lead_visibility()
+        self.stdout.write(f"{missing} missing rows, {stale} stale rows")
+        if options["check"] or not (missing or stale):
+            return
+        rows = rebuild_lead_visibility()
+        self.stdout.write(f"rebuilt with {rows} rows")
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.import_jobs import claim_import_job, run_import_job
+from services.lead_import import IMPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Process queued lead import jobs; several workers can run side by side"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="process the queued jobs, then exit")
+        parser.add_argument("--poll", type=float, default=2, help="seconds to wait when the queue is empty")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_import_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll"])
+                continue
+            job = run_import_job(job, chunk_size=options["chunk_size"])
+            self.stdout.write(f"import {job.importjob_id} {job.status}: {job.message}")
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.sweeper import overdue_watermark, sweep_overdue_followups
+
+
+class Command(BaseCommand):
+    help = "Mark pending followups whose date has passed as overdue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--every", type=int, help="keep running, sweeping every this many seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            swept, seconds = sweep_overdue_followups(chunk_size=options["chunk_size"])
+            rate = swept / seconds if seconds else 0
+            self.stdout.write(
+                f"{swept} followups marked overdue in {seconds:.2f}s ({rate:.0f}/s), "
+                f"watermark {overdue_watermark().value.isoformat()}"
+            )
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0005_lead_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='contact_normalized',
+            field=models.CharField(db_index=True, editable=False, max_length=10, null=True),
+        ),
+        # same rule as helper.normalize_phone: digits only, last 10 kept
+        migrations.RunSQL(
+            "UPDATE services_lead SET contact_normalized = right(contact::text, 10) WHERE contact IS NOT NULL",
+            migrations.RunSQL.noop,
+        ),
+    ]
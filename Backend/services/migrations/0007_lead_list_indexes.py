@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0006_lead_contact_normalized'),
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='followup',
+            index=models.Index(fields=['lead', 'followup_type', 'followup_date'], name='followup_lead_type_date'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(models.OrderBy(models.F('created_at'), descending=True, nulls_last=True), models.OrderBy(models.F('lead_id'), descending=True), name='lead_created_order'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(models.F('lead_type'), models.OrderBy(models.F('created_at'), descending=True, nulls_last=True), models.OrderBy(models.F('lead_id'), descending=True), name='lead_type_created'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(models.F('assign_to'), models.OrderBy(models.F('created_at'), descending=True, nulls_last=True), models.OrderBy(models.F('lead_id'), descending=True), name='lead_assign_to_created'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(models.OrderBy(models.F('created_at'), descending=True, nulls_last=True), models.OrderBy(models.F('lead_id'), descending=True), condition=models.Q(('is_customer', True)), name='lead_customer_created'),
+        ),
+        migrations.AddIndex(
+            model_name='leadlog',
+            index=models.Index(fields=['lead', '-entry_date', '-leadlog_id'], name='leadlog_lead_entry_date'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:52
+
+import re
+
+from django.db import migrations
+
+
+# Frozen copy of services.imports_helper.helper.normalize_lead_type as it stood when this
+# migration was written, so later changes to the live helper cannot change what it does
+def normalize_lead_type(value):
+    if value in [None, "", "null"]:
+        return "raw"
+    key = re.sub(r"[\s_-]+", " ", str(value)).strip().lower()
+    if key in ("complete", "completed"):
+        return "completed"
+    if key in ("", "raw", "pending") or key.startswith("raw "):
+        return "raw"
+    if key.replace(" ", "") == "beforevisit":
+        return "before visit"
+    if key.replace(" ", "") == "aftervisit":
+        return "after visit"
+    return key
+
+
+def normalize_lead_types(apps, schema_editor):
+    Lead = apps.get_model("services", "Lead")
+    Lead.objects.filter(lead_type__isnull=True).update(lead_type="raw")
+    for value in Lead.objects.values_list("lead_type", flat=True).distinct():
+        normalized = normalize_lead_type(value)
+        if normalized != value:
+            Lead.objects.filter(lead_type=value).update(lead_type=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0007_lead_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_lead_types, migrations.RunPython.noop),
+    ]
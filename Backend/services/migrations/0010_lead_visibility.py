@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# existing leads, same rule as services.visibility.visibility_pairs_sql
+BACKFILL = """
+    INSERT INTO services_leadvisibility (lead_id, user_id)
+    SELECT lead_id, assign_to_id FROM services_lead WHERE assign_to_id IS NOT NULL
+    UNION
+    SELECT lead_id, created_by_id FROM services_lead WHERE created_by_id IS NOT NULL
+    UNION
+    SELECT lead_id, user_id FROM services_assigntouser WHERE user_id IS NOT NULL AND lead_id IS NOT NULL
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0009_lead_updated_at_index'),
+        ('user', '0002_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadVisibility',
+            fields=[
+                ('leadvisibility_id', models.AutoField(editable=False, primary_key=True, serialize=False)),
+                ('lead', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibility', to='services.lead')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='visible_leads', to='user.users')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='leadvisibility',
+            constraint=models.UniqueConstraint(fields=('user', 'lead'), name='leadvisibility_user_lead'),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
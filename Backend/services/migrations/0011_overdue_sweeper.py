@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0010_lead_visibility'),
+        ('user', '0002_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('watermark_id', models.AutoField(editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=120, unique=True)),
+                ('value', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='followup',
+            index=models.Index(fields=['followup_type', 'followup_date'], name='followup_type_date'),
+        ),
+    ]
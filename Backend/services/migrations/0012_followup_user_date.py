@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0011_overdue_sweeper'),
+        ('user', '0002_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='followup',
+            index=models.Index(fields=['user', 'followup_date'], name='followup_user_date'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+# used by the COPY import (services/copy_import.py) to validate dates in set-based SQL
+TRY_TIMESTAMPTZ_SQL = """
+CREATE OR REPLACE FUNCTION services_try_timestamptz(value text) RETURNS timestamptz AS $$
+BEGIN
+    RETURN value::timestamptz;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql STABLE;
+"""
+
+DROP_TRY_TIMESTAMPTZ_SQL = "DROP FUNCTION IF EXISTS services_try_timestamptz(text);"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0013_importjob'),
+    ]
+
+    operations = [
+        migrations.RunSQL(TRY_TIMESTAMPTZ_SQL, DROP_TRY_TIMESTAMPTZ_SQL),
+    ]
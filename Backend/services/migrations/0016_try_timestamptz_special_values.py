@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+# Postgres reads 'now', 'today', 'infinity', 'epoch' and the like (alone or next to a time, as in
+# 'today 10:00') as dates, none of which is a date an import should store
+TRY_TIMESTAMPTZ_SQL = r"""
+CREATE OR REPLACE FUNCTION services_try_timestamptz(value text) RETURNS timestamptz AS $$
+BEGIN
+    IF value ~* '\m(now|today|tomorrow|yesterday|infinity|epoch|allballs)\M' THEN
+        RETURN NULL;
+    END IF;
+    RETURN value::timestamptz;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql STABLE;
+"""
+
+PREVIOUS_TRY_TIMESTAMPTZ_SQL = """
+CREATE OR REPLACE FUNCTION services_try_timestamptz(value text) RETURNS timestamptz AS $$
+BEGIN
+    RETURN value::timestamptz;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql STABLE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0015_importjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunSQL(TRY_TIMESTAMPTZ_SQL, PREVIOUS_TRY_TIMESTAMPTZ_SQL),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:15
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0016_try_timestamptz_special_values'),
+        ('user', '0002_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='lead',
+            name='lead_updated_at',
+        ),
+        migrations.AlterField(
+            model_name='lead',
+            name='assign_to',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leads', to='user.users'),
+        ),
+        migrations.AlterField(
+            model_name='lead',
+            name='contact_normalized',
+            field=models.CharField(editable=False, max_length=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(models.F('contact_normalized'), name='varchar_pattern_ops'), name='lead_contact_normalized'),
+        ),
+    ]
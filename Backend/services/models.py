@@ -1,6 +1,11 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import F, Q
+from django.db.models.functions import Upper
 from user.views import *
 from user.models import *
+from .imports_helper.helper import normalize_phone, normalize_lead_type
 
 
 class Division(models.Model):
@@ -26,6 +31,8 @@ class Lead(models.Model):
     lead_id = models.AutoField(primary_key=True, editable=False)
     name = models.CharField(max_length=200)
     contact= models.BigIntegerField(null=True)
+    # digits-only contact kept in sync by save(), see the lead_contact_normalized index
+    contact_normalized = models.CharField(max_length=10, null=True, editable=False)
     address = models.CharField(null=True)
     email = models.EmailField(null=True)
     gender = models.CharField(max_length=20, choices=[("male", "Male"), ("female", "Female")])
@@ -42,13 +49,39 @@ class Lead(models.Model):
     tentetive_purchase_date = models.DateTimeField(null=True)
     division = models.ForeignKey(Division, on_delete=models.CASCADE, related_name='leads', null=True)
     subdivision = models.ForeignKey(SubDivision, on_delete=models.CASCADE, related_name='leads', null=True)
-    assign_to = models.ForeignKey('user.Users', on_delete=models.CASCADE, related_name='leads', null=True)
+    # indexed by lead_assign_to_created, which leads with assign_to
+    assign_to = models.ForeignKey('user.Users', on_delete=models.CASCADE, related_name='leads', null=True, db_index=False)
     created_by = models.ForeignKey('user.Users', on_delete=models.CASCADE, related_name='created_leads', null=True)
     is_customer = models.BooleanField(default=False, null=True)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
+    # maintained by a database trigger, see migration 0005
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="lead_search_vector_gin"),
+            # trigram indexes on UPPER(col) serve the icontains filters
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="lead_name_trgm"),
+            GinIndex(OpClass(Upper("company_name"), name="gin_trgm_ops"), name="lead_company_name_trgm"),
+            GinIndex(OpClass(Upper("city"), name="gin_trgm_ops"), name="lead_city_trgm"),
+            GinIndex(OpClass(Upper("landmark"), name="gin_trgm_ops"), name="lead_landmark_trgm"),
+            GinIndex(OpClass(Upper("subbranch"), name="gin_trgm_ops"), name="lead_subbranch_trgm"),
+            # list ordering is created_at DESC NULLS LAST, lead_id DESC (see lead_list.LEAD_ORDERING)
+            models.Index(F("created_at").desc(nulls_last=True), F("lead_id").desc(), name="lead_created_order"),
+            models.Index(F("lead_type"), F("created_at").desc(nulls_last=True), F("lead_id").desc(), name="lead_type_created"),
+            models.Index(F("assign_to"), F("created_at").desc(nulls_last=True), F("lead_id").desc(), name="lead_assign_to_created"),
+            models.Index(
+                F("created_at").desc(nulls_last=True), F("lead_id").desc(),
+                name="lead_customer_created", condition=Q(is_customer=True),
+            ),
+            # one btree for both the exact duplicate checks and the startswith (LIKE 'digits%') searches
+            models.Index(OpClass(F("contact_normalized"), name="varchar_pattern_ops"), name="lead_contact_normalized"),
+        ]
     
     def save(self, *args, **kwargs):
+        self.contact_normalized = normalize_phone(self.contact)
+        self.lead_type = normalize_lead_type(self.lead_type)
         if self.pk:  # Updating existing record
             old = Lead.objects.get(pk=self.pk)
             # If is_customer changed to True, force lead_type to 'completed'
@@ -76,6 +109,23 @@ class AssignToUser(models.Model):
     def __str__(self):
         return f"Lead {self.lead} assigned to {self.user}"
  
+#Who can see a lead: its assignee, its creator and every AssignToUser user, one row per pair.
+#Kept in step by services.visibility, rebuilt with the rebuild_lead_visibility command.
+class LeadVisibility(models.Model):
+    leadvisibility_id = models.AutoField(primary_key=True, editable=False)
+    # the (user, lead) unique index serves the lookups by user
+    user = models.ForeignKey('user.Users', on_delete=models.CASCADE, related_name='visible_leads', db_index=False)
+    lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='visibility')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "lead"], name="leadvisibility_user_lead"),
+        ]
+
+    def __str__(self):
+        return f"Lead {self.lead_id} visible to {self.user_id}"
+
+
 class Followup(models.Model):
     followup_id = models.AutoField(primary_key=True, editable=False)
     lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='followups', null=True)
@@ -91,6 +141,15 @@ class Followup(models.Model):
     entry_date = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["lead", "followup_type", "followup_date"], name="followup_lead_type_date"),
+            # due followups by type, walked by the overdue sweeper
+            models.Index(fields=["followup_type", "followup_date"], name="followup_type_date"),
+            # a user's agenda is a range of this index
+            models.Index(fields=["user", "followup_date"], name="followup_user_date"),
+        ]
+
     def __str__(self):
         return f"Followup {self.lead} by {self.user}"
     
@@ -101,3 +160,52 @@ class LeadLog(models.Model):
     remarks = models.TextField(null=True)
     followup = models.ForeignKey(Followup, on_delete=models.CASCADE, related_name='lead_logs', null=True)
     entry_date = models.DateTimeField(auto_now_add=True, null=True)
+
+    class Meta:
+        indexes = [
+            # serves the latest-log subquery of the lead lists
+            models.Index(fields=["lead", "-entry_date", "-leadlog_id"], name="leadlog_lead_entry_date"),
+        ]
+
+
+#Progress marker of a background job, e.g. the followup_date the overdue sweeper has reached
+class Watermark(models.Model):
+    watermark_id = models.AutoField(primary_key=True, editable=False)
+    name = models.CharField(max_length=120, unique=True)
+    value = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.value}"
+
+
+#Lead file uploaded for import in the background, claimed and processed by the run_import_worker command
+class ImportJob(models.Model):
+    importjob_id = models.AutoField(primary_key=True, editable=False)
+    file = models.FileField(upload_to="imports/")
+    status = models.CharField(max_length=20, default="queued", choices=[("queued", "Queued"), ("running", "Running"),
+                              ("completed", "Completed"), ("failed", "Failed")])
+    created_by = models.ForeignKey('user.Users', on_delete=models.CASCADE, related_name='import_jobs', null=True)
+    total_rows = models.IntegerField(null=True)
+    processed_rows = models.IntegerField(default=0)
+    accepted_rows = models.IntegerField(default=0)
+    rejected_rows = models.IntegerField(default=0)
+    # rejected rows as uploaded, with an error column
+    error_file = models.FileField(upload_to="imports/errors/", null=True, blank=True)
+    message = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # renewed by the worker after every chunk; a running job whose heartbeat is older than
+    # IMPORT_JOB_LEASE_SECONDS belongs to a dead worker and is claimed again
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    class Meta:
+        indexes = [
+            # the workers' claim query: oldest queued (or stale running) job first
+            models.Index(fields=["status", "created_at"], name="importjob_status_created"),
+        ]
+
+    def __str__(self):
+        return f"Import {self.importjob_id} {self.status}"
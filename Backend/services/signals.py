@@ -0,0 +1,49 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from user.refdata import invalidate_reference
+from .lead_list import bump_lead_list_generation
+from .models import AssignToUser, Branch, Division, Followup, Lead, LeadLog, SubDivision
+from .visibility import sync_lead_visibility
+
+
+#Cached lead and followup counts are keyed on the generation, any write to what the lists show invalidates
+#them in this process (other processes fall back to the TTL). ETags read the rows, see conditional.list_validators
+@receiver([post_save, post_delete], sender=Lead)
+@receiver([post_save, post_delete], sender=AssignToUser)
+@receiver([post_save, post_delete], sender=Followup)
+@receiver([post_save, post_delete], sender=LeadLog)
+def invalidate_lead_lists(sender, **kwargs):
+    bump_lead_list_generation()
+
+
+#Lead visibility follows the assignee, the creator and the AssignToUser rows of a lead
+@receiver(post_save, sender=Lead)
+def sync_lead(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"assign_to", "created_by"} & set(update_fields):
+        return
+    sync_lead_visibility([instance.lead_id])
+
+
+@receiver([post_save, post_delete], sender=AssignToUser)
+def sync_assignment(sender, instance, **kwargs):
+    # a deleted lead takes its visibility rows with it
+    if isinstance(kwargs.get("origin"), Lead):
+        return
+    sync_lead_visibility([instance.lead_id])
+
+
+#Divisions, subdivisions and branches are served from the reference cache, writes invalidate it
+@receiver([post_save, post_delete], sender=Division)
+def invalidate_divisions(sender, **kwargs):
+    invalidate_reference("divisions")
+
+
+@receiver([post_save, post_delete], sender=SubDivision)
+def invalidate_subdivisions(sender, **kwargs):
+    invalidate_reference("subdivisions")
+
+
+@receiver([post_save, post_delete], sender=Branch)
+def invalidate_branches(sender, **kwargs):
+    invalidate_reference("branches")
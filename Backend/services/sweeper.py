@@ -0,0 +1,66 @@
+import time
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .lead_list import bump_lead_list_generation
+from .models import Followup, LeadLog, Watermark
+
+
+OVERDUE_WATERMARK = "overdue_followups"
+OVERDUE_REMARKS = "Followup marked overdue"
+
+#Marks one chunk of due pending followups overdue, oldest first. Rows locked by a request
+#editing them are skipped and picked up by a later run.
+#There is no lower bound: swept rows leave the 'pending' range of the followup_type_date index, so
+#the range only ever holds what is left to do and each run reads just that. Followups created or
+#rescheduled into the past are in it like any other.
+MARK_OVERDUE_SQL = f"""
+    UPDATE {Followup._meta.db_table} SET followup_type = 'overdue', updated_at = %s
+    WHERE followup_id IN (
+        SELECT followup_id FROM {Followup._meta.db_table}
+        WHERE followup_type = 'pending' AND followup_date <= %s
+        ORDER BY followup_date, followup_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING followup_id, lead_id, user_id, followup_date
+"""
+
+
+def overdue_watermark():
+    watermark, created = Watermark.objects.get_or_create(name=OVERDUE_WATERMARK)
+    return watermark
+
+
+#Moves pending followups due by `until` to overdue in chunks, logging each on its lead.
+#The watermark records how far the sweep is complete: `until`, or the followup_date of the oldest
+#due followup still pending (one that was locked) when some were skipped.
+#Returns (followups swept, seconds taken).
+def sweep_overdue_followups(until=None, chunk_size=1000):
+    started = time.monotonic()
+    until = until or timezone.now()
+
+    swept = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(MARK_OVERDUE_SQL, [timezone.now(), until, chunk_size])
+            rows = cursor.fetchall()
+            LeadLog.objects.bulk_create([
+                LeadLog(followup_id=followup_id, lead_id=lead_id, user_id=user_id, remarks=OVERDUE_REMARKS)
+                for followup_id, lead_id, user_id, followup_date in rows
+            ])
+        swept += len(rows)
+        if len(rows) < chunk_size:
+            break
+
+    watermark = overdue_watermark()
+    oldest = Followup.objects.filter(followup_type="pending", followup_date__lte=until).order_by(
+        "followup_date"
+    ).values_list("followup_date", flat=True).first()
+    watermark.value = oldest or until
+    watermark.save(update_fields=["value", "updated_at"])
+    if swept:
+        # the bulk writes bypass the signals that invalidate the lead lists
+        transaction.on_commit(bump_lead_list_generation)
+    return swept, time.monotonic() - started
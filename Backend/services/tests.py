@@ -1,3 +1,1186 @@
-from django.test import TestCase
+import gc
+import json
+import os
+import tempfile
+import tracemalloc
+import warnings
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+
+from user.essentials import createToken
+from user.revocation import revoked_tokens
+from user.models import Role, Users
+from .imports_helper.helper import get_fk_instance
+from .import_files import read_xlsx_chunks
+from .import_jobs import claim_import_job, run_import_job
+from .lead_list import encode_cursor, lead_list_generation
+from .sweeper import OVERDUE_REMARKS, overdue_watermark, sweep_overdue_followups
+from .models import AssignToUser, Branch, Division, SubDivision, ImportJob, Lead, LeadLog, LeadVisibility, Followup
+
+
+class LeadTestMixin:
+    def setUp(self):
+        cache.clear()
+        # keep the periodic revocation refresh out of the query counts
+        self.enterContext(override_settings(REVOCATION_REFRESH_SECONDS=3600))
+        revoked_tokens.refresh(force=True)
+        self.role = Role.objects.create(role_name="admin")
+        self.user = Users.objects.create(
+            full_name="Tester", email="tester@example.com", contact=9800000000,
+            password="secret", role=self.role, gender="male", status="active",
+        )
+        self.division = Division.objects.create(name="Furniture")
+        self.subdivision = SubDivision.objects.create(name="Doors", division=self.division)
+        self.branch = Branch.objects.create(name="Kathmandu")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {createToken(self.user)}")
+
+    def create_leads(self, count, start=0, **kwargs):
+        leads = []
+        for i in range(start, start + count):
+            lead = Lead.objects.create(
+                name=f"Lead {i}", contact=9700000000 + i, gender="male",
+                branch=self.branch, division=self.division, subdivision=self.subdivision,
+                assign_to=self.user, created_by=self.user, **kwargs
+            )
+            followup = Followup.objects.create(
+                lead=lead, user=self.user, followup_type="pending", followup_remarks=f"call {i}",
+                followup_date=timezone.now() + timedelta(hours=i)
+            )
+            LeadLog.objects.create(lead=lead, user=self.user, remarks=f"remark {i}", followup=followup)
+            leads.append(lead)
+        return leads
+
+
+class LeadListQueryCountTests(LeadTestMixin, TestCase):
+    list_urls = [
+        "/api/services/getallleads",
+        "/api/services/getrawleads?page=1",
+        "/api/services/getbeforevisitleads",
+        "/api/services/getaftervisitleads",
+        "/api/services/getcompletedleads",
+        "/api/services/getallcustomers",
+        "/api/services/getleadsaccordingtouser",
+    ]
+
+    def query_count(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.client.get("/api/services/getalldivisions")  # warm the principal cache
+        self.create_leads(2, lead_type="raw")
+        self.create_leads(2, start=2, lead_type="before visit")
+        self.create_leads(2, start=4, lead_type="completed", is_customer=True)
+        small = {url: self.query_count(url) for url in self.list_urls}
+
+        self.create_leads(20, start=10, lead_type="raw")
+        self.create_leads(20, start=30, lead_type="before visit")
+        self.create_leads(20, start=50, lead_type="completed", is_customer=True)
+        for url in self.list_urls:
+            self.assertEqual(self.query_count(url), small[url], url)
+
+    def test_raw_leads_page_query_count(self):
+        self.create_leads(20, lead_type="raw")
+        # token principal (cold cache), count, page, followup prefetch
+        with self.assertNumQueries(4):
+            response = self.client.get("/api/services/getrawleads")
+        body = response.json()
+        self.assertEqual(len(body["data"]), 20)
+        self.assertEqual(body["data"][0]["remarks_details"]["remarks"], "remark 19")
+        self.assertEqual(body["data"][0]["followup"][0]["followup_remarks"], "call 19")
+
+    def test_all_leads_latest_followup_and_remarks(self):
+        self.create_leads(3)
+        response = self.client.get("/api/services/getallleads")
+        row = response.json()["data"][0]
+        self.assertEqual(row["remarks"], "remark 2")
+        self.assertEqual(row["followup"]["followup_remarks"], "call 2")
+        self.assertEqual(row["branch"]["branch_name"], "Kathmandu")
+
+
+class CursorPaginationTests(LeadTestMixin, TestCase):
+    def walk(self, url):
+        ids, cursor, pages = [], "", []
+        while cursor is not None:
+            body = self.client.get(url, {"cursor": cursor}).json()
+            pages.append(body)
+            ids.extend(row["lead_id"] for row in body["data"])
+            cursor = body["next_cursor"]
+        return ids, pages
+
+    def test_cursor_walk_matches_page_order(self):
+        leads = self.create_leads(45, lead_type="raw")
+        # ties on created_at and legacy rows without created_at are still walked exactly once
+        Lead.objects.filter(lead_id__in=[l.lead_id for l in leads[10:15]]).update(created_at=leads[10].created_at)
+        Lead.objects.filter(lead_id__in=[l.lead_id for l in leads[30:33]]).update(created_at=None)
+
+        ids, pages = self.walk("/api/services/getrawleads")
+        self.assertEqual(len(pages), 3)
+        self.assertNotIn("total_leads", pages[0])
+
+        paged = []
+        for page in (1, 2, 3):
+            paged.extend(row["lead_id"] for row in self.client.get("/api/services/getrawleads", {"page": page}).json()["data"])
+        self.assertEqual(ids, paged)
+        self.assertEqual(sorted(ids), sorted(l.lead_id for l in leads))
+
+    def test_prev_cursor_returns_previous_page(self):
+        self.create_leads(45)
+        first = self.client.get("/api/services/getallleads", {"cursor": ""}).json()
+        second = self.client.get("/api/services/getallleads", {"cursor": first["next_cursor"]}).json()
+        back = self.client.get("/api/services/getallleads", {"cursor": second["prev_cursor"]}).json()
+        self.assertEqual([r["lead_id"] for r in back["data"]], [r["lead_id"] for r in first["data"]])
+        self.assertIsNone(back["prev_cursor"])
+
+    def test_prev_cursors_walk_back_across_the_null_tail(self):
+        leads = self.create_leads(45)
+        Lead.objects.filter(lead_id__in=[l.lead_id for l in leads[:25]]).update(created_at=None)
+        ids, pages = self.walk("/api/services/getallleads")
+        back, cursor = [], pages[-1]["prev_cursor"]
+        while cursor is not None:
+            body = self.client.get("/api/services/getallleads", {"cursor": cursor}).json()
+            back = [row["lead_id"] for row in body["data"]] + back
+            cursor = body["prev_cursor"]
+        self.assertEqual(back + [row["lead_id"] for row in pages[-1]["data"]], ids)
+
+    def test_followup_lists_accept_cursor(self):
+        self.create_leads(25)
+        ids, pages = self.walk("/api/services/getallpendingfollowup")
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(len(pages), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/services/getallleads", {"cursor": "garbage"})
+        self.assertFalse(response.json()["success"])
+
+
+class LeadCountCacheTests(LeadTestMixin, TestCase):
+    def count_queries(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            body = self.client.get("/api/services/getallleads", params).json()
+        return body, [q["sql"] for q in ctx.captured_queries if "COUNT(*)" in q["sql"]]
+
+    def test_count_is_cached_per_filter_signature(self):
+        self.create_leads(3)
+        body, counts = self.count_queries({"name": "Lead"})
+        self.assertEqual(body["total_leads"], 3)
+        self.assertEqual(len(counts), 1)
+
+        body, counts = self.count_queries({"name": "Lead", "page": 1})
+        self.assertEqual(body["total_leads"], 3)
+        self.assertEqual(counts, [])
+
+        body, counts = self.count_queries({"name": "Lead 1"})
+        self.assertEqual(body["total_leads"], 1)
+        self.assertEqual(len(counts), 1)
+
+    def test_lead_write_invalidates_count(self):
+        self.create_leads(3)
+        self.assertEqual(self.count_queries({})[0]["total_leads"], 3)
+        self.create_leads(1, start=3)
+        body, counts = self.count_queries({})
+        self.assertEqual(body["total_leads"], 4)
+        self.assertEqual(len(counts), 1)
+
+    @override_settings(LEAD_COUNT_ESTIMATE_THRESHOLD=0)
+    def test_estimate_mode_uses_planner(self):
+        self.create_leads(3)
+        with CaptureQueriesContext(connection) as ctx:
+            body = self.client.get("/api/services/getallleads", {"count": "estimate"}).json()
+        self.assertTrue(body["count_is_estimate"])
+        self.assertGreaterEqual(body["total_leads"], 0)
+        self.assertTrue(any(q["sql"].startswith("EXPLAIN") for q in ctx.captured_queries))
+
+    def test_estimate_mode_counts_small_lists_exactly(self):
+        self.create_leads(3)
+        body = self.client.get("/api/services/getallleads", {"count": "estimate"}).json()
+        self.assertEqual(body["total_leads"], 3)
+        self.assertNotIn("count_is_estimate", body)
+
+
+class LeadSearchTests(LeadTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for name, company, city in [
+            ("Ramesh Shrestha", "Everest Timber", "Kathmandu"),
+            ("Sita Rai", "Ramesh Traders", "Pokhara"),
+            ("Hari Thapa", "Himal Doors", "Lalitpur"),
+        ]:
+            Lead.objects.create(name=name, company_name=company, city=city, gender="male", created_by=self.user)
+
+    def names(self, url, **params):
+        return [row["name"] for row in self.client.get(url, params).json()["data"]]
+
+    def test_search_vector_is_maintained(self):
+        lead = Lead.objects.get(name="Hari Thapa")
+        lead.city = "Bhaktapur"
+        lead.save()
+        self.assertEqual(self.names("/api/services/getallleads", q="bhaktapur"), ["Hari Thapa"])
+
+    def test_ranked_matches(self):
+        self.assertEqual(self.names("/api/services/getallleads", q="ramesh"), ["Ramesh Shrestha", "Sita Rai"])
+
+    def test_partial_word_matches(self):
+        self.assertEqual(self.names("/api/services/getallleads", q="himal"), ["Hari Thapa"])
+        self.assertEqual(self.names("/api/services/getallleads", q="okhar"), ["Sita Rai"])
+
+    def test_search_rejects_cursor(self):
+        response = self.client.get("/api/services/getallleads", {"q": "ramesh", "cursor": ""})
+        self.assertFalse(response.json()["success"])
+
+
+class PhoneLookupTests(LeadTestMixin, TestCase):
+    def test_normalized_contact_is_kept_in_sync(self):
+        lead = Lead.objects.create(name="Caller", contact=9812345678, gender="male")
+        self.assertEqual(lead.contact_normalized, "9812345678")
+        lead.contact = 9800000001
+        lead.save()
+        self.assertEqual(Lead.objects.get(pk=lead.pk).contact_normalized, "9800000001")
+
+    def test_exact_and_prefix_lookup(self):
+        Lead.objects.create(name="Caller", contact=9812345678, gender="male")
+        Lead.objects.create(name="Other", contact=9812399999, gender="male")
+
+        data = self.client.get("/api/services/lookupleadbyphone", {"phone": "+977-981-234-5678"}).json()["data"]
+        self.assertEqual(data["match"], "exact")
+        self.assertEqual([row["name"] for row in data["leads"]], ["Caller"])
+
+        data = self.client.get("/api/services/lookupleadbyphone", {"phone": "98123"}).json()["data"]
+        self.assertEqual(data["match"], "prefix")
+        self.assertEqual(len(data["leads"]), 2)
+
+    def test_createlead_rejects_duplicate_contact(self):
+        Lead.objects.create(name="Caller", contact=9812345678, gender="male")
+        response = self.client.post("/api/services/createlead", {"name": "Again", "contact": "9812345678"})
+        self.assertEqual(response.json()["message"], "Contact already exists.")
+
+
+class LeadListPlanTests(LeadTestMixin, TestCase):
+    hot_tables = {"services_lead", "services_followup", "services_leadlog", "services_leadvisibility"}
+    list_urls = LeadListQueryCountTests.list_urls + [
+        "/api/services/getallfollowup",
+        "/api/services/getalloverduefollowup",
+        "/api/services/getallpendingfollowup",
+        "/api/services/getallcompletedfollowup",
+    ]
+
+    def seq_scans(self, plan):
+        found = []
+        if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in self.hot_tables:
+            found.append(plan["Relation Name"])
+        for child in plan.get("Plans", []):
+            found.extend(self.seq_scans(child))
+        return found
+
+    #Enough rows, spread over the stages, that the planner weighs an index against a seq scan
+    #on its own costs rather than being forced onto one
+    def fill(self, count):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO services_lead (name, contact, contact_normalized, gender, lead_type, is_customer,
+                                           branch_id, division_id, assign_to_id, created_by_id, created_at, updated_at)
+                SELECT 'Lead ' || i, 9600000000 + i, (9600000000 + i)::text, 'male',
+                       (ARRAY['raw', 'before visit', 'after visit', 'completed'])[mod(i, 4) + 1], mod(i, 4) = 3,
+                       %s, %s, %s, %s, now() - i * interval '1 minute', now()
+                FROM generate_series(1, %s) AS i
+            """, [self.branch.pk, self.division.pk, self.user.pk, self.user.pk, count])
+            cursor.execute("""
+                INSERT INTO services_followup (lead_id, user_id, followup_type, followup_date, entry_date, updated_at)
+                SELECT lead_id, %s, 'pending', now() + mod(lead_id, 100) * interval '1 hour', now(), now()
+                FROM services_lead
+            """, [self.user.pk])
+            cursor.execute("""
+                INSERT INTO services_leadlog (lead_id, user_id, followup_id, remarks, entry_date)
+                SELECT lead_id, user_id, followup_id, 'remark', now() FROM services_followup
+            """)
+            cursor.execute("ANALYZE services_lead, services_followup, services_leadlog, services_leadvisibility")
+
+    def plan(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            return cursor.fetchone()[0][0]["Plan"]
+
+    def test_list_pages_do_not_seq_scan_hot_tables(self):
+        self.fill(20000)
+        for url in self.list_urls + ["/api/services/getallleads?contact=96000012"]:
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+            for query in ctx.captured_queries:
+                # exact counts read the whole stage by design, estimates replace them on large tables
+                if query["sql"].startswith("SELECT") and "COUNT(" not in query["sql"]:
+                    self.assertEqual(self.seq_scans(self.plan(query["sql"])), [], f"{url}: {query['sql']}")
+
+    #Index scans of a plan tree that read lead_created_order
+    def order_scans(self, plan):
+        found = [plan] if plan.get("Index Name") == "lead_created_order" else []
+        for child in plan.get("Plans", []):
+            found.extend(self.order_scans(child))
+        return found
+
+    def test_deep_cursor_pages_seek_the_order_index(self):
+        self.fill(20000)
+        deep = Lead.objects.order_by("-created_at", "-lead_id").values("created_at", "lead_id")[15000]
+        for direction in ("next", "prev"):
+            with CaptureQueriesContext(connection) as ctx:
+                body = self.client.get("/api/services/getallleads", {"cursor": encode_cursor(deep, direction)}).json()
+            self.assertEqual(len(body["data"]), 20)
+            sql = next(q["sql"] for q in ctx.captured_queries
+                       if "LIMIT" in q["sql"] and ('"created_at" <' in q["sql"] or '"created_at" >' in q["sql"]))
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql)
+                scans = self.order_scans(cursor.fetchone()[0][0]["Plan"])
+            self.assertTrue(scans, sql)
+            # the cursor bounds the range, rows before it are never read
+            self.assertIn("created_at", scans[0].get("Index Cond", ""), direction)
+            self.assertLess(scans[0].get("Rows Removed by Filter", 0), 100, direction)
+
+    def test_one_contact_index_serves_equality_and_prefix_lookups(self):
+        self.fill(20000)
+        for leads in (Lead.objects.filter(contact_normalized="9600000012"),
+                      Lead.objects.filter(contact_normalized__startswith="96000012")):
+            sql, params = leads.query.sql_with_params()
+            self.assertIn('"Index Name": "lead_contact_normalized"', json.dumps(self.plan(sql, params)))
+
+
+class LeadStageTests(LeadTestMixin, TestCase):
+    def stage_names(self, url, **params):
+        return sorted(row["name"] for row in self.client.get(url, params).json()["data"])
+
+    def test_lead_type_is_normalized_on_save(self):
+        for value, expected in [
+            (None, "raw"), ("", "raw"), ("Raw Data", "raw"), ("pending", "raw"),
+            ("Complete", "completed"), ("Before_Visit", "before visit"), ("AFTER visit", "after visit"),
+            ("Overdue", "overdue"), ("Incomplete", "incomplete"), ("not complete", "not complete"),
+            ("Withdrawn", "withdrawn"),
+        ]:
+            lead = Lead.objects.create(name=str(value), gender="male", lead_type=value)
+            self.assertEqual(lead.lead_type, expected, value)
+
+    def test_stage_endpoint_matches_legacy_views(self):
+        Lead.objects.create(name="Raw", gender="male", lead_type="Raw Data")
+        Lead.objects.create(name="Before", gender="male", lead_type="before visit")
+        Lead.objects.create(name="After", gender="male", lead_type="after visit")
+        Lead.objects.create(name="Done", gender="male", lead_type="Complete")
+        Lead.objects.create(name="Customer", gender="male", is_customer=True)
+
+        for stage, url, names in [
+            ("raw", "/api/services/getrawleads", ["Raw"]),
+            ("before_visit", "/api/services/getbeforevisitleads", ["Before"]),
+            ("after_visit", "/api/services/getaftervisitleads", ["After"]),
+            ("completed", "/api/services/getcompletedleads", ["Customer", "Done"]),
+            ("customer", "/api/services/getallcustomers", ["Customer"]),
+        ]:
+            self.assertEqual(self.stage_names("/api/services/leads", stage=stage), names, stage)
+            self.assertEqual(self.stage_names(url), names, url)
+
+    def test_unknown_stage(self):
+        response = self.client.get("/api/services/leads", {"stage": "lost"})
+        self.assertFalse(response.json()["success"])
+
+
+class SparseFieldsTests(LeadTestMixin, TestCase):
+    def test_rows_carry_only_requested_fields(self):
+        self.create_leads(3, lead_type="raw")
+        with CaptureQueriesContext(connection) as ctx:
+            body = self.client.get("/api/services/getallleads", {"fields": "lead_id,name,branch_name,remarks"}).json()
+        self.assertEqual(body["data"][0], {
+            "lead_id": body["data"][0]["lead_id"], "name": "Lead 2", "branch_name": "Kathmandu", "remarks": "remark 2",
+        })
+        page_sql = ctx.captured_queries[-1]["sql"]
+        self.assertNotIn("services_division", page_sql)
+        self.assertNotIn("services_followup", page_sql)
+
+        rows = self.client.get("/api/services/leads", {"stage": "raw", "fields": "name,followup_remarks"}).json()["data"]
+        self.assertEqual(rows[0], {"name": "Lead 2", "followup_remarks": "call 2"})
+
+    def test_sparse_rows_support_cursor_and_search(self):
+        self.create_leads(25)
+        first = self.client.get("/api/services/getallpendingfollowup", {"fields": "name", "cursor": ""}).json()
+        second = self.client.get("/api/services/getallpendingfollowup", {"fields": "name", "cursor": first["next_cursor"]}).json()
+        self.assertEqual(len(first["data"]) + len(second["data"]), 25)
+        self.assertIsNone(second["next_cursor"])
+
+        rows = self.client.get("/api/services/getallleads", {"fields": "name", "q": "Lead 7"}).json()["data"]
+        self.assertEqual(rows[0], {"name": "Lead 7"})
+
+    def test_unknown_field(self):
+        response = self.client.get("/api/services/getallleads", {"fields": "name,password"})
+        self.assertFalse(response.json()["success"])
+
+
+class ConditionalGetTests(LeadTestMixin, TestCase):
+    def revalidate(self, url, params=None):
+        first = self.client.get(url, params or {})
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first["ETag"].startswith('W/"'))
+        return first, self.client.get(url, params or {}, HTTP_IF_NONE_MATCH=first["ETag"])
+
+    def test_unchanged_lists_return_304(self):
+        self.create_leads(3)
+        for url in ["/api/services/getallleads", "/api/services/getallfollowup", "/api/services/getalldivisions"]:
+            first, second = self.revalidate(url)
+            self.assertEqual(second.status_code, 304, url)
+            self.assertEqual(second.content, b"")
+
+    def test_304_skips_the_list_queries(self):
+        self.create_leads(3)
+        etag = self.client.get("/api/services/getallleads")["ETag"]
+        # the token principal and the count are cached, the page keys and the followup/log aggregate are read
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get("/api/services/getallleads", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    @override_settings(LEAD_COUNT_ESTIMATE_THRESHOLD=0)
+    def test_cursor_and_estimate_tags_do_not_count(self):
+        self.create_leads(3)
+        for params in ({"cursor": ""}, {"count": "estimate"}):
+            first = self.client.get("/api/services/getallleads", params)
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                second = self.client.get("/api/services/getallleads", params, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual(second.status_code, 304, params)
+            self.assertFalse(any("COUNT(*)" in q["sql"] for q in ctx.captured_queries), params)
+
+    def test_followup_writes_on_other_workers_change_the_etag(self):
+        lead = self.create_leads(3)[0]
+        for url in ("/api/services/getallleads", "/api/services/getallfollowup"):
+            first = self.client.get(url)
+            # a bulk update fires no signal, like a write through another process's cache
+            generation = lead_list_generation()
+            Followup.objects.filter(lead=lead).update(followup_type="completed", updated_at=timezone.now())
+            self.assertEqual(lead_list_generation(), generation)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200, url)
+
+    def test_writes_and_params_change_the_etag(self):
+        lead = self.create_leads(3)[0]
+        first = self.client.get("/api/services/getallleads")
+        self.assertNotEqual(self.client.get("/api/services/getallleads", {"page": 2})["ETag"], first["ETag"])
+
+        Followup.objects.filter(lead=lead).update(followup_remarks="changed")
+        LeadLog.objects.create(lead=lead, user=self.user, remarks="new remark")
+        response = self.client.get("/api/services/getallleads", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+        Division.objects.create(name="Windows")
+        first, second = self.revalidate("/api/services/getalldivisions")
+        self.division.name = "Furniture & Doors"
+        self.division.save()
+        response = self.client.get("/api/services/getalldivisions", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_lists_carry_validators(self):
+        self.create_leads(3)
+        first, second = self.revalidate("/api/services/getallleads", {"q": "Lead"})
+        self.assertEqual(second.status_code, 304)
+
+
+class ReferenceCacheTests(LeadTestMixin, TestCase):
+    reference_urls = [
+        "/api/services/getalldivisions",
+        "/api/services/getallsubdivisions",
+        "/api/services/getallbranches",
+    ]
+
+    def test_reference_lists_are_served_from_memory(self):
+        for url in self.reference_urls:
+            self.client.get(url)
+            # the token principal is cached as well
+            with self.assertNumQueries(0):
+                self.assertTrue(self.client.get(url).json()["success"], url)
+
+        data = self.client.get("/api/services/getallsubdivisions").json()["data"]
+        self.assertEqual(data[0]["division_name"], "Furniture")
+
+    def test_writes_invalidate(self):
+        self.client.get("/api/services/getallbranches")
+        Branch.objects.create(name="Pokhara")
+        names = [row["name"] for row in self.client.get("/api/services/getallbranches").json()["data"]]
+        self.assertEqual(names, ["Kathmandu", "Pokhara"])
+
+        self.division.name = "Timber"
+        self.division.save()
+        data = self.client.get("/api/services/getallsubdivisions").json()["data"]
+        self.assertEqual(data[0]["division_name"], "Timber")
+
+        self.branch.delete()
+        self.assertIsNone(get_fk_instance(Branch, "branch_id", self.branch.branch_id))
+
+    def test_rows_written_by_other_processes_resolve(self):
+        get_fk_instance(Branch, "branch_id", self.branch.branch_id)  # load the table
+        # bulk_create sends no signals, as if another process without a shared cache had written it
+        branch, = Branch.objects.bulk_create([Branch(name="Pokhara")])
+        self.assertEqual(get_fk_instance(Branch, "branch_id", branch.branch_id).name, "Pokhara")
+
+        division, = Division.objects.bulk_create([Division(name="Hardware")])
+        header = "name,contact,gender,address,email,division,branch\n"
+        row = f"Ram,9811111111,male,Kathmandu,ram@example.com,{division.pk},{branch.pk}\n"
+        csv = SimpleUploadedFile("leads.csv", (header + row).encode(), content_type="text/csv")
+        self.assertTrue(self.client.post("/api/services/importleads", {"file": csv}).json()["data"][0]["success"])
+        lead = Lead.objects.get(contact_normalized="9811111111")
+        self.assertEqual((lead.division_id, lead.branch_id), (division.pk, branch.pk))
+
+    def test_fk_resolution_does_not_query_reference_tables(self):
+        get_fk_instance(Division, "division_id", self.division.division_id)
+        get_fk_instance(SubDivision, "subdivision_id", self.subdivision.subdivision_id)
+        get_fk_instance(Branch, "branch_id", self.branch.branch_id)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/api/services/createlead", {
+                "name": "Caller", "contact": "9812345678", "gender": "male",
+                "division_id": self.division.division_id, "subdivision_id": self.subdivision.subdivision_id,
+                "branch_id": self.branch.branch_id,
+            })
+        self.assertTrue(response.json()["success"], response.content)
+        reference_tables = ("services_division", "services_subdivision", "services_branch")
+        self.assertFalse([q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT") and any(t in q["sql"].split("WHERE")[0] for t in reference_tables)])
+        lead = Lead.objects.get(name="Caller")
+        self.assertEqual((lead.division_id, lead.branch_id), (self.division.division_id, self.branch.branch_id))
+
+        response = self.client.post("/api/services/createlead", {"name": "Other", "contact": "9812345679", "branch_id": 999})
+        self.assertEqual(response.json()["message"], "Invalid Branch ID.")
+        self.assertIsNone(get_fk_instance(Division, "division_id", "abc"))
+
+
+class BootstrapTests(LeadTestMixin, TestCase):
+    def test_bundles_reference_data(self):
+        SubDivision.objects.create(name="Windows", division=self.division)
+        Division.objects.create(name="Hardware")
+        sales = Role.objects.create(role_name="sales")
+        Users.objects.create(full_name="Seller", contact=9800000001, password="secret", role=sales,
+                             gender="male", status="active")
+
+        data = self.client.get("/api/services/bootstrap").json()["data"]
+        self.assertEqual(
+            [(d["name"], [s["name"] for s in d["subdivisions"]]) for d in data["division_tree"]],
+            [("Furniture", ["Doors", "Windows"]), ("Hardware", [])],
+        )
+        self.assertEqual([b["name"] for b in data["branches"]], ["Kathmandu"])
+        self.assertEqual([r["role_name"] for r in data["roles"]], ["admin", "sales"])
+        self.assertEqual([u["full_name"] for u in data["users"]], ["Seller"])
+
+    def test_fixed_queries_and_content_etag(self):
+        Role.objects.create(role_name="sales")
+        for count in (1, 5):
+            cache.clear()
+            for i in range(count):
+                Branch.objects.create(name=f"Branch {i}")
+            self.client.get("/api/user/checktoken")  # warm the principal cache
+            # one per reference table and one for the users
+            with self.assertNumQueries(6):
+                first = self.client.get("/api/services/bootstrap")
+
+        # the cache key must be valid for memcached too
+        with self.assertNumQueries(0), warnings.catch_warnings():
+            warnings.simplefilter("error", CacheKeyWarning)
+            second = self.client.get("/api/services/bootstrap", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 304)
+
+        Branch.objects.create(name="Pokhara")
+        third = self.client.get("/api/services/bootstrap", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third["ETag"], first["ETag"])
+
+
+class LeadVisibilityTests(LeadTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Users.objects.create(full_name="Other", contact=9800000001, password="secret",
+                                          role=self.role, gender="male", status="active")
+
+    def visible(self, user):
+        return set(LeadVisibility.objects.filter(user=user).values_list("lead_id", flat=True))
+
+    def my_leads(self):
+        return {row["lead_id"] for row in self.client.get("/api/services/getleadsaccordingtouser").json()["data"]}
+
+    def test_follows_create_reassign_and_assignments(self):
+        created = Lead.objects.create(name="Mine", gender="male", created_by=self.user)
+        assigned = Lead.objects.create(name="Assigned", gender="male", created_by=self.other, assign_to=self.user)
+        shared = Lead.objects.create(name="Shared", gender="male", created_by=self.other)
+        Lead.objects.create(name="Theirs", gender="male", created_by=self.other)
+        assignment = AssignToUser.objects.create(lead=shared, user=self.user)
+        self.assertEqual(self.my_leads(), {created.lead_id, assigned.lead_id, shared.lead_id})
+
+        assigned.assign_to = self.other
+        assigned.save()
+        assignment.delete()
+        self.assertEqual(self.my_leads(), {created.lead_id})
+        self.assertEqual(self.visible(self.other), set(Lead.objects.exclude(pk=created.pk).values_list("pk", flat=True)))
+
+        shared.delete()
+        self.assertFalse(LeadVisibility.objects.filter(lead_id=shared.lead_id).exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        lead = Lead.objects.create(name="Mine", gender="male", created_by=self.user, assign_to=self.other)
+        LeadVisibility.objects.filter(user=self.other).delete()
+        LeadVisibility.objects.create(lead=lead, user=Users.objects.create(
+            full_name="Stale", contact=9800000002, password="secret", role=self.role, gender="male"))
+
+        out = StringIO()
+        call_command("rebuild_lead_visibility", check=True, stdout=out)
+        self.assertIn("1 missing rows, 1 stale rows", out.getvalue())
+        call_command("rebuild_lead_visibility", stdout=out)
+        self.assertEqual(set(LeadVisibility.objects.values_list("lead_id", "user_id")),
+                         {(lead.lead_id, self.user.user_id), (lead.lead_id, self.other.user_id)})
+
+    def test_benchmark_command(self):
+        self.create_leads(3)
+        out = StringIO()
+        call_command("benchmark_lead_visibility", iterations=1, explain=True, stdout=out)
+        self.assertIn("ms/page+count", out.getvalue())
+        self.assertIn("visibility", out.getvalue())
+        self.assertIn("Limit", out.getvalue())
+
+
+class OverdueSweeperTests(LeadTestMixin, TestCase):
+    def followup(self, lead, hours, followup_type="pending"):
+        return Followup.objects.create(lead=lead, user=self.user, followup_type=followup_type,
+                                       followup_date=timezone.now() + timedelta(hours=hours))
+
+    def test_sweeps_due_pending_followups_in_chunks(self):
+        leads = self.create_leads(5, start=1)  # each with a pending followup due in the future
+        due = [self.followup(lead, -1 - i) for i, lead in enumerate(leads)]
+        self.followup(leads[0], -2, followup_type="completed")
+        generation = lead_list_generation()
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("sweep_overdue_followups", chunk_size=2, stdout=out)
+        self.assertIn("5 followups marked overdue", out.getvalue())
+        self.assertEqual(set(Followup.objects.filter(followup_type="overdue").values_list("pk", flat=True)),
+                         {f.pk for f in due})
+        self.assertEqual(Followup.objects.filter(followup_type="pending").count(), 5)
+        self.assertEqual(LeadLog.objects.filter(remarks=OVERDUE_REMARKS, followup__in=due).count(), 5)
+        self.assertNotEqual(lead_list_generation(), generation)
+
+    def test_reruns_pick_up_followups_due_before_the_watermark(self):
+        lead = self.create_leads(1, start=1)[0]
+        self.followup(lead, -1)
+        self.assertEqual(sweep_overdue_followups()[0], 1)
+        self.assertEqual(sweep_overdue_followups()[0], 0)
+
+        # created after the last run but already due before its watermark
+        late = self.followup(lead, -3)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(sweep_overdue_followups()[0], 1)
+        late.refresh_from_db()
+        self.assertEqual(late.followup_type, "overdue")
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            sql = next(q["sql"] for q in ctx.captured_queries if "UPDATE services_followup" in q["sql"])
+            cursor.execute(f"EXPLAIN {sql}")
+            self.assertIn("followup_type_date", "\n".join(row[0] for row in cursor.fetchall()))
+
+
+#Needs committed rows, a lock is only skipped when another session holds it
+class OverdueSweeperLockTests(LeadTestMixin, TransactionTestCase):
+    def test_locked_followups_are_swept_on_the_next_run(self):
+        lead = self.create_leads(1, start=1)[0]
+        locked, free = [Followup.objects.create(lead=lead, user=self.user, followup_type="pending",
+                                                followup_date=timezone.now() - timedelta(hours=hours))
+                        for hours in (2, 1)]
+
+        other = connections.create_connection("default")
+        self.addCleanup(other.close)
+        other.set_autocommit(False)
+        with other.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM services_followup WHERE followup_id = %s FOR UPDATE", [locked.pk])
+            self.assertEqual(sweep_overdue_followups()[0], 1)
+        self.assertEqual(overdue_watermark().value, locked.followup_date)
+        other.rollback()
+
+        self.assertEqual(sweep_overdue_followups()[0], 1)
+        self.assertEqual(Followup.objects.get(pk=locked.pk).followup_type, "overdue")
+        self.assertGreater(overdue_watermark().value, free.followup_date)
+
+
+class FollowupTypeListTests(LeadTestMixin, TestCase):
+    def test_pages_hold_only_leads_with_followups_of_the_type(self):
+        leads = self.create_leads(6)  # pending followups only
+        Lead.objects.create(name="No followups", gender="male")
+        today = timezone.now().replace(hour=12, minute=0)
+        lead = leads[2]
+        older = Followup.objects.create(lead=lead, user=self.user, followup_type="overdue",
+                                        followup_date=today - timedelta(days=3))
+        undated = Followup.objects.create(lead=lead, user=self.user, followup_type="overdue", followup_date=None)
+        newer = Followup.objects.create(lead=lead, user=self.user, followup_type="overdue",
+                                        followup_date=today + timedelta(days=3))
+        due_today = Followup.objects.create(lead=lead, user=self.user, followup_type="overdue", followup_date=today)
+        Followup.objects.create(lead=leads[4], user=self.user, followup_type="overdue",
+                                followup_date=today - timedelta(days=1))
+
+        body = self.client.get("/api/services/getalloverduefollowup").json()
+        self.assertEqual([row["lead_id"] for row in body["data"]], [leads[4].lead_id, lead.lead_id])
+        self.assertEqual(body["total_leads"], 2)
+        self.assertEqual([f["followup_id"] for f in body["data"][1]["followups"]],
+                         [due_today.pk, newer.pk, older.pk, undated.pk])
+
+        body = self.client.get("/api/services/getoverduefollowupbyid/" + str(lead.lead_id)).json()
+        self.assertEqual([f["followup_id"] for f in body["data"]["followups"]],
+                         [due_today.pk, newer.pk, older.pk, undated.pk])
+
+        self.assertEqual(self.client.get("/api/services/getallpendingfollowup").json()["total_leads"], 6)
+        self.assertEqual(self.client.get("/api/services/getallcompletedfollowup").json()["data"], [])
+
+    def test_query_count_is_bounded(self):
+        self.client.get("/api/user/checktoken")  # warm the principal cache
+        counts = []
+        for start in (0, 10):
+            self.create_leads(10, start=start)
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get("/api/services/getallpendingfollowup")
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class FollowupAgendaTests(LeadTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.lead = Lead.objects.create(name="Card", contact=9700000000, city="Pokhara", gender="male")
+        self.other = Users.objects.create(full_name="Other", contact=9800000001, password="secret",
+                                          role=self.role, gender="male", status="active")
+        midnight = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.followups = {}
+        for name, days, hours, followup_type in [("late", -2, 9, "pending"), ("done", -1, 9, "completed"),
+                                                 ("afternoon", 0, 15, "pending"), ("morning", 0, 9, "pending"),
+                                                 ("friday", 4, 9, "pending"), ("later", 10, 9, "pending")]:
+            self.followups[name] = Followup.objects.create(
+                lead=self.lead, user=self.user, followup_type=followup_type,
+                followup_date=midnight + timedelta(days=days, hours=hours),
+            )
+        Followup.objects.create(lead=self.lead, user=self.other, followup_type="pending", followup_date=midnight)
+
+    def agenda(self, **params):
+        response = self.client.get("/api/services/followupagenda", params)
+        self.assertTrue(response.streaming)
+        body = json.loads(b"".join(response.streaming_content))
+        self.assertTrue(body["success"], body)
+        return [self.name_of(row["followup_id"]) for row in body["data"]], body["data"]
+
+    def name_of(self, followup_id):
+        return next(name for name, f in self.followups.items() if f.pk == followup_id)
+
+    def test_windows(self):
+        names, rows = self.agenda()
+        self.assertEqual(names, ["morning", "afternoon"])
+        self.assertEqual((rows[0]["name"], rows[0]["city"], rows[0]["lead_id"]), ("Card", "Pokhara", self.lead.lead_id))
+        self.assertEqual(self.agenda(window="week")[0], ["morning", "afternoon", "friday"])
+        self.assertEqual(self.agenda(window="overdue")[0][:1], ["late"])
+        day = (timezone.now() - timedelta(days=2)).date().isoformat()
+        self.assertEqual(self.agenda(**{"from": day, "to": day})[0], ["late"])
+        self.assertEqual(self.agenda(window="week", followup_type="completed")[0], [])
+
+    def test_bad_window(self):
+        body = self.client.get("/api/services/followupagenda", {"window": "year"}).json()
+        self.assertEqual(body["message"], "Unknown window. Use one of: today, week, overdue")
+
+    def test_range_uses_user_date_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.agenda(window="week")
+        sql = ctx.captured_queries[-1]["sql"]
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}")
+            self.assertIn("followup_user_date", "\n".join(row[0] for row in cursor.fetchall()))
+
+
+class FollowupCountTests(LeadTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_branch = Branch.objects.create(name="Pokhara")
+        self.create_leads(3)  # one pending followup each
+        lead = Lead.objects.create(name="Elsewhere", gender="male", branch=self.other_branch)
+        Followup.objects.create(lead=lead, user=self.user, followup_type="overdue")
+        Followup.objects.create(lead=lead, user=self.user, followup_type="completed", status="completed")
+        self.client.get("/api/user/checktoken")  # warm the principal cache
+
+    def test_totals_from_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/services/followupcounts")
+        self.assertEqual(response["Cache-Control"], "private, max-age=5")
+        counts = response.json()["data"]
+        self.assertEqual((counts["all"], counts["pending"], counts["overdue"], counts["completed"]), (5, 3, 1, 1))
+        self.assertEqual(counts["status_completed"], 1)
+
+        with self.assertNumQueries(0):
+            self.client.get("/api/services/followupcounts")
+        Followup.objects.create(lead=Lead.objects.get(name="Elsewhere"), user=self.user, followup_type="pending")
+        self.assertEqual(self.client.get("/api/services/followupcounts").json()["data"]["pending"], 4)
+
+    def test_filtered_and_grouped(self):
+        counts = self.client.get("/api/services/followupcounts", {"branch_id": self.other_branch.branch_id}).json()["data"]
+        self.assertEqual((counts["all"], counts["pending"]), (2, 0))
+
+        with self.assertNumQueries(1):
+            groups = self.client.get("/api/services/followupcounts", {"group_by": "branch"}).json()["data"]
+        self.assertEqual([(g["branch_id"], g["all"], g["overdue"]) for g in groups],
+                         [(self.branch.branch_id, 3, 0), (self.other_branch.branch_id, 2, 1)])
+
+        body = self.client.get("/api/services/followupcounts", {"group_by": "dealer"}).json()
+        self.assertEqual(body["message"], "Unknown group_by. Use one of: user, branch, division")
+
+
+class BatchFollowupTests(LeadTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.leads = self.create_leads(4)
+        self.followups = [lead.followups.get() for lead in self.leads]
+        self.other = Users.objects.create(full_name="Other", contact=9800000001, password="secret",
+                                          role=self.role, gender="male", status="active")
+        self.client.get("/api/user/checktoken")  # warm the principal cache
+
+    def batch(self, operations):
+        return self.client.post("/api/services/batchfollowups", {"operations": operations}, format="json").json()
+
+    def test_applies_operations_with_per_item_results(self):
+        f = self.followups
+        body = self.batch([
+            {"op": "complete", "followup_id": f[0].pk, "notes": "closed on call"},
+            {"op": "reschedule", "followup_id": f[1].pk, "followup_date": "2030-01-31 10:00"},
+            {"op": "reassign", "followup_id": f[2].pk, "user_id": self.other.user_id},
+            {"op": "reassign", "followup_id": f[3].pk, "user_id": 999999},
+            {"op": "archive", "followup_id": f[3].pk},
+            {"op": "complete", "followup_id": 999999},
+        ])
+        self.assertEqual(body["message"], "3 of 6 followup operations applied")
+        self.assertEqual([(r["success"], r["message"]) for r in body["data"]], [
+            (True, "Followup completed"),
+            (True, "Followup rescheduled to 2030-01-31 10:00"),
+            (True, "Followup reassigned to Other"),
+            (False, "User not found"),
+            (False, "Unknown op. Use one of: complete, reschedule, reassign"),
+            (False, "Followup not found"),
+        ])
+        for followup in f:
+            followup.refresh_from_db()
+        self.assertEqual((f[0].followup_type, f[0].status, f[0].notes), ("completed", "completed", "closed on call"))
+        self.assertIsNotNone(f[0].completed_at)
+        self.assertEqual(f[1].followup_date.year, 2030)
+        self.assertEqual(f[2].user_id, self.other.user_id)
+        self.assertEqual(f[3].user_id, self.user.user_id)
+        self.assertEqual(LeadLog.objects.filter(followup__in=f[:3], user=self.user).exclude(remarks__startswith="remark").count(), 3)
+
+        body = self.batch([{"op": "reschedule", "followup_id": f[0].pk, "followup_date": "2030-02-01 10:00"}])
+        self.assertEqual(body["data"][0]["message"], "Followup is already completed")
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        counts = []
+        for followups in (self.followups[:1], self.followups):
+            with CaptureQueriesContext(connection) as ctx:
+                self.batch([{"op": "reschedule", "followup_id": f.pk, "followup_date": "2030-01-31 10:00"} for f in followups])
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_rejects_bad_payloads(self):
+        self.assertEqual(self.batch([])["message"], "operations must be a non-empty list")
+
+    def test_lead_lists_are_invalidated_after_the_commit(self):
+        generation = lead_list_generation()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.batch([{"op": "complete", "followup_id": self.followups[0].pk}])
+            # not bumped while the writes are still uncommitted
+            self.assertEqual(lead_list_generation(), generation)
+        callbacks[0]()
+        self.assertNotEqual(lead_list_generation(), generation)
+
+
+#Sample upload shared by the row importer and the COPY import tests
+class ImportSampleMixin:
+    header = "name,contact,gender,address,email,division,branch,assign_to,is_customer,lead_type,followup_date,followup_type,followup_remarks,remarks\n"
+
+    def sample(self):
+        d, b, u = self.division.pk, self.branch.pk, self.user.pk
+        return (
+            f"Ram,9811111111,Male,Kathmandu,ram@example.com,{d},{b},{u},false,Before Visit,2030-01-31 10:00,pending,call,first visit\n"
+            f"Sita,98111,female,Lalitpur,sita@example.com,,,,,,,,,\n"
+            f"Hari,9700000000,male,Bhaktapur,hari@example.com,,,,,,,,,\n"
+            f"Gita,9822222222,female,Pokhara,not-an-email,,,,,,,,,\n"
+            f"Shyam,9811111111,male,Butwal,shyam@example.com,,,,,,,,,\n"
+            f"Mina,9833333333,female,Dharan,mina@example.com,999,,,TRUE,raw,,,,\n"
+            f"Kiran,9844444444,other,Hetauda,kiran@example.com,,,,,,,,,\n"
+        )
+
+    expected = [
+        {"row": 0, "success": True},
+        {"row": 1, "message": "Contact number must be 10 digits"},
+        {"row": 2, "message": "Contact number already exists"},
+        {"row": 3, "message": "Invalid email format"},
+        {"row": 4, "message": "Contact number already exists"},
+        {"row": 5, "success": True},
+        {"row": 6, "message": "Gender must be male or female"},
+    ]
+
+    def assert_sample_written(self):
+        d, b, u = self.division.pk, self.branch.pk, self.user.pk
+        ram = Lead.objects.get(contact_normalized="9811111111")
+        self.assertEqual((ram.gender, ram.lead_type, ram.division_id, ram.branch_id, ram.assign_to_id, ram.created_by_id),
+                         ("male", "before visit", d, b, u, u))
+        followup = ram.followups.get()
+        self.assertEqual((followup.followup_type, followup.followup_date.hour), ("pending", 10))
+        self.assertEqual(ram.lead_logs.get().followup, followup)
+        self.assertTrue(ram.assign_to_users.filter(user_id=u).exists())
+        self.assertTrue(LeadVisibility.objects.filter(lead=ram, user_id=u).exists())
+        mina = Lead.objects.get(contact_normalized="9833333333")
+        self.assertEqual((mina.is_customer, mina.lead_type, mina.division_id), (True, "completed", None))
+
+
+class LeadImportTests(ImportSampleMixin, LeadTestMixin, TestCase):
+    def upload(self, body):
+        csv = SimpleUploadedFile("leads.csv", (self.header + body).encode(), content_type="text/csv")
+        return self.client.post("/api/services/importleads", {"file": csv}).json()
+
+    def test_per_row_report_and_rows_written(self):
+        self.create_leads(1)  # contact 9700000000
+        body = self.upload(self.sample())
+        self.assertEqual(body["data"], self.expected)
+        self.assert_sample_written()
+
+    def test_query_count_does_not_grow_with_rows(self):
+        counts = []
+        # the first upload also warms the principal and reference caches
+        for start, rows in ((9810000000, 1), (9811000000, 5), (9812000000, 50)):
+            body = "".join(f"Lead {i},{start + i},male,Kathmandu,lead{i}@example.com,,,,,,2030-01-31 10:00,pending,call,note\n"
+                           for i in range(rows))
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertTrue(all(r.get("success") for r in self.upload(body)["data"]))
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[1], counts[2])
+        self.assertEqual(Lead.objects.filter(followups__followup_remarks="call").count(), 56)
+
+    def test_rejects_missing_columns(self):
+        csv = SimpleUploadedFile("leads.csv", b"name,contact\nRam,9811111111\n", content_type="text/csv")
+        body = self.client.post("/api/services/importleads", {"file": csv}).json()
+        self.assertEqual(body["message"], "Column gender not found in file")
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_lead_import", rows=50, stdout=out)
+        self.assertIn("50/50 rows imported", out.getvalue())
+        self.assertFalse(Lead.objects.filter(name="Lead 0").exists())
+
+
+class ImportJobTests(LeadTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+
+    def queue(self, body):
+        csv = SimpleUploadedFile("leads.csv", (LeadImportTests.header + body).encode(), content_type="text/csv")
+        return self.client.post("/api/services/importjobs", {"file": csv}).json()
+
+    def test_upload_is_queued_and_processed_by_the_worker(self):
+        body = "".join(f"Lead {i},{9811000000 + i},male,Kathmandu,lead{i}@example.com,,,,,,,,,\n" for i in range(5))
+        body += "Bad,98111,female,Lalitpur,bad@example.com,,,,,,,,,\n"
+        job = self.queue(body)["data"]
+        self.assertEqual((job["status"], job["progress"]), ("queued", 0))
+        self.assertFalse(Lead.objects.exists())
+
+        out = StringIO()
+        call_command("run_import_worker", once=True, chunk_size=2, stdout=out)
+        self.assertIn(f"import {job['importjob_id']} completed: 5 of 6 rows imported", out.getvalue())
+
+        job = self.client.get(f"/api/services/importjobs/{job['importjob_id']}").json()["data"]
+        self.assertEqual(
+            (job["status"], job["total_rows"], job["processed_rows"], job["accepted_rows"], job["rejected_rows"], job["progress"]),
+            ("completed", 6, 6, 5, 1, 100.0),
+        )
+        self.assertEqual(Lead.objects.count(), 5)
+
+        response = self.client.get(f"/api/services/importjobs/{job['importjob_id']}/errors")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "row," + LeadImportTests.header.strip() + ",error")
+        self.assertTrue(lines[1].startswith("5,Bad,98111,"))
+        self.assertTrue(lines[1].endswith(",Contact number must be 10 digits"))
+
+    def test_workers_claim_distinct_jobs(self):
+        first = self.queue("Ram,9811111111,male,Kathmandu,ram@example.com,,,,,,,,,\n")["data"]
+        second = self.queue("Sita,9822222222,female,Lalitpur,sita@example.com,,,,,,,,,\n")["data"]
+        with CaptureQueriesContext(connection) as ctx:
+            claimed = [claim_import_job(), claim_import_job(), claim_import_job()]
+        self.assertEqual([job and job.pk for job in claimed], [first["importjob_id"], second["importjob_id"], None])
+        self.assertTrue(any("FOR UPDATE SKIP LOCKED" in q["sql"] for q in ctx.captured_queries))
+
+    def test_stale_running_jobs_are_resumed_by_another_worker(self):
+        body = "".join(f"Lead {i},{9811000000 + i},male,Kathmandu,lead{i}@example.com,,,,,,,,,\n" for i in range(5))
+        job = ImportJob.objects.get(pk=self.queue(body + "Bad,98111,female,Lalitpur,bad@example.com,,,,,,,,,\n")["data"]["importjob_id"])
+        busy = ImportJob.objects.get(pk=self.queue(body)["data"]["importjob_id"])
+        ImportJob.objects.filter(pk=busy.pk).update(status="running", heartbeat_at=timezone.now())
+        # a worker died after committing the first two rows
+        for i in range(2):
+            Lead.objects.create(name=f"Lead {i}", contact=9811000000 + i, gender="male", created_by=self.user)
+        ImportJob.objects.filter(pk=job.pk).update(status="running", processed_rows=2, accepted_rows=2,
+                                                   heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        claimed = claim_import_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNone(claim_import_job())
+        job = run_import_job(claimed, chunk_size=2)
+        self.assertEqual((job.status, job.total_rows, job.accepted_rows, job.rejected_rows), ("completed", 6, 5, 1))
+        self.assertEqual(Lead.objects.count(), 5)
+
+    def test_a_worker_that_lost_its_lease_stops(self):
+        body = "".join(f"Lead {i},{9811000000 + i},male,Kathmandu,lead{i}@example.com,,,,,,,,,\n" for i in range(4))
+        self.queue(body)
+        claimed = claim_import_job()
+        # another worker took the job over and moved it on
+        ImportJob.objects.filter(pk=claimed.pk).update(processed_rows=2)
+        job = run_import_job(claimed, chunk_size=2)
+        self.assertEqual((job.status, job.processed_rows, job.finished_at), ("running", 2, None))
+        self.assertFalse(Lead.objects.exists())
+
+    def test_jobs_are_private_and_checked_on_upload(self):
+        self.assertEqual(self.client.get("/api/services/importjobs/999").json()["message"], "Import job not found.")
+        csv = SimpleUploadedFile("leads.csv", b"name,contact\nRam,9811111111\n", content_type="text/csv")
+        body = self.client.post("/api/services/importjobs", {"file": csv}).json()
+        self.assertEqual(body["message"], "Column gender not found in file")
+
+
+class CopyImportTests(ImportSampleMixin, LeadTestMixin, TestCase):
+    def upload(self, body):
+        csv = SimpleUploadedFile("leads.csv", (self.header + body).encode(), content_type="text/csv")
+        return self.client.post("/api/services/importleads?mode=copy", {"file": csv}).json()
+
+    def test_same_report_and_rows_as_the_row_importer(self):
+        self.create_leads(1)  # contact 9700000000
+        body = self.upload(self.sample())
+        self.assertEqual((body["imported"], body["rejected"]), (2, 5))
+        self.assertEqual(body["data"], [row for row in self.expected if not row.get("success")])
+        self.assert_sample_written()
+        self.assertIsNotNone(Lead.objects.get(contact_normalized="9811111111").search_vector)
+
+    def test_management_command_and_extra_columns(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write("notes," + self.header)
+            for i in range(100):
+                file.write(f"x,Lead {i},{9811000000 + i},female,Kathmandu,lead{i}@example.com,,,,,,,,,\n")
+            file.write("x,Lead dup,9811000000,female,Kathmandu,dup@example.com,,,,,,,,,\n")
+        self.addCleanup(os.unlink, file.name)
+        errors = file.name + ".errors.csv"
+        self.addCleanup(lambda: os.path.exists(errors) and os.unlink(errors))
+
+        out = StringIO()
+        call_command("import_leads_copy", file.name, user=self.user.user_id, errors=errors, stdout=out)
+        self.assertIn("100/101 rows imported, 1 rejected", out.getvalue())
+        with open(errors) as rejected:
+            self.assertEqual(rejected.read().splitlines(), ["row,error", "100,Contact number already exists"])
+        self.assertEqual(LeadVisibility.objects.filter(user=self.user).count(), 100)
+
+    def test_malformed_lines_reject_only_their_row(self):
+        self.header = "name,contact,gender,address,email,tentetive_visit_date,tentetive_purchase_date\n"
+        body = self.upload(
+            "Ram,9811111111,male,Kathmandu,ram@example.com,2030-01-31,\n"
+            "\n"  # blank lines are skipped and not numbered, as read_csv skips them
+            "Sita,9822222222,female,Pokhara,sita@example.com,,,extra\n"
+            "Hari\x00,9833333333,male,Butwal,hari@example.com\n"  # short rows are padded
+            "Gita,9844444444,female,Lalitpur,gita@example.com,now,\n"
+            "Rita,9855555555,female,Dharan,rita@example.com,,today 10:00\n"
+            "Mina,9866666666,female,Biratnagar,mina@example.com,infinity,\n"
+        )
+        self.assertEqual(body["imported"], 2)
+        date_error = "Invalid tentetive date, use YYYY-MM-DD or YYYY-MM-DD HH:MM"
+        self.assertEqual(body["data"], [
+            {"row": 1, "message": "Row has 8 fields, the header has 7"},
+            {"row": 3, "message": date_error}, {"row": 4, "message": date_error}, {"row": 5, "message": date_error},
+        ])
+        self.assertEqual(Lead.objects.get(contact_normalized="9833333333").name, "Hari")
+
+
+#Workbook bytes of rows. Not write-only: those sheets have no <dimension> tag, and opening
+#one in read-only mode parses the whole sheet once to size it. Excel always writes the tag.
+def xlsx_bytes(rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+class XlsxImportTests(ImportSampleMixin, LeadTestMixin, TestCase):
+    #The CSV sample with the cells typed the way Excel stores them
+    def sample_rows(self):
+        def cell(value):
+            if value.isdigit():
+                return int(value)
+            if value.lower() in ("true", "false"):
+                return value.lower() == "true"
+            if value.startswith("2030-"):
+                return datetime.strptime(value, "%Y-%m-%d %H:%M")
+            return value or None
+        lines = (self.header + self.sample()).splitlines()
+        return [lines[0].split(",")] + [[cell(value) for value in line.split(",")] for line in lines[1:]]
+
+    def upload(self, rows, name="leads.xlsx", path="/api/services/importleads"):
+        xlsx = SimpleUploadedFile(name, xlsx_bytes(rows))
+        return self.client.post(path, {"file": xlsx}).json()
+
+    def test_same_report_and_rows_as_the_csv_import(self):
+        self.create_leads(1)  # contact 9700000000
+        rows = self.sample_rows()
+        rows.insert(3, [None] * len(rows[0]))  # blank rows are skipped, as read_csv skips blank lines
+        self.assertEqual(self.upload(rows)["data"], self.expected)
+        self.assert_sample_written()
+
+    def test_rows_are_numbered_across_chunks(self):
+        rows = [["name", "contact"]] + [[f"Lead {i}", 9811000000 + i] for i in range(5)]
+        chunks = list(read_xlsx_chunks(BytesIO(xlsx_bytes(rows)), chunk_size=2))
+        self.assertEqual([list(chunk.index) for chunk in chunks], [[0, 1], [2, 3], [4]])
+        self.assertEqual(chunks[2].loc[4].tolist(), ["Lead 4", "9811000004"])
+
+    def test_missing_columns_and_copy_mode(self):
+        self.assertEqual(self.upload([["name", "contact"], ["Ram", 9811111111]])["message"], "Column gender not found in file")
+        self.assertEqual(self.upload([self.header.split(",")])["message"], "No data found in file")
+        body = self.upload(self.sample_rows(), path="/api/services/importleads?mode=copy")
+        self.assertEqual(body["message"], "Copy mode accepts CSV files only")
+
+    def test_import_job_accepts_workbooks(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        job = self.upload(self.sample_rows(), path="/api/services/importjobs")["data"]
+        call_command("run_import_worker", once=True, chunk_size=3, stdout=StringIO())
+        job = self.client.get(f"/api/services/importjobs/{job['importjob_id']}").json()["data"]
+        self.assertEqual((job["status"], job["total_rows"], job["accepted_rows"]), ("completed", 7, 3))
+
+    def test_peak_memory_does_not_grow_with_the_sheet(self):
+        def peak(rows):
+            sheet = [["name", "contact", "gender", "address", "email", "followup_date"]] + [
+                ["Lead", 9800000000 + i, "male", "Kathmandu", "lead@example.com", datetime(2030, 1, 31, 10)]
+                for i in range(rows)
+            ]
+            file = BytesIO(xlsx_bytes(sheet))
+            del sheet
+            gc.collect()
+            tracemalloc.start()
+            try:
+                self.assertEqual(sum(len(chunk) for chunk in read_xlsx_chunks(file, chunk_size=250)), rows)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        peak(100)  # first use imports and caches what the reads share
+        small, large = peak(1000), peak(16000)
+        # keeping ~90 bytes per row, like openpyxl's own iter_rows, would add about 1.3 MB here
+        self.assertLess(large - small, 512 * 1024)
+        self.assertLess(large, 4 * 1024 * 1024)
+
+    def test_other_openpyxl_releases_use_the_public_reader(self):
+        rows = [["name", "contact", "followup_date"], ["Ram", 9811111111, datetime(2030, 1, 31, 10)], [None, None, None],
+                ["Sita", 9822222222, None]]
+        data = xlsx_bytes(rows)
+        expected = [chunk.to_dict("records") for chunk in read_xlsx_chunks(BytesIO(data), chunk_size=1)]
+        with mock.patch("services.import_files.ROW_PARSER_VERSIONS", ("0.",)):
+            self.assertEqual([chunk.to_dict("records") for chunk in read_xlsx_chunks(BytesIO(data), chunk_size=1)], expected)
+        self.assertEqual(expected[1], [{"name": "Sita", "contact": "9822222222", "followup_date": None}])
\ No newline at end of file
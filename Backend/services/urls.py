@@ -3,6 +3,7 @@ from django.urls import path
 from .views import *
 
 urlpatterns = [
+    path("bootstrap", bootstrap), #all reference data for frontend startup
     path("createdivision",createdivision), #create division 
     path("getalldivisions",getalldivisions), #get all divisions 
     path("updatedivision/<int:id>",updatedivision), #update division 
@@ -21,10 +22,12 @@ urlpatterns = [
     path("createlead",createlead), #create lead 
     path("getallleads", getallleads), #get all status leads 
     path("getlead/<int:id>", getlead), #get one lead as specific  
+    path("lookupleadbyphone", lookupleadbyphone), #resolve incoming call number to leads
     path("updatelead/<int:id>", updatelead),# update leads 
     # path("deletelead/<int:id>", deletelead), #delete lead 
     path ("leadlogdetails/<int:id>", leadlogdetails), #lead log details
     path ("allleadlogdetails", allleadlogdetails), #all lead log details
+    path("leads", getleadsbystage), #leads of one stage: ?stage=raw|before_visit|after_visit|completed|customer
     path("getrawleads", getrawleads), #get raw leads 
     path("getrawleadbyid/<int:id>", getrawleadbyid), #get raw leads by id
     path("getaftervisitleads", getaftervisitleads), #get after visit leads
@@ -39,9 +42,12 @@ urlpatterns = [
     path("getassignlead/<int:id>", getassignlead), #assign lead to user
     path("getleadsaccordingtouser", get_leads_according_to_user), #get leads according to user
     path("getallfollowup", getallfollowup), #get all followup
+    path("followupcounts", followupcounts), #followup totals per type and status, ?group_by=user|branch|division
+    path("followupagenda", followupagenda), #caller's followups in a date window: ?window=today|week|overdue or ?from=&to=
     path("followupleadreschedule/<int:id>", followup_lead_reschedule), #followup lead reschedule
     path("getfollowupbyid/<int:id>", getfollowupbyid), #get followup by id
     path("updatefollowup/<int:id>", updatefollowup), #update followup by id
+    path("batchfollowups", batchfollowups), #complete, reschedule or reassign many followups in one call
     path("getallcompletedfollowup", getallcompletedfollowup), #get all completed followup
     path("getcompletedfollowupbyid/<int:id>", getcompletedfollowupbyid), #get completed followup by id
     path("getalloverduefollowup", getalloverduefollowup), #get all overdue followup
@@ -49,5 +55,8 @@ urlpatterns = [
     path("getallpendingfollowup", getallpendingfollowup), #get all pending followup
     path("getpendingfollowupbyid/<int:id>", getpendingfollowupbyid), #get pending followup by id
     path("importleads",importleads), #import all leads
+    path("importjobs", createimportjob), #queue a lead file for the background import workers
+    path("importjobs/<int:id>", getimportjob), #progress of an import job
+    path("importjobs/<int:id>/errors", importjoberrors), #rejected rows of an import job as CSV
     path("exportleads/",export_leads), #export all leads
     ]
\ No newline at end of file
@@ -1,5 +1,4 @@
 import re
-from django.http import JsonResponse
 from numpy.random import f
 from rest_framework.decorators import api_view
 from django.shortcuts import get_object_or_404
@@ -7,20 +6,35 @@ from django.utils import timezone
 from .imports_helper.helper import *
 from services.models import *
 from .serializers import FollowupSerializer
+from .lead_list import *
+from .conditional import *
+from .visibility import visible_leads
+from .followup_batch import BATCH_FOLLOWUP_LIMIT, apply_followup_operations
+from .lead_import import LeadImporter, missing_import_columns
+from .import_jobs import import_job_row
+from .import_files import is_xlsx, read_import_chunks, read_import_header
+from .copy_import import copy_import_leads
+from .agenda import OPEN_FOLLOWUP_TYPES, agenda_queryset, agenda_rows, agenda_window
 from user.essentials import *
 from user.views import *
+from user.refdata import REFERENCE_TABLES, reference_get, reference_rows, reference_version
+from user.authentication import principal_generation
+from user.directory import directory_row, subordinate_users
+from user.renderers import render_json
+from django.conf import settings
+from django.core.cache import cache
+import hashlib
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from datetime import datetime
 from .models import Lead
 from django.db.models import Q
-from django.db.models.functions import Lower
 from collections import defaultdict
 from datetime import datetime
 from django.utils.timezone import now
 from django.db.models import Prefetch
 import pandas as pd
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse
 
 today = now().date()
 
@@ -41,21 +55,85 @@ def createdivision(request):
     except Exception as e:
         return sendError(f"{e}")
 
+#Rows of getalldivisions, also part of the bootstrap response
+def division_rows():
+    return [
+        {
+            'division_id': division.division_id,
+            'name': division.name,
+            'created_at': division.created_at,
+            'updated_at': division.updated_at
+        } for division in reference_rows("divisions")
+    ]
+
+
 @api_view(["Get"])
 def getalldivisions(request):
     token = decodeToken(request)
     if token.get('error'):
         return sendError(token.get("messsage"))
     try:
-        divisions = Division.objects.all().values(
-            'division_id', 'name', 'created_at', 'updated_at'
-        )
-        divisions_list = list(divisions)
-        return sendSuccess(divisions_list, "All Divisions")
+        divisions = reference_rows("divisions")
+        etag, last_modified = reference_validators(request, "divisions", divisions)
+        if response := not_modified(request, etag, last_modified):
+            return response
+
+        return with_validators(sendSuccess(division_rows(), "All Divisions"), etag, last_modified)
+    except Exception as e:
+        print(e)
+        return sendError(f"{e}")
+
+#Reference data the frontend loads at startup, in one response. The body is cached per viewer
+#until a reference table or a user changes, and its content hash is the ETag.
+@api_view(["GET"])
+def bootstrap(request):
+    token = decodeToken(request)
+    if token.get('error'):
+        return sendError(token.get("message"))
+    try:
+        versions = [reference_version(table) for table in REFERENCE_TABLES]
+        # hashed, the role name and the version list are not cache-key safe (spaces) and the key stays short
+        parts = [token['user_id'], token['role'], principal_generation(), *versions]
+        key = "bootstrap:" + hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()
+        cached = cache.get(key)
+        if cached is None:
+            body = render_json({"success": True, "data": bootstrap_data(token), "message": "Bootstrap data"})
+            cached = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+            cache.set(key, cached, settings.REFERENCE_CACHE_TTL)
+
+        body, etag = cached
+        if response := not_modified(request, etag, None):
+            return response
+        return with_validators(HttpResponse(body, content_type="application/json"), etag, None)
     except Exception as e:
         print(e)
         return sendError(f"{e}")
 
+
+def bootstrap_data(token):
+    divisions = division_rows()
+    subdivisions = subdivision_rows()
+    children = defaultdict(list)
+    for sub in subdivisions:
+        children[sub['division_id']].append({'subdivision_id': sub['subdivision_id'], 'name': sub['subdivision_name']})
+    division_tree = [
+        {
+            'division_id': division['division_id'],
+            'name': division['name'],
+            'subdivisions': children[division['division_id']],
+        } for division in divisions
+    ]
+    return {
+        'divisions': divisions,
+        'subdivisions': subdivisions,
+        'division_tree': division_tree,
+        'branches': branch_rows(),
+        'roles': role_rows(),
+        'dealers': dealer_rows(),
+        'users': [directory_row(user) for user in subordinate_users(token['role'])],
+    }
+
+
 @api_view(["Post"])
 def updatedivision(request,id):
     token = decodeToken(request)
@@ -128,24 +206,30 @@ def createsubdivision(request):
     except Exception as e:
         return sendError(f"{e}")
 
+#Rows of getallsubdivisions, also part of the bootstrap response
+def subdivision_rows():
+    divisions = {division.division_id: division for division in reference_rows("divisions")}
+    data = []
+    for subdivision in reference_rows("subdivisions"):
+        division = divisions.get(subdivision.division_id)
+        data.append({
+            'subdivision_id': subdivision.subdivision_id,
+            'subdivision_name': subdivision.name,
+            'division_id': subdivision.division_id,
+            'division_name': division.name if division else None,
+            'created_at': subdivision.created_at,
+            'updated_at': subdivision.updated_at
+        })
+    return data
+
+
 @api_view(["Get"])
 def getallsubdivisions(request):
     token = decodeToken(request)
     if token.get('error'):
         return sendError(token.get("messsage"))
     try:
-        subdivisions = SubDivision.objects.all()
-        data = []
-        for subdivision in subdivisions:
-            data.append({
-                'subdivision_id': subdivision.subdivision_id,
-                'subdivision_name': subdivision.name,
-                'division_id': subdivision.division_id,
-                'division_name': subdivision.division.name,
-                'created_at': subdivision.created_at,
-                'updated_at': subdivision.updated_at
-            })
-        return sendSuccess(data, "All SubDivisions")
+        return sendSuccess(subdivision_rows(), "All SubDivisions")
     except Exception as e:
         return sendError(f"{e}")
 
@@ -223,17 +307,25 @@ def createBranch(request):
     except Exception as e:
         return sendError(f"{e}")
 
+#Rows of getallbranches, also part of the bootstrap response
+def branch_rows():
+    return [
+        {
+            'branch_id': branch.branch_id,
+            'name': branch.name,
+            'created_at': branch.created_at,
+            'updated_at': branch.updated_at
+        } for branch in reference_rows("branches")
+    ]
+
+
 @api_view(["Get"])
 def getallbranches(request):
     token = decodeToken(request)
     if token.get('error'):
         return sendError(token.get("messsage"))
     try:
-        branches = Branch.objects.all().values(
-            'branch_id', 'name', 'created_at', 'updated_at'
-        )
-        branches_list = list(branches)
-        return sendSuccess(branches_list, "All Branches")
+        return sendSuccess(branch_rows(), "All Branches")
     except Exception as e:
         print(e)
         return sendError(f"{e}")
@@ -309,31 +401,28 @@ def createlead(request):
             return sendError("Name is required.")
         if not contact or not str(contact).isdigit() or len(str(contact)) != 10:
             return sendError("Contact must be a 10-digit number.")
-        if Lead.objects.filter(contact=contact).exists():
+        if Lead.objects.filter(contact_normalized=normalize_phone(contact)).exists():
             return sendError("Contact already exists.")
 
         division = None
         division_id = data.get("division_id")
         if division_id not in [None, "", "null"]:
-            try:
-                division = Division.objects.get(division_id=division_id)
-            except Division.DoesNotExist:
+            division = reference_get("divisions", division_id)
+            if division is None:
                 return sendError("Invalid Division ID.")
 
         subdivision = None
         subdivision_id = data.get("subdivision_id")
         if subdivision_id not in [None, "", "null"]:
-            try:
-                subdivision = SubDivision.objects.get(subdivision_id=subdivision_id)
-            except SubDivision.DoesNotExist:
+            subdivision = reference_get("subdivisions", subdivision_id)
+            if subdivision is None:
                 return sendError("Invalid Subdivision ID.")
 
         branch = None
         branch_id = data.get("branch_id")
         if branch_id not in [None, "", "null"]:
-            try:
-                branch = Branch.objects.get(branch_id=branch_id)
-            except Branch.DoesNotExist:
+            branch = reference_get("branches", branch_id)
+            if branch is None:
                 return sendError("Invalid Branch ID.")
 
         assign_to = None
@@ -419,7 +508,7 @@ def updatelead(request, id):
             contact = str(data.get("contact", "")).strip()
             if not contact or not contact.isdigit() or len(contact) != 10:
                 return sendError("Contact must be a 10-digit number.")
-            if Lead.objects.filter(contact=contact).exclude(lead_id=id).exists():
+            if Lead.objects.filter(contact_normalized=normalize_phone(contact)).exclude(lead_id=id).exists():
                 return sendError("Contact already exists.")
             lead.contact = contact
         optional_fields = [
@@ -434,29 +523,26 @@ def updatelead(request, id):
         if "branch_id" in data:
             branch_id = data.get("branch_id")
             if branch_id:
-                try:
-                    branch = Branch.objects.get(branch_id=branch_id)
-                    lead.branch = branch
-                except Branch.DoesNotExist:
+                branch = reference_get("branches", branch_id)
+                if branch is None:
                     return sendError("Branch not found.")
+                lead.branch = branch
         if "division_id" in data:
             division_id = data.get("division_id")
             if division_id:
-                try:
-                    division = Division.objects.get(division_id=division_id)
-                    lead.division = division
-                except Division.DoesNotExist:
+                division = reference_get("divisions", division_id)
+                if division is None:
                     return sendError("Division not found.")
+                lead.division = division
             else:
                 lead.division = None
         if "subdivision_id" in data:
             subdivision_id = data.get("subdivision_id")
             if subdivision_id:
-                try:
-                    subdivision = SubDivision.objects.get(subdivision_id=subdivision_id)
-                    lead.subdivision = subdivision
-                except SubDivision.DoesNotExist:
+                subdivision = reference_get("subdivisions", subdivision_id)
+                if subdivision is None:
                     return sendError("Subdivision not found.")
+                lead.subdivision = subdivision
             else:
                 lead.subdivision = None
         if "assign_to" in data:
@@ -508,9 +594,6 @@ def getallleads(request):
     try:
         leads = Lead.objects.all()
         filters = {
-            "name__icontains": request.GET.get("name"),
-            "contact__icontains": request.GET.get("contact"),
-            "city__icontains": request.GET.get("city"),
             "lead_type__icontains": request.GET.get("lead_type"),
             "branch__icontains": request.GET.get("branch"),
             "gender__iexact": request.GET.get("gender")
@@ -520,21 +603,7 @@ def getallleads(request):
             if value:
                 leads = leads.filter(**{field: value})
 
-        division_id = request.GET.get("division_id")
-        if division_id:
-            leads = leads.filter(division__division_id=division_id)
-
-        subdivision_id = request.GET.get("subdivision_id")
-        if subdivision_id:
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
-
-        assign_to_id = request.GET.get("assign_to")
-        if assign_to_id:
-            leads = leads.filter(assign_to__user_id=assign_to_id)
-
-        branch_id = request.GET.get("branch_id")
-        if branch_id:
-            leads = leads.filter(branch__branch_id=branch_id)
+        leads = filter_leads(leads, request.GET)
 
         date_fields = {
             "tentetive_visit_date": request.GET.get("tentetive_visit_date"),
@@ -553,72 +622,30 @@ def getallleads(request):
                 except ValueError:
                     return sendError(f"Invalid format for {field}. Use YYYY-MM-DD.")
 
-        page = request.GET.get('page', 1)
-        paginator = Paginator(leads, 20)
-
-        try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
-        except EmptyPage:
-            leads_page = []
+        fields = sparse_fields(request.GET)
+        page, meta = lead_page_keys(leads, request.GET)
+        etag, last_modified = list_validators(request, leads, page, meta)
+        if response := not_modified(request, etag, last_modified):
+            return response
 
-        data = []
-        for lead in leads_page:
-            latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
-            assigned_user = lead.assign_to.full_name if lead.assign_to else None
-            followup = lead.followups.order_by('-followup_date').first() if lead.followups.exists() else None
+        lead_ids = [row["lead_id"] for row in page]
+        if fields:
+            data = sparse_lead_rows(lead_ids, fields)
+        else:
+            leads_page = lead_list_queryset(Lead.objects.filter(pk__in=lead_ids), with_latest_followup=True)
 
-            data.append({
-                'lead_id': lead.lead_id,
-                'name': lead.name,
-                'contact': lead.contact,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch':{
-                    'branch_id': lead.branch.branch_id,
-                    'branch_name': lead.branch.name
-                } if lead.branch else None,
-                'subbranch': lead.subbranch,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    'division_id': lead.division.division_id,
-                    'name': lead.division.name
-                } if lead.division else None,
-                'subdivision': {
-                    'subdivision_id': lead.subdivision.subdivision_id,
-                    'name': lead.subdivision.name
-                } if lead.subdivision else None,
-                'assign_to': assigned_user,
-                'created_by': lead.created_by.full_name if lead.created_by else None,
-                'followup': {
-                    'followup_date': followup.followup_date,
-                    'followup_type': followup.followup_type,
-                    'followup_remarks': followup.followup_remarks,
-                    'entry_date': followup.entry_date
-                } if followup else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                'remarks': latest_log.remarks if latest_log else None,
-                "is_customer": lead.is_customer
-            })
+            data = []
+            for lead in in_page_order(leads_page, lead_ids):
+                row = lead_row(lead)
+                row['followup'] = latest_followup(lead)
+                row['remarks'] = lead.latest_log_remarks
+                data.append(row)
 
-        return JsonResponse({
+        return with_validators(sendJson({
             'data': data,
-            'total_pages': paginator.num_pages,
-            'total_leads': paginator.count,
-            'current_page': int(page),
+            **meta,
             'message': "Leads fetched successfully"
-        }, safe=False, status=200)
+        }), etag, last_modified)
 
     except Exception as e:
         print(e)
@@ -688,104 +715,81 @@ def getlead(request, id):
     except Exception as e:
         return sendError(f"{e}")
 
+#Incoming-call lookup: exact match on a full number, prefix match while digits are still being typed
 @api_view(["GET"])
-def getaftervisitleads(request):
+def lookupleadbyphone(request):
     token = decodeToken(request)
     if token.get('error'):
         return sendError(token.get("message"))
     try:
-        # Show leads that are not raw, completed, or overdue
-        leads = Lead.objects.annotate(
-            lead_type_lower=Lower('lead_type')
-        ).exclude(
-            Q(lead_type_lower__icontains='raw') |
-            Q(lead_type_lower__icontains='completed') |
-            Q(lead_type_lower__icontains='complete') |
-            Q(lead_type_lower__icontains='overdue')
-        )
-        if name := request.GET.get("name"):
-            leads = leads.filter(name__icontains=name)
-
-        if contact := request.GET.get("contact"):
-            leads = leads.filter(contact__icontains=contact)
+        phone = normalize_phone(request.GET.get("phone"))
+        if not phone or len(phone) < 3:
+            return sendError("Phone must have at least 3 digits.")
 
-        if city := request.GET.get("city"):
-            leads = leads.filter(city__icontains=city)
+        leads = lead_list_queryset(with_latest_followup=True)
+        match = "exact"
+        matched = list(leads.filter(contact_normalized=phone)[:10]) if len(phone) == 10 else []
+        if not matched:
+            match = "prefix"
+            matched = list(leads.filter(contact_normalized__startswith=phone)[:10])
 
-        if division_id := request.GET.get("division_id"):
-            leads = leads.filter(division__division_id=division_id)
-
-        if subdivision_id := request.GET.get("subdivision_id"):
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
+        data = []
+        for lead in matched:
+            row = lead_row(lead)
+            row['followup'] = latest_followup(lead)
+            row['remarks'] = lead.latest_log_remarks
+            data.append(row)
 
-        if assign_to := request.GET.get("assign_to"):
-            leads = leads.filter(assign_to__user_id=assign_to)
+        return sendSuccess({'match': match if data else None, 'leads': data}, "Leads matching phone")
+    except Exception as e:
+        print(e)
+        return sendError(f"Error: {str(e)}")
 
-        if branch_id := request.GET.get("branch_id"):
-            leads = leads.filter(branch__branch_id=branch_id)
+#Stage lists: one query path for every stage, see lead_list.LEAD_STAGES
+@api_view(["GET"])
+def getleadsbystage(request):
+    return stage_lead_list(request, request.GET.get("stage"), "Leads fetched successfully")
 
-        # Pagination
-        page = request.GET.get("page", 1)
-        paginator = Paginator(leads, 20)
 
-        try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
-        except EmptyPage:
-            leads_page = []
+def stage_lead_list(request, stage, message, build_row=stage_lead_row, with_followups=True):
+    token = decodeToken(request)
+    if token.get('error'):
+        return sendError(token.get("message"))
+    try:
+        leads = filter_leads(stage_leads(stage), request.GET)
 
-        data = []
-        for lead in leads_page:
-            latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
-            data.append({
-                'lead_id': lead.lead_id,
-                'name': lead.name,
-                'contact': lead.contact,
-                'subbranch': lead.subbranch,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch':{
-                    'branch_id': lead.branch.branch_id,
-                    'branch_name': lead.branch.name
-                } if lead.branch else None,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    'division_id': lead.division.division_id,
-                    'name': lead.division.name
-                } if lead.division else None,
-                'subdivision': {
-                    'subdivision_id': lead.subdivision.subdivision_id,
-                    'name': lead.subdivision.name
-                } if lead.subdivision else None,
-                'assign_to': lead.assign_to.full_name if lead.assign_to else None,
-                'created_by': lead.created_by.full_name if lead.created_by else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                "is_customer": lead.is_customer
-            })
+        gender = request.GET.get("gender")
+        created_at = request.GET.get("created_at")
+        if gender:
+            leads = leads.filter(gender__iexact=gender)
+        if created_at:
+            try:
+                created_at_obj = datetime.strptime(created_at, "%Y-%m-%d").date()
+                leads = leads.filter(created_at__date=created_at_obj)
+            except ValueError:
+                return sendError("Invalid format for created_at. Use YYYY-MM-DD.")
 
-        return JsonResponse({
+        fields = sparse_fields(request.GET)
+        if fields:
+            data, meta = sparse_lead_page(leads, fields, request.GET)
+        else:
+            leads_page, meta = paginate_leads(lead_list_queryset(leads, with_followups=with_followups), request.GET)
+            data = [build_row(lead) for lead in leads_page]
+        return sendJson({
             'data': data,
-            'total_pages': paginator.num_pages,
-            'total_leads': paginator.count,
-            'current_page': int(page),
-            'message': "After Visit Leads fetched successfully"
-        },safe=False, status=200)
-
+            **meta,
+            'message': message
+        })
     except Exception as e:
         print(e)
         return sendError(f"Error: {str(e)}")
 
+
+@api_view(["GET"])
+def getaftervisitleads(request):
+    return stage_lead_list(request, "after_visit", "After Visit Leads fetched successfully", build_row=lead_row, with_followups=False)
+
+
 @api_view(["GET"])
 def getaftervisitleadbyid(request, id):
     token = decodeToken(request)
@@ -854,117 +858,8 @@ def getaftervisitleadbyid(request, id):
 
 @api_view(["GET"])
 def getrawleads(request):
-    token = decodeToken(request)
-    if token.get('error'):
-        return sendError(token.get("message"))
-
-    try:
-        # Filter for raw leads and leads without specific type
-        leads = Lead.objects.annotate(
-            lead_type_lower=Lower('lead_type')
-        ).filter(
-            Q(lead_type_lower__icontains='raw') | 
-            Q(lead_type_lower__icontains='pending') |
-            Q(lead_type__isnull=True) |
-            Q(lead_type='')
-        )
-
-        # Apply optional filters
-        if name := request.GET.get("name"):
-            leads = leads.filter(name__icontains=name)
-
-        if contact := request.GET.get("contact"):
-            leads = leads.filter(contact__icontains=contact)
-
-        if city := request.GET.get("city"):
-            leads = leads.filter(city__icontains=city)
-
-        if branch_id := request.GET.get("branch_id"):
-            leads = leads.filter(branch__branch_id=branch_id)
-
-        if division_id := request.GET.get("division_id"):
-            leads = leads.filter(division__division_id=division_id)
-
-        if subdivision_id := request.GET.get("subdivision_id"):
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
-
-        if assign_to := request.GET.get("assign_to"):
-            leads = leads.filter(assign_to__user_id=assign_to)
-
-        # Pagination
-        page = request.GET.get("page", 1)
-        paginator = Paginator(leads, 20)
-
-        try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
-        except EmptyPage:
-            leads_page = []
-
-        data = []
-        for lead in leads_page:
-            latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
-            data.append({
-                'lead_id': lead.lead_id,
-                'name': lead.name,
-                'contact': lead.contact,
-                'subbranch': lead.subbranch,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch':{
-                    'branch_id': lead.branch.branch_id,
-                    'branch_name': lead.branch.name
-                } if lead.branch else None,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    'division_id': lead.division.division_id,
-                    'name': lead.division.name
-                } if lead.division else None,
-                'subdivision': {
-                    'subdivision_id': lead.subdivision.subdivision_id,
-                    'name': lead.subdivision.name
-                } if lead.subdivision else None,
-                'assign_to': lead.assign_to.full_name if lead.assign_to else None,
-                'created_by': lead.created_by.full_name if lead.created_by else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                'is_customer': lead.is_customer,
-                'remarks_details': {
-                    'user': latest_log.user.full_name if latest_log and latest_log.user else None,
-                    'lead_created_date': latest_log.entry_date if latest_log else None,
-                    'remarks': latest_log.remarks if latest_log else None
-                },
-                'followup': [
-                    {
-                        'followup_date': followup.followup_date,
-                        'followup_type': followup.followup_type,
-                        'followup_remarks': followup.followup_remarks,
-                        'entry_date': followup.entry_date
-                    } for followup in lead.followups.all()
-                ]
-            })
-
-        return JsonResponse({
-            'data': data,
-            'total_pages': paginator.num_pages,
-            'total_leads': paginator.count,
-            'current_page': int(page),
-            'message': "Raw Leads fetched successfully"
-        },safe=False, status=200)
+    return stage_lead_list(request, "raw", "Raw Leads fetched successfully")
 
-    except Exception as e:
-        print(e)
-        return sendError(f"Error: {str(e)}")
 
 @api_view(["GET"])
 def getrawleadbyid(request, id):
@@ -1037,122 +932,19 @@ def getrawleadbyid(request, id):
 
 @api_view(["GET"])
 def getcompletedleads(request):
+    return stage_lead_list(request, "completed", "Completed Leads fetched successfully")
+
+
+@api_view(["GET"])
+def getcompletedleadbyid(request, id):
     token = decodeToken(request)
     if token.get('error'):
         return sendError(token.get("message"))
-    try:
-        leads = Lead.objects.annotate(
-            lead_type_lower=Lower('lead_type')
-        ).filter(
-            Q(lead_type_lower__icontains="completed") |
-            Q(lead_type_lower__icontains="complete")
-        )
-        if name := request.GET.get("name"):
-            leads = leads.filter(name__icontains=name)
-
-        if contact := request.GET.get("contact"):
-            leads = leads.filter(contact__icontains=contact)
-
-        if city := request.GET.get("city"):
-            leads = leads.filter(city__icontains=city)
-
-        if division_id := request.GET.get("division_id"):
-            leads = leads.filter(division__division_id=division_id)
 
-        if subdivision_id := request.GET.get("subdivision_id"):
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
-
-        if assign_to := request.GET.get("assign_to"):
-            leads = leads.filter(assign_to__user_id=assign_to)
-
-        if branch_id := request.GET.get("branch_id"):
-            leads = leads.filter(branch__branch_id=branch_id)
-
-        # Pagination
-        page = request.GET.get("page", 1)
-        paginator = Paginator(leads, 20)
+    try:
+        lead = Lead.objects.get(lead_id=id)
 
-        try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
-        except EmptyPage:
-            leads_page = []
-
-        data = []
-        for lead in leads_page:
-            latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
-            data.append({
-                'lead_id': lead.lead_id,
-                'name': lead.name,
-                'contact': lead.contact,
-                'subbranch': lead.subbranch,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch':{
-                    'branch_id': lead.branch.branch_id,
-                    'branch_name': lead.branch.name
-                } if lead.branch else None,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    'division_id': lead.division.division_id,
-                    'name': lead.division.name
-                } if lead.division else None,
-                'subdivision': {
-                    'subdivision_id': lead.subdivision.subdivision_id,
-                    'name': lead.subdivision.name
-                } if lead.subdivision else None,
-                'assign_to': lead.assign_to.full_name if lead.assign_to else None,
-                'created_by': lead.created_by.full_name if lead.created_by else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                'is_customer': lead.is_customer,
-                'remarks_details': {
-                    'user': latest_log.user.full_name if latest_log and latest_log.user else None,
-                    'lead_created_date': latest_log.entry_date if latest_log else None,
-                    'remarks': latest_log.remarks if latest_log else None
-                },
-                'followup': [
-                    {
-                        'followup_date': followup.followup_date,
-                        'followup_type': followup.followup_type,
-                        'followup_remarks': followup.followup_remarks,
-                        'entry_date': followup.entry_date
-                    } for followup in lead.followups.all()
-                ]
-            })
-
-        return JsonResponse({
-            'data': data,
-            'total_pages': paginator.num_pages,
-            'total_leads': paginator.count,
-            'current_page': int(page),
-            'message': "Completed Leads fetched successfully"
-        },safe=False, status=200)
-
-    except Exception as e:
-        print(e)
-        return sendError(f"Error: {str(e)}")
-
-@api_view(["GET"])
-def getcompletedleadbyid(request, id):
-    token = decodeToken(request)
-    if token.get('error'):
-        return sendError(token.get("message"))
-
-    try:
-        lead = Lead.objects.get(lead_id=id)
-
-        latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
+        latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
 
         data = {
             'lead_id': lead.lead_id,
@@ -1213,114 +1005,8 @@ def getcompletedleadbyid(request, id):
 
 @api_view(["GET"])
 def getbeforevisitleads(request):
-    token = decodeToken(request)
-    if token.get('error'):
-        return sendError(token.get("message"))
-    try:
-        # Show leads that are not raw, completed, or overdue
-        leads = Lead.objects.annotate(
-            lead_type_lower=Lower('lead_type')
-        ).exclude(
-            Q(lead_type_lower__icontains='raw') |
-            Q(lead_type_lower__icontains='completed') |
-            Q(lead_type_lower__icontains='complete') |
-            Q(lead_type_lower__icontains='overdue')
-        )
-        if name := request.GET.get("name"):
-            leads = leads.filter(name__icontains=name)
-
-        if contact := request.GET.get("contact"):
-            leads = leads.filter(contact__icontains=contact)
-
-        if city := request.GET.get("city"):
-            leads = leads.filter(city__icontains=city)
-
-        if division_id := request.GET.get("division_id"):
-            leads = leads.filter(division__division_id=division_id)
-
-        if subdivision_id := request.GET.get("subdivision_id"):
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
-
-        if assign_to := request.GET.get("assign_to"):
-            leads = leads.filter(assign_to__user_id=assign_to)
-
-        if branch_id := request.GET.get("branch_id"):
-            leads = leads.filter(branch__branch_id=branch_id)
-
-        # Pagination
-        page = request.GET.get("page", 1)
-        paginator = Paginator(leads, 20)
-
-        try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
-        except EmptyPage:
-            leads_page = []
-
-        data = []
-        for lead in leads_page:
-            latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
-            data.append({
-                'lead_id': lead.lead_id,
-                'subbranch': lead.subbranch,
-                'name': lead.name,
-                'contact': lead.contact,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch':{
-                    'branch_id': lead.branch.branch_id,
-                    'branch_name': lead.branch.name
-                } if lead.branch else None,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    'division_id': lead.division.division_id,
-                    'name': lead.division.name
-                } if lead.division else None,
-                'subdivision': {
-                    'subdivision_id': lead.subdivision.subdivision_id,
-                    'name': lead.subdivision.name
-                } if lead.subdivision else None,
-                'assign_to': lead.assign_to.full_name if lead.assign_to else None,
-                'created_by': lead.created_by.full_name if lead.created_by else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                'is_customer': lead.is_customer,
-                'remarks_details': {
-                    'user': latest_log.user.full_name if latest_log and latest_log.user else None,
-                    'lead_created_date': latest_log.entry_date if latest_log else None,
-                    'remarks': latest_log.remarks if latest_log else None
-                },
-                'followup': [
-                    {
-                        'followup_date': followup.followup_date,
-                        'followup_type': followup.followup_type,
-                        'followup_remarks': followup.followup_remarks,
-                        'entry_date': followup.entry_date
-                    } for followup in lead.followups.all()
-                ]
-            })
-
-        return JsonResponse({
-            'data': data,
-            'total_pages': paginator.num_pages,
-            'total_leads': paginator.count,
-            'current_page': int(page),
-            'message': "Before Visit Leads fetched successfully"
-        },safe=False, status=200)
+    return stage_lead_list(request, "before_visit", "Before Visit Leads fetched successfully")
 
-    except Exception as e:
-        print(e)
-        return sendError(f"Error: {str(e)}")
 
 @api_view(["GET"])
 def getbeforevisitleadbyid(request, id):
@@ -1549,7 +1235,7 @@ def allleadlogdetails(request):
     lead_id = params.get('lead_id')
     user_id = params.get('user_id')
     name = params.get('name')
-    contact = params.get('contact')
+    contact = normalize_phone(params.get('contact'))
     city = params.get('city')
     source = params.get('source')
     category = params.get('category')
@@ -1563,7 +1249,7 @@ def allleadlogdetails(request):
     if name:
         lead_filters &= Q(name__icontains=name)
     if contact:
-        lead_filters &= Q(contact__icontains=contact)
+        lead_filters &= Q(contact_normalized__startswith=contact)
     if city:
         lead_filters &= Q(city__icontains=city)
     if source:
@@ -1735,123 +1421,11 @@ def leadlogdetails(request,id):
 
 @api_view(["GET"])
 def iscustomer(request):
-    token = decodeToken(request)
-    if token.get('error'):
-        return sendError(token.get("message"))
-
-    try:
-        leads = Lead.objects.filter(is_customer=True)
-
-        # Optional search filters
-        name = request.GET.get("name")
-        contact = request.GET.get("contact")
-        city = request.GET.get("city")
-        division_id = request.GET.get("division_id")
-        subdivision_id = request.GET.get("subdivision_id")
-        branch = request.GET.get("branch_id")
-        gender = request.GET.get("gender")
-        assign_to = request.GET.get("assign_to")
-        created_at = request.GET.get("created_at")
-
-        if name:
-            leads = leads.filter(name__icontains=name)
-        if contact:
-            leads = leads.filter(contact__icontains=contact)
-        if city:
-            leads = leads.filter(city__icontains=city)
-        if division_id:
-            leads = leads.filter(division__division_id=division_id)
-        if subdivision_id:
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
-        if branch:
-            leads = leads.filter(branch__branch_id=branch)
-        if gender:
-            leads = leads.filter(gender__iexact=gender)
-        if assign_to:
-            leads = leads.filter(assign_to__user_id=assign_to)
-        if created_at:
-            try:
-                created_at_obj = datetime.strptime(created_at, "%Y-%m-%d").date()
-                leads = leads.filter(created_at__date=created_at_obj)
-            except ValueError:
-                return sendError("Invalid format for created_at. Use YYYY-MM-DD.")
-
-        # Pagination
-        page = request.GET.get("page", 1)
-        paginator = Paginator(leads, 20)
-
-        try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
-        except EmptyPage:
-            leads_page = []
-
-        data = []
-        for lead in leads_page:
-            latest_log = LeadLog.objects.filter(lead=lead).order_by("-entry_date").first()
-
-            data.append({
-                'lead_id': lead.lead_id,
-                'name': lead.name,
-                'contact': lead.contact,
-                'subbranch': lead.subbranch,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch': {
-                    'branch_id': lead.branch.branch_id,
-                    'branch_name': lead.branch.name
-                } if lead.branch else None,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    "division_id": lead.division.division_id,
-                    "name": lead.division.name,
-                } if lead.division else None,
-                'subdivision': {
-                    "subdivision_id": lead.subdivision.subdivision_id,
-                    "name": lead.subdivision.name,
-                } if lead.subdivision else None,
-                'assign_to': lead.assign_to.full_name if lead.assign_to else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                "is_customer": lead.is_customer,
-                'remarks_detail': {
-                    "user": latest_log.user.full_name if latest_log and latest_log.user else None,
-                    "lead_created_date": latest_log.entry_date if latest_log else None,
-                    "remarks": latest_log.remarks if latest_log else None
-                },
-                'followup': [
-                    {
-                        'followup_date': followup.followup_date,
-                        'followup_type': followup.followup_type,
-                        'followup_remarks': followup.followup_remarks,
-                        'entry_date': followup.entry_date
-                    } for followup in lead.followups.all()
-                ]
-            })
+    return stage_lead_list(
+        request, "customer", "IS Customer",
+        build_row=lambda lead: stage_lead_row(lead, remarks_key="remarks_detail", created_by=False),
+    )
 
-        return JsonResponse(
-            {
-            "total_pages": paginator.num_pages,
-            "total_leads": paginator.count,
-            "current_page": int(page),
-            "message": "IS Customer",
-            "data": data
-            },
-            safe=False, status=200)
-
-    except Exception as e:
-        print(e)
-        return sendError(f"Error: {str(e)}")
 
 
 @api_view(["GET"])
@@ -1928,46 +1502,19 @@ def get_leads_according_to_user(request):
         return sendError(token.get("message"))
     
     try:
-        user_id = token.get("user_id")
-        user = Users.objects.get(user_id=user_id)
-
-        # Get all lead ids assigned via AssignToUser table
-        assigned_lead_ids = AssignToUser.objects.filter(user=user).values_list('lead_id', flat=True)
-
-        # Base queryset: leads where user is assigned (directly or via AssignToUser) or creator
-        leads = Lead.objects.filter(
-            Q(assign_to=user) | 
-            Q(lead_id__in=assigned_lead_ids) | 
-            Q(created_by=user)
-        ).distinct()
+        # Leads where user is assigned (directly or via AssignToUser) or creator
+        leads = visible_leads(token.get("user_id"))
 
         # Optional filters from query params
-        name = request.GET.get("name")
-        contact = request.GET.get("contact")
-        city = request.GET.get("city")
-        division_id = request.GET.get("division_id")
-        subdivision_id = request.GET.get("subdivision_id")
-        branch = request.GET.get("branch_id")
         gender = request.GET.get("gender")
         lead_type = request.GET.get("lead_type")
         is_customer = request.GET.get("is_customer")
 
-        if name:
-            leads = leads.filter(name__icontains=name)
-        if contact:
-            leads = leads.filter(contact__icontains=contact)
-        if city:
-            leads = leads.filter(city__icontains=city)
-        if division_id:
-            leads = leads.filter(division__division_id=division_id)
-        if subdivision_id:
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
-        if branch:
-            leads = leads.filter(branch__branch_id=branch)
+        leads = filter_leads(leads, request.GET)
         if gender:
             leads = leads.filter(gender__iexact=gender)
         if lead_type:
-            leads = leads.filter(lead_type__iexact=lead_type)
+            leads = leads.filter(lead_type=normalize_lead_type(lead_type))
         if is_customer is not None:
             # handle boolean filter from query params
             if is_customer.lower() in ['true', '1']:
@@ -1976,78 +1523,33 @@ def get_leads_according_to_user(request):
                 leads = leads.filter(is_customer=False)
 
         # Pagination
-        page = request.GET.get("page", 1)
         limit = request.GET.get("limit", 20)
 
-        paginator = Paginator(leads.order_by('-created_at'), limit)
-
+        fields = sparse_fields(request.GET)
         try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
+            if fields:
+                data, meta = sparse_lead_page(leads, fields, request.GET, per_page=limit, strict=True)
+            else:
+                leads_page, meta = paginate_leads(
+                    lead_list_queryset(leads, with_followups=True), request.GET, per_page=limit, strict=True
+                )
         except EmptyPage:
             return sendError("Page number out of range")
 
-        data = []
-        for lead in leads_page:
-            latest_log = LeadLog.objects.filter(lead=lead).order_by("-entry_date").first()
-            data.append({
-                'lead_id': lead.lead_id,
-                'name': lead.name,
-                'contact': lead.contact,
-                'subbranch': lead.subbranch,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch_id': lead.branch.branch_id if lead.branch else None,
-                'branch_name': lead.branch.name if lead.branch else None,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    "division_id": lead.division.division_id,
-                    "name": lead.division.name,
-                } if lead.division else None,
-                'subdivision': {
-                    "subdivision_id": lead.subdivision.subdivision_id,
-                    "name": lead.subdivision.name,
-                } if lead.subdivision else None,
-                'assign_to': lead.assign_to.full_name if lead.assign_to else None,
-                'created_by': lead.created_by.full_name if lead.created_by else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                "is_customer": lead.is_customer,
-                'remarks_detail': {
-                    "user": latest_log.user.full_name if latest_log and latest_log.user else None,
-                    "lead_created_date": latest_log.entry_date if latest_log else None,
-                    "remarks": latest_log.remarks if latest_log else None
-                },
-                'followup': [
-                    {
-                        'followup_date': followup.followup_date,
-                        'followup_type': followup.followup_type,
-                        'followup_remarks': followup.followup_remarks,
-                        'entry_date': followup.entry_date
-                    } for followup in lead.followups.all()
-                ]
-            })
+        if not fields:
+            data = []
+            for lead in leads_page:
+                row = lead_row(lead, flat_branch=True)
+                row['remarks_detail'] = remarks_details(lead)
+                row['followup'] = followup_list(lead)
+                data.append(row)
 
-        return JsonResponse({
+        return sendJson({
             'data': data,
-            'total_pages': paginator.num_pages,
-            'total_leads': paginator.count,
-            'current_page': int(page),
+            **meta,
             'message': "Leads for User"
-        }, safe=False, status=200)
+        })
 
-    except Users.DoesNotExist:
-        return sendError("User not found.")
     except Exception as e:
         print(e)
         return sendError(f"Error: {str(e)}")
@@ -2077,46 +1579,69 @@ def followup_lead_reschedule(request, id):
         return sendError(f"Error: {str(e)}")
 
 
+#Totals of the followup tabs: ?user_id=&branch_id=&division_id= narrow them, ?group_by=user|branch|division splits them
 @api_view(["GET"])
-def getallfollowup(request):
+def followupcounts(request):
     token = decodeToken(request)
     if token.get('error'):
         return sendError(token.get("message"))
     try:
-        leads = Lead.objects.all().prefetch_related('followups')  # Optimize DB query
-
-        # Optional Filters
-        if name := request.GET.get("name"):
-            leads = leads.filter(name__icontains=name)
-        if contact := request.GET.get("contact"):
-            leads = leads.filter(contact__icontains=contact)
-        if city := request.GET.get("city"):
-            leads = leads.filter(city__icontains=city)
-        if division_id := request.GET.get("division_id"):
-            leads = leads.filter(division__division_id=division_id)
-        if subdivision_id := request.GET.get("subdivision_id"):
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
-        if assign_to := request.GET.get("assign_to"):
-            leads = leads.filter(assign_to__user_id=assign_to)
-        if branch_id := request.GET.get("branch_id"):
-            leads = leads.filter(branch__branch_id=branch_id)
+        response = sendSuccess(followup_counts(request.GET), "Followup counts fetched successfully")
+        response["Cache-Control"] = f"private, max-age={settings.FOLLOWUP_COUNT_CACHE_TTL}"
+        return response
+    except ValueError as e:
+        return sendError(str(e))
+    except Exception as e:
+        print(e)
+        return sendError(f"{e}")
 
-        # Pagination
-        page = request.GET.get("page", 1)
-        paginator = Paginator(leads, 20)
 
-        try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
-        except EmptyPage:
-            leads_page = []
+#Calendar of the caller's followups: ?window=today|week|overdue or ?from=YYYY-MM-DD&to=YYYY-MM-DD,
+#optionally ?followup_type=pending,overdue. Streamed in followup_date order.
+@api_view(["GET"])
+def followupagenda(request):
+    token = decodeToken(request)
+    if token.get('error'):
+        return sendError(token.get("message"))
+    try:
+        start, end = agenda_window(request.GET)
+        followup_types = [t for t in request.GET.get("followup_type", "").split(",") if t]
+        if not followup_types and request.GET.get("window") == "overdue":
+            followup_types = OPEN_FOLLOWUP_TYPES
+        followups = agenda_queryset(token["user_id"], start, end, followup_types)
+        return streamSuccess(agenda_rows(followups), "Followup agenda fetched successfully")
+    except ValueError as e:
+        return sendError(str(e))
+    except Exception as e:
+        print(e)
+        return sendError(f"{e}")
 
-        data = []
-        for lead in leads_page:
-            latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
 
-            followups_all = lead.followups.all()
+@api_view(["GET"])
+def getallfollowup(request):
+    token = decodeToken(request)
+    if token.get('error'):
+        return sendError(token.get("message"))
+    try:
+        leads = filter_leads(Lead.objects.all(), request.GET)
+        fields = sparse_fields(request.GET)
+        page, meta = lead_page_keys(leads, request.GET)
+        etag, last_modified = list_validators(request, leads, page, meta)
+        if response := not_modified(request, etag, last_modified):
+            return response
+
+        lead_ids = [row["lead_id"] for row in page]
+        if fields:
+            return with_validators(sendJson({
+                'data': sparse_lead_rows(lead_ids, fields),
+                **meta,
+                'message': "Completed Leads fetched successfully"
+            }), etag, last_modified)
+
+        leads_page = lead_list_queryset(Lead.objects.filter(pk__in=lead_ids), with_followups=True)
+
+        data = []
+        for lead in in_page_order(leads_page, lead_ids):
             followup_data = {
                 'all': [],
                 'overdue': [],
@@ -2124,7 +1649,7 @@ def getallfollowup(request):
                 'completed': [],
             }
 
-            for f in followups_all:
+            for f in lead.followups.all():
                 item = {
                     'followup_date': f.followup_date,
                     'followup_type': f.followup_type,
@@ -2135,54 +1660,16 @@ def getallfollowup(request):
                 if f.followup_type in followup_data:
                     followup_data[f.followup_type].append(item)
 
-            data.append({
-                'lead_id': lead.lead_id,
-                'name': lead.name,
-                'contact': lead.contact,
-                'subbranch': lead.subbranch,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch': {
-                    'branch_id': lead.branch.branch_id,
-                    'branch_name': lead.branch.name
-                } if lead.branch else None,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    'division_id': lead.division.division_id,
-                    'name': lead.division.name
-                } if lead.division else None,
-                'subdivision': {
-                    'subdivision_id': lead.subdivision.subdivision_id,
-                    'name': lead.subdivision.name
-                } if lead.subdivision else None,
-                'assign_to': lead.assign_to.full_name if lead.assign_to else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                'is_customer': lead.is_customer,
-                'remarks_details': {
-                    'user': latest_log.user.full_name if latest_log and latest_log.user else None,
-                    'lead_created_date': latest_log.entry_date if latest_log else None,
-                    'remarks': latest_log.remarks if latest_log else None
-                },
-                'followup': followup_data
-            })
+            row = lead_row(lead, created_by=False)
+            row['remarks_details'] = remarks_details(lead)
+            row['followup'] = followup_data
+            data.append(row)
 
-        return JsonResponse({
+        return with_validators(sendJson({
             'data': data,
-            'total_pages': paginator.num_pages,
-            'total_leads': paginator.count,
-            'current_page': int(page),
+            **meta,
             'message': "Completed Leads fetched successfully"
-        }, safe=False, status=200)
+        }), etag, last_modified)
 
     except Exception as e:
         print(e)
@@ -2259,131 +1746,71 @@ def getfollowupbyid(request, id):
             'followup': followup_data
         }
 
-        return JsonResponse({
+        return sendJson({
             'data': data,
             'message': "Lead and follow-up details fetched successfully"
-        }, safe=False, status=200)
+        })
 
     except Exception as e:
         print(e)
         return sendError(f"Error: {str(e)}")
 
 
-@api_view(["GET"])
-def getalloverduefollowup(request):
-    token = decodeToken(request)
-    if token.get('error'):
-        return sendError(token.get("message"))
-    try:
-        # Base queryset for leads with completed followups
-        leads = Lead.objects.all()
-
-        # Apply filters (search)
-        if name := request.GET.get("name"):
-            leads = leads.filter(name__icontains=name)
-        if contact := request.GET.get("contact"):
-            leads = leads.filter(contact__icontains=contact)
-        if city := request.GET.get("city"):
-            leads = leads.filter(city__icontains=city)
-        if division_id := request.GET.get("division_id"):
-            leads = leads.filter(division__division_id=division_id)
-        if subdivision_id := request.GET.get("subdivision_id"):
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
-        if assign_to := request.GET.get("assign_to"):
-            leads = leads.filter(assign_to__user_id=assign_to)
-        if branch_id := request.GET.get("branch_id"):
-            leads = leads.filter(branch__branch_id=branch_id)
-
-        overdue_followups_qs = Followup.objects.filter(followup_type="overdue").select_related('user')
-        leads = leads.prefetch_related(Prefetch('followups', queryset=overdue_followups_qs))
-
-        # Pagination
-        page = request.GET.get("page", 1)
-        paginator = Paginator(leads, 20)
+#Leads with their followups of one followup_type, shared by the overdue/pending/completed lists
+def followup_type_leads(request, followup_type, message):
+    leads = leads_with_followup_type(filter_leads(Lead.objects.all(), request.GET), followup_type)
+    fields = sparse_fields(request.GET)
+    if fields:
+        data, meta = sparse_lead_page(
+            leads, fields, request.GET, followups=Followup.objects.filter(followup_type=followup_type)
+        )
+        return sendJson({
+            'data': data,
+            **meta,
+            'message': message
+        })
 
-        try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
-        except EmptyPage:
-            leads_page = []
+    leads_page, meta = paginate_leads(
+        lead_list_queryset(leads, followups_queryset=followups_of_type(followup_type)), request.GET
+    )
 
-        today = now().date()
-        data = []
+    data = []
 
-        
-        for lead in leads_page:
-            # Get followups for this lead from prefetched data
-            followup_list = list(lead.followups.all())
-
-            # Sort followups: today's date first, then by followup_date descending
-            followup_list.sort(key=lambda x: (x.followup_date.date() != today, -(x.followup_date.timestamp() if x.followup_date else 0)))
-
-            # Format followups array
-            followup_data = []
-            for f in followup_list:
-                followup_data.append({
-                    'followup_id': f.followup_id,
-                    'followup_date': f.followup_date,
-                    'followup_type': f.followup_type,
-                    'followup_remarks': f.followup_remarks,
-                    'entry_date': f.entry_date,
-                    'user': {
-                        'user_id': f.user.user_id if f.user else None,
-                        'full_name': f.user.full_name if f.user else None,
-                    }
-                })
+    for lead in leads_page:
+        # Format followups array, prefetched today first and then by followup_date descending
+        followup_data = []
+        for f in lead.followups.all():
+            followup_data.append({
+                'followup_id': f.followup_id,
+                'followup_date': f.followup_date,
+                'followup_type': f.followup_type,
+                'followup_remarks': f.followup_remarks,
+                'entry_date': f.entry_date,
+                'user': {
+                    'user_id': f.user.user_id if f.user else None,
+                    'full_name': f.user.full_name if f.user else None,
+                }
+            })
 
-            # Get latest log for lead
-            latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
+        row = lead_row(lead, flat_branch=True, created_by=False)
+        row['remarks_details'] = remarks_details(lead) if lead.latest_log_id else None
+        row['followups'] = followup_data
+        data.append(row)
 
-            data.append({
-                'lead_id': lead.lead_id,
-                'name': lead.name,
-                'contact': lead.contact,
-                'subbranch': lead.subbranch,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch_id': lead.branch.branch_id if lead.branch else None,
-                'branch_name': lead.branch.name if lead.branch else None,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    'division_id': lead.division.division_id,
-                    'name': lead.division.name
-                } if lead.division else None,
-                'subdivision': {
-                    'subdivision_id': lead.subdivision.subdivision_id,
-                    'name': lead.subdivision.name
-                } if lead.subdivision else None,
-                'assign_to': lead.assign_to.full_name if lead.assign_to else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                'is_customer': lead.is_customer,
-                'remarks_details': {
-                    'user': latest_log.user.full_name if latest_log and latest_log.user else None,
-                    'lead_created_date': latest_log.entry_date if latest_log else None,
-                    'remarks': latest_log.remarks if latest_log else None
-                } if latest_log else None,
-                'followups': followup_data
-            })
+    return sendJson({
+        'data': data,
+        **meta,
+        'message': message
+    })
 
-        return JsonResponse({
-            'data': data,
-            'total_pages': paginator.num_pages,
-            'total_leads': paginator.count,
-            'current_page': int(page),
-            'message': "Overdue followups grouped by lead fetched successfully"
-        }, safe=False, status=200)
 
+@api_view(["GET"])
+def getalloverduefollowup(request):
+    token = decodeToken(request)
+    if token.get('error'):
+        return sendError(token.get("message"))
+    try:
+        return followup_type_leads(request, "overdue", "Overdue followups grouped by lead fetched successfully")
     except Exception as e:
         return sendError(f"{e}")
 
@@ -2397,7 +1824,7 @@ def getoverduefollowupbyid(request,id):
         lead = Lead.objects.filter(lead_id=id).prefetch_related(
             Prefetch(
                 'followups',
-                queryset=Followup.objects.filter(followup_type="overdue").select_related('user'),
+                queryset=followups_of_type("overdue"),
                 to_attr='overdue_followups'
             )
         ).first()
@@ -2405,11 +1832,8 @@ def getoverduefollowupbyid(request,id):
         if not lead:
             return sendError(f"Lead with id {id} not found.")
 
-        today = now().date()
-
-        # Sort followups: today first, then descending date
+        # Prefetched today first, then descending date
         followup_list = getattr(lead, 'overdue_followups', [])
-        followup_list.sort(key=lambda x: (x.followup_date.date() != today, -(x.followup_date.timestamp() if x.followup_date else 0)))
 
         followup_data = []
         for f in followup_list:
@@ -2478,114 +1902,7 @@ def getallpendingfollowup(request):
     if token.get('error'):
         return sendError(token.get("message"))
     try:
-        # Base queryset for leads with completed followups
-        leads = Lead.objects.all()
-
-        # Apply filters (search)
-        if name := request.GET.get("name"):
-            leads = leads.filter(name__icontains=name)
-        if contact := request.GET.get("contact"):
-            leads = leads.filter(contact__icontains=contact)
-        if city := request.GET.get("city"):
-            leads = leads.filter(city__icontains=city)
-        if division_id := request.GET.get("division_id"):
-            leads = leads.filter(division__division_id=division_id)
-        if subdivision_id := request.GET.get("subdivision_id"):
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
-        if assign_to := request.GET.get("assign_to"):
-            leads = leads.filter(assign_to__user_id=assign_to)
-        if branch_id := request.GET.get("branch_id"):
-            leads = leads.filter(branch__branch_id=branch_id)
-
-        pending_followups_qs = Followup.objects.filter(followup_type="pending").select_related('user')
-        leads = leads.prefetch_related(Prefetch('followups', queryset=pending_followups_qs))
-
-        # Pagination
-        page = request.GET.get("page", 1)
-        paginator = Paginator(leads, 20)
-
-        try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
-        except EmptyPage:
-            leads_page = []
-
-        today = now().date()
-        data = []
-
-        for lead in leads_page:
-            # Get followups for this lead from prefetched data
-            followup_list = list(lead.followups.all())
-
-            # Sort followups: today's date first, then by followup_date descending
-            followup_list.sort(key=lambda x: (x.followup_date.date() != today, -(x.followup_date.timestamp() if x.followup_date else 0)))
-
-            # Format followups array
-            followup_data = []
-            for f in followup_list:
-                followup_data.append({
-                    'followup_id': f.followup_id,
-                    'followup_date': f.followup_date,
-                    'followup_type': f.followup_type,
-                    'followup_remarks': f.followup_remarks,
-                    'entry_date': f.entry_date,
-                    'user': {
-                        'user_id': f.user.user_id if f.user else None,
-                        'full_name': f.user.full_name if f.user else None,
-                    }
-                })
-
-            # Get latest log for lead
-            latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
-
-            data.append({
-                'lead_id': lead.lead_id,
-                'name': lead.name,
-                'contact': lead.contact,
-                'subbranch': lead.subbranch,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch_id': lead.branch.branch_id if lead.branch else None,
-                'branch_name': lead.branch.name if lead.branch else None,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    'division_id': lead.division.division_id,
-                    'name': lead.division.name
-                } if lead.division else None,
-                'subdivision': {
-                    'subdivision_id': lead.subdivision.subdivision_id,
-                    'name': lead.subdivision.name
-                } if lead.subdivision else None,
-                'assign_to': lead.assign_to.full_name if lead.assign_to else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                'is_customer': lead.is_customer,
-                'remarks_details': {
-                    'user': latest_log.user.full_name if latest_log and latest_log.user else None,
-                    'lead_created_date': latest_log.entry_date if latest_log else None,
-                    'remarks': latest_log.remarks if latest_log else None
-                } if latest_log else None,
-                'followups': followup_data
-            })
-
-        return JsonResponse({
-            'data': data,
-            'total_pages': paginator.num_pages,
-            'total_leads': paginator.count,
-            'current_page': int(page),
-            'message': "Pending followups grouped by lead fetched successfully"
-        }, safe=False, status=200)
-
+        return followup_type_leads(request, "pending", "Pending followups grouped by lead fetched successfully")
     except Exception as e:
         return sendError(f"{e}")
 
@@ -2599,7 +1916,7 @@ def getpendingfollowupbyid(request,id):
         lead = Lead.objects.filter(lead_id=id).prefetch_related(
             Prefetch(
                 'followups',
-                queryset=Followup.objects.filter(followup_type="pending").select_related('user'),
+                queryset=followups_of_type("pending"),
                 to_attr='pending_followups'
             )
         ).first()
@@ -2607,11 +1924,8 @@ def getpendingfollowupbyid(request,id):
         if not lead:
             return sendError(f"Lead with id {id} not found.")
 
-        today = now().date()
-
-        # Sort followups: today first, then descending date
+        # Prefetched today first, then descending date
         followup_list = getattr(lead, 'pending_followups', [])
-        followup_list.sort(key=lambda x: (x.followup_date.date() != today, -(x.followup_date.timestamp() if x.followup_date else 0)))
 
         followup_data = []
         for f in followup_list:
@@ -2679,114 +1993,8 @@ def getallcompletedfollowup(request):
     token = decodeToken(request)
     if token.get('error'):
         return sendError(token.get("message"))
-    
     try:
-        leads = Lead.objects.all()
-
-        # Apply filters (search)
-        if name := request.GET.get("name"):
-            leads = leads.filter(name__icontains=name)
-        if contact := request.GET.get("contact"):
-            leads = leads.filter(contact__icontains=contact)
-        if city := request.GET.get("city"):
-            leads = leads.filter(city__icontains=city)
-        if division_id := request.GET.get("division_id"):
-            leads = leads.filter(division__division_id=division_id)
-        if subdivision_id := request.GET.get("subdivision_id"):
-            leads = leads.filter(subdivision__subdivision_id=subdivision_id)
-        if assign_to := request.GET.get("assign_to"):
-            leads = leads.filter(assign_to__user_id=assign_to)
-        if branch_id := request.GET.get("branch_id"):
-            leads = leads.filter(branch__branch_id=branch_id)
-
-        completed_followups_qs = Followup.objects.filter(followup_type="completed").select_related('user')
-        leads = leads.prefetch_related(Prefetch('followups', queryset=completed_followups_qs))
-
-        # Pagination
-        page = request.GET.get("page", 1)
-        paginator = Paginator(leads, 20)
-
-        try:
-            leads_page = paginator.page(page)
-        except PageNotAnInteger:
-            leads_page = paginator.page(1)
-        except EmptyPage:
-            leads_page = []
-
-        today = now().date()
-        data = []
-
-        for lead in leads_page:
-            followup_list = list(lead.followups.all())
-
-            # Sort followups: today's first, then by descending date
-            followup_list.sort(
-                key=lambda x: (x.followup_date.date() != today, -(x.followup_date.timestamp() if x.followup_date else 0))
-            )
-
-            followup_data = []
-            for f in followup_list:
-                followup_data.append({
-                    'followup_id': f.followup_id,
-                    'followup_date': f.followup_date,
-                    'followup_type': f.followup_type,
-                    'followup_remarks': f.followup_remarks,
-                    'entry_date': f.entry_date,
-                    'user': {
-                        'user_id': f.user.user_id if f.user else None,
-                        'full_name': f.user.full_name if f.user else None,
-                    }
-                })
-
-            latest_log = LeadLog.objects.filter(lead=lead).order_by('-entry_date').first()
-
-            data.append({
-                'lead_id': lead.lead_id,
-                'name': lead.name,
-                'contact': lead.contact,
-                'subbranch': lead.subbranch,
-                'address': lead.address,
-                'email': lead.email,
-                'gender': lead.gender,
-                'city': lead.city,
-                'landmark': lead.landmark,
-                'lead_type': lead.lead_type,
-                'source': lead.source,
-                'category': lead.category,
-                'pan_vat': lead.pan_vat,
-                'company_name': lead.company_name,
-                'branch_id': lead.branch.branch_id if lead.branch else None,
-                'branch_name': lead.branch.name if lead.branch else None,
-                'tentetive_visit_date': lead.tentetive_visit_date,
-                'tentetive_purchase_date': lead.tentetive_purchase_date,
-                'division': {
-                    'division_id': lead.division.division_id,
-                    'name': lead.division.name
-                } if lead.division else None,
-                'subdivision': {
-                    'subdivision_id': lead.subdivision.subdivision_id,
-                    'name': lead.subdivision.name
-                } if lead.subdivision else None,
-                'assign_to': lead.assign_to.full_name if lead.assign_to else None,
-                'created_at': lead.created_at,
-                'updated_at': lead.updated_at,
-                'is_customer': lead.is_customer,
-                'remarks_details': {
-                    'user': latest_log.user.full_name if latest_log and latest_log.user else None,
-                    'lead_created_date': latest_log.entry_date if latest_log else None,
-                    'remarks': latest_log.remarks if latest_log else None
-                } if latest_log else None,
-                'followups': followup_data
-            })
-
-        return JsonResponse({
-            'data': data,
-            'total_pages': paginator.num_pages,
-            'total_leads': paginator.count,
-            'current_page': int(page),
-            'message': "Completed Leads fetched successfully"
-        }, safe=False, status=200)
-
+        return followup_type_leads(request, "completed", "Completed Leads fetched successfully")
     except Exception as e:
         return sendError(f"{e}")
 
@@ -2801,7 +2009,7 @@ def getcompletedfollowupbyid(request,id):
         lead = Lead.objects.filter(lead_id=id).prefetch_related(
             Prefetch(
                 'followups',
-                queryset=Followup.objects.filter(followup_type="completed").select_related('user'),
+                queryset=followups_of_type("completed"),
                 to_attr='completed_followups'
             )
         ).first()
@@ -2809,11 +2017,8 @@ def getcompletedfollowupbyid(request,id):
         if not lead:
             return sendError(f"Lead with id {id} not found.")
 
-        today = now().date()
-
-        # Sort followups: today first, then descending date
+        # Prefetched today first, then descending date
         followup_list = getattr(lead, 'completed_followups', [])
-        followup_list.sort(key=lambda x: (x.followup_date.date() != today, -(x.followup_date.timestamp() if x.followup_date else 0)))
 
         followup_data = []
         for f in followup_list:
@@ -2960,144 +2165,128 @@ def updatefollowup(request, id):
         return sendError(f"Error updating followup: {str(e)}")
 
 
-#import for leads
+#Batch of followup operations in one transaction:
+#{"operations": [{"op": "complete", "followup_id": 1, "notes": ...},
+#                {"op": "reschedule", "followup_id": 2, "followup_date": "2025-01-31 10:00", "followup_remarks": ...},
+#                {"op": "reassign", "followup_id": 3, "user_id": 7}]}
+@api_view(["POST"])
+def batchfollowups(request):
+    token = decodeToken(request)
+    if token.get('error'):
+        return sendError(token.get("message"))
+    try:
+        operations = request.data.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return sendError("operations must be a non-empty list")
+        if len(operations) > BATCH_FOLLOWUP_LIMIT:
+            return sendError(f"At most {BATCH_FOLLOWUP_LIMIT} operations per batch")
+        results = apply_followup_operations(operations, token["user_id"])
+        applied = sum(result["success"] for result in results)
+        return sendSuccess(results, f"{applied} of {len(results)} followup operations applied")
+    except Exception as e:
+        print(e)
+        return sendError(f"Error: {str(e)}")
+
+#import for leads from a CSV or XLSX file, read and written chunk by chunk.
+#?mode=copy loads a CSV through COPY and set-based SQL and reports only rejected rows
 @api_view(["POST"])
 def importleads (request):
     token = decodeToken(request)
     if token.get('error'):
         return sendError(token.get("message"))
     try:
-        user = token.get("user_id")
         file = request.FILES.get("file")
         if not file:
             return sendError("No file uploaded")
-        print(pd.read_csv(file))
-        df = pd.read_csv(file)
-        print(df.head())
-        if not df:
+        if request.GET.get("mode") == "copy":
+            if is_xlsx(file.name):
+                return sendError("Copy mode accepts CSV files only")
+            imported, rejected = copy_import_leads(file, token.get("user_id"))
+            return sendJson({"data": rejected, "imported": imported, "rejected": len(rejected),
+                             "message": "Leads imported successfully"})
+
+        importer, result = None, []
+        for chunk in read_import_chunks(file, file.name):
+            if importer is None:
+                missing = missing_import_columns(chunk.columns)
+                if missing:
+                    return sendError(f"Column {missing[0]} not found in file")
+                importer = LeadImporter(token.get("user_id"))
+            result.extend(importer.import_frame(chunk))
+        if importer is None:
             return sendError("No data found in file")
-        required_columns = ["name", "contact", "gender", "address", "email"]
-        for col in required_columns:
-            if col not in df.columns:
-                return sendError(f"Column {col} not found in file")
-        try:
-            created_by_user = Users.objects.get(user_id=user)
-        except Users.DoesNotExist:
-            return sendError("User not found")
-        
-        result = []
-        for index, row in df.iterrows():
-            try:
-                with transaction.atomic():
-                    name = clean_values(row.get("name"))
-                    contact = clean_values(row.get("contact"))
-                    if len(str(contact)) != 10:
-                        raise ValueError("Contact number must be 10 digits")
-                    if Lead.objects.filter(contact=contact).exists():
-                        raise ValueError("Contact number already exists")
-                    email = clean_values(row.get("email"))
-                    if not re.match(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", email):
-                        raise ValueError("Invalid email format")
-                    gender = clean_values(row.get("gender"))
-                    address = clean_values(row.get("address"))
-                    
-                    #for fk key
-                    division = get_fk_instance(Division, "division_id", clean_values(row.get("division")))
-                    subdivision = get_fk_instance(SubDivision, "subdivision_id", clean_values(row.get("subdivision")))
-                    branch = get_fk_instance(Branch, "branch_id", clean_values(row.get("branch")))
-                    assign_to = get_fk_instance(Users, "user_id", clean_values(row.get("assign_to")))
-
-                    is_customer = str(clean_values(row.get("is_customer"))).lower() == "true"
-
-                    lead_type = "completed" if is_customer else clean_values(row.get("lead_type"))
-                    source = clean_values(row.get("source"))
-                    category = clean_values(row.get("category"))
-                    pan_vat = clean_values(row.get("pan_vat"))
-                    company_name = clean_values(row.get("company_name"))
-                    tentetive_visit_date = clean_values(row.get("tentetive_visit_date"))
-                    tentetive_purchase_date = clean_values(row.get("tentetive_purchase_date"))
-                    city = clean_values(row.get("city"))
-                    landmark = clean_values(row.get("landmark"))
-                    subbranch = clean_values(row.get("subbranch"))
-
-                    lead = Lead.objects.create(
-                        name = name,
-                        contact = contact,
-                        email = email,
-                        gender = gender,
-                        address = address,
-                        division = division,
-                        subdivision = subdivision,
-                        branch = branch,
-                        assign_to = assign_to,
-                        is_customer = is_customer,
-                        lead_type = lead_type,
-                        source = source,
-                        category = category,
-                        pan_vat = pan_vat,
-                        company_name = company_name,
-                        tentetive_visit_date = tentetive_visit_date,
-                        tentetive_purchase_date = tentetive_purchase_date,
-                        city = city,
-                        landmark = landmark,
-                        subbranch = subbranch,
-                        created_by = created_by_user,
-                        updated_by = created_by_user
-                    )
-                    
-                    followup_date = parsed_date(clean_values(row.get("followup_date")))
-                    followup_type = clean_values(row.get("followup_type"))
-                    followup_remarks = clean_values(row.get("followup_remarks"))
-                    followup = None
-                    if followup_date and followup_type and followup_remarks:
-                        followup = Followup.objects.create(
-                            lead = lead,
-                            followup_date = followup_date,
-                            followup_type = followup_type,
-                            followup_remarks = followup_remarks,
-                            entry_date = now(),
-                            user = created_by_user
-                        )
-                    
-                    remarks = clean_values(row.get("remarks"))
-                    lead_log = None
-                    if remarks:
-                        lead_log = LeadLog.objects.create(
-                            lead = lead,
-                            user = created_by_user,
-                            remarks = remarks,
-                            followup = followup,
-                            entry_date = now()
-                        )
-                    if assign_to:
-                        AssignToUser.objects.create(
-                            lead = lead,
-                            user = assign_to,
-                            created_at = now(),
-                        )
-                    
-                    result.append({"row": index, "success": True}, Safe=False, status=200)
-                
-            except Exception as e:
-                result.append({"row": index, "message": str(e)}, Safe=False)
-        return JsonResponse({"data":result, "message":"Leads imported successfully"}, safe=False, status=200)
+        return sendJson({"data":result, "message":"Leads imported successfully"})
     except Exception as e:
         print(e)
         return sendError(f"{e}")
     
 
+#Queues a lead file for the import workers (run_import_worker) and returns the job to poll
+@api_view(["POST"])
+def createimportjob(request):
+    token = decodeToken(request)
+    if token.get('error'):
+        return sendError(token.get("message"))
+    try:
+        file = request.FILES.get("file")
+        if not file:
+            return sendError("No file uploaded")
+        missing = missing_import_columns(read_import_header(file, file.name))
+        if missing:
+            return sendError(f"Column {missing[0]} not found in file")
+        job = ImportJob.objects.create(file=file, created_by_id=token.get("user_id"))
+        return sendSuccess(import_job_row(job), "Import queued")
+    except Exception as e:
+        print(e)
+        return sendError(f"{e}")
+
+
+@api_view(["GET"])
+def getimportjob(request, id):
+    token = decodeToken(request)
+    if token.get('error'):
+        return sendError(token.get("message"))
+    try:
+        job = ImportJob.objects.get(importjob_id=id, created_by_id=token.get("user_id"))
+        return sendSuccess(import_job_row(job), None)
+    except ImportJob.DoesNotExist:
+        return sendError("Import job not found.")
+    except Exception as e:
+        return sendError(f"{e}")
+
+
+#Rejected rows of an import as CSV, each with the reason it was rejected
+@api_view(["GET"])
+def importjoberrors(request, id):
+    token = decodeToken(request)
+    if token.get('error'):
+        return sendError(token.get("message"))
+    try:
+        job = ImportJob.objects.get(importjob_id=id, created_by_id=token.get("user_id"))
+        if not job.error_file:
+            return sendError("No rejected rows for this import.")
+        return FileResponse(job.error_file.open("rb"), as_attachment=True, filename=f"import_{job.pk}_errors.csv",
+                            content_type="text/csv")
+    except ImportJob.DoesNotExist:
+        return sendError("Import job not found.")
+    except Exception as e:
+        return sendError(f"{e}")
+
+
 #Apply lead filters while export leads
 def apply_lead_filters(queryset, params):
+    if q := params.get("q"):
+        queryset = search_leads(queryset, q)
     if name := params.get("name"):
         queryset = queryset.filter(name__icontains=name)
-    if contact := params.get("contact"):
-        queryset = queryset.filter(contact__icontains=contact)
+    if contact := normalize_phone(params.get("contact")):
+        queryset = queryset.filter(contact_normalized__startswith=contact)
     if email := params.get("email"):
         queryset = queryset.filter(email__icontains=email)
     if gender := params.get("gender"):
         queryset = queryset.filter(gender=gender)
     if lead_type := params.get("lead_type"):
-        queryset = queryset.filter(lead_type=lead_type)
+        queryset = queryset.filter(lead_type=normalize_lead_type(lead_type))
     if source := params.get("source"):
         queryset = queryset.filter(source__icontains=source)
     if category := params.get("category"):
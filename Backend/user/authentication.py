@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import BaseAuthentication
+
+from .models import Users
+from .revocation import is_revoked
+
+
+PRINCIPAL_GENERATION_KEY = "principal_generation"
+
+
+def generation_key(user_id=None):
+    return PRINCIPAL_GENERATION_KEY if user_id is None else f"{PRINCIPAL_GENERATION_KEY}:{user_id}"
+
+
+#Generation of the cached principals, of one user or (user_id=None) of the whole users table.
+#Kept in Django's cache: with a shared backend a bump reaches every process at once, with the
+#default per-process cache other processes pick the change up within PRINCIPAL_CACHE_TTL.
+def principal_generation(user_id=None):
+    key = generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+#Called when a user is saved or deleted: that user's cached principal is reloaded on its next use,
+#and the table-wide generation moves for caches built from every user (see services bootstrap)
+def invalidate_principals(user_id=None):
+    keys = [generation_key()] if user_id is None else [generation_key(user_id), generation_key()]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+#Process-local LRU of user_id -> (status, role_id, dealer_id), entries expire after a TTL
+class PrincipalCache:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id, generation):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            entry_generation, expires_at, principal = entry
+            if entry_generation != generation or expires_at < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return principal
+
+    def set(self, user_id, generation, principal):
+        with self.lock:
+            self.entries[user_id] = (generation, time.monotonic() + settings.PRINCIPAL_CACHE_TTL, principal)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > settings.PRINCIPAL_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+principals = PrincipalCache()
+
+
+#(status, role_id, dealer_id) of a user, from the cache or one query
+def load_principal(user_id):
+    generation = principal_generation(user_id)
+    principal = principals.get(user_id, generation)
+    if principal is None:
+        principal = Users.objects.filter(user_id=user_id).values_list("status", "role_id", "dealer_id").first()
+        if principal is None:
+            return None
+        principals.set(user_id, generation, principal)
+    return principal
+
+
+#Verifies the bearer token of an authorization header and resolves its principal.
+#Returns the token dict the views read, or {"error": True, "message": ...}.
+def resolve_principal(auth_header):
+    try:
+        if not auth_header:
+            return {"error": True, "message": "Authorization header missing"}
+
+        token_parts = auth_header.split(" ")
+        if len(token_parts) != 2 or token_parts[0] != "Bearer":
+            return {"error": True, "message": "Invalid authorization format"}
+
+        decoded = jwt.decode(
+            token_parts[1],
+            settings.SECRET_KEY,
+            algorithms=[settings.JWT_ALGORITHM]
+        )
+
+        user_id = decoded.get("user_id")
+        if not user_id:
+            return {"error": True, "message": "Invalid token: missing user_id"}
+        if is_revoked(decoded.get("jti")):
+            return {"error": True, "message": "Session expired. Please login again"}
+
+        principal = load_principal(int(user_id))
+        if principal is None:
+            return {"error": True, "message": "User not found. Please login again."}
+        user_status, role_id, dealer_id = principal
+
+        return {
+            "user_id": user_id,
+            "role": role_id,
+            "dealer_id": dealer_id,
+            "status": user_status,
+            "exp": decoded.get("exp"),
+            "jti": decoded.get("jti"),
+        }
+
+    except jwt.ExpiredSignatureError:
+        return {"error": True, "message": "Session expired. Please login again"}
+    except jwt.InvalidTokenError:
+        return {"error": True, "message": "Invalid token. Please login again"}
+    except Exception as e:
+        print(f"Token decode error: {str(e)}")
+        return {"error": True, "message": "Authentication failed. Please login again"}
+
+
+#Principal of a request, resolved once and kept on the underlying HttpRequest
+def authenticate_request(request):
+    http_request = getattr(request, "_request", request)
+    principal = getattr(http_request, "_principal", None)
+    if principal is None:
+        principal = resolve_principal(http_request.META.get("HTTP_AUTHORIZATION", ""))
+        http_request._principal = principal
+    return principal
+
+
+class AuthenticatedPrincipal:
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, principal):
+        self.user_id = int(principal["user_id"])
+        self.role_id = principal["role"]
+        self.dealer_id = principal["dealer_id"]
+        self.status = principal["status"]
+
+    @property
+    def pk(self):
+        return self.user_id
+
+
+#DRF authentication for every api_view. A bad or missing token leaves the request anonymous
+#instead of failing it, so views keep answering through sendError with the token's message.
+class JWTAuthentication(BaseAuthentication):
+    def authenticate(self, request):
+        principal = authenticate_request(request)
+        if principal.get("error"):
+            return None
+        return AuthenticatedPrincipal(principal), principal
+
+    def authenticate_header(self, request):
+        return "Bearer"
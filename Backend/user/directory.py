@@ -0,0 +1,79 @@
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+
+from .models import Users
+from .refdata import reference_rows, reference_version
+
+
+USER_PAGE_SIZE = 50
+
+#role_id -> (roles version, subordinate role ids)
+_subordinates = {}
+
+
+#Roles below a role in the hierarchy: never the admin role (1), only roles numbered after
+#the viewer's own and below 1000. Worked out from the cached roles table, once per roles version.
+def subordinate_role_ids(role_id):
+    role_id = int(role_id)
+    version = reference_version("roles")
+    cached = _subordinates.get(role_id)
+    if cached is None or cached[0] != version:
+        role_ids = [
+            role.role_id for role in reference_rows("roles")
+            if role.role_id != 1 and role_id < role.role_id < 1000
+        ]
+        cached = _subordinates[role_id] = (version, role_ids)
+    return cached[1]
+
+
+#Users a role may see in the directory, as allusers lists them
+def subordinate_users(role_id):
+    return Users.objects.select_related("role", "dealer").filter(
+        role_id__in=subordinate_role_ids(role_id)
+    ).order_by("user_id")
+
+
+#q= matches name or email anywhere, or the start of the contact number
+def search_users(users, q):
+    match = Q(full_name__icontains=q) | Q(email__icontains=q)
+    if q.isdigit():
+        match |= Q(contact__startswith=q)
+    return users.filter(match)
+
+
+#Pages the directory when page= or limit= is given, otherwise the whole list is returned
+def paginate_users(users, params):
+    if "page" not in params and "limit" not in params:
+        return list(users), {}
+
+    paginator = Paginator(users, params.get("limit", USER_PAGE_SIZE))
+    page = params.get("page", 1)
+    try:
+        users_page = paginator.page(page)
+    except PageNotAnInteger:
+        users_page = paginator.page(1)
+    except EmptyPage:
+        users_page = []
+    return users_page, {
+        'total_pages': paginator.num_pages,
+        'total_users': paginator.count,
+        'current_page': int(page) if str(page).isdigit() else 1,
+    }
+
+
+#Row of allusers, also part of the bootstrap response
+def directory_row(user):
+    return {
+        "user_id": user.user_id,
+        "full_name": user.full_name,
+        "email": user.email,
+        "contact_no": user.contact,
+        "is_active": user.status,
+        "date_joined": user.date_joined,
+        "dealer_id": user.dealer.dealer_id if user.dealer else None,
+        "dealer_name": user.dealer.name if user.dealer else None,
+        "role": {
+            "role_id": user.role.role_id,
+            "role_name": user.role.role_name,
+        },
+    }
@@ -1,19 +1,37 @@
 import datetime
+import uuid
 import jwt
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework.status import *
 from django.conf import settings
+from .renderers import render_json
+from .authentication import authenticate_request
+
+
+def sendJson(data, status=HTTP_200_OK):
+    return HttpResponse(render_json(data), content_type="application/json", status=status)
 
 
 def sendSuccess(data=None, message=None):
-    return JsonResponse(
+    return sendJson(
         {"success": True, "data": data, "message": message}, status=HTTP_200_OK
     )
 
 
+#Same body as sendSuccess, with the data list encoded and sent a row at a time
+def streamSuccess(rows, message=None):
+    def body():
+        yield b'{"success": true, "data": ['
+        for i, row in enumerate(rows):
+            yield (b"," if i else b"") + render_json(row)
+        yield b'], "message": ' + render_json(message) + b"}"
+
+    return StreamingHttpResponse(body(), content_type="application/json", status=HTTP_200_OK)
+
+
 def sendError(message=None):
-    return JsonResponse(
+    return sendJson(
         {"success": False, "message": message}, status=HTTP_400_BAD_REQUEST
     )
 
@@ -23,6 +41,7 @@ def createToken(user):
         "user_id": str(user.user_id),
         "role": user.role.role_id,
         "role_name":user.role.role_name,
+        "jti": uuid.uuid4().hex,
         "exp": datetime.datetime.now(datetime.timezone.utc)
         + datetime.timedelta(minutes=60*8),
     }
@@ -30,36 +49,7 @@ def createToken(user):
     return token
 
 
+#Token dict of a request: user_id, role, dealer_id, status, exp and jti, or error and message.
+#Resolved once per request by user.authentication.JWTAuthentication.
 def decodeToken(request):
-    try:
-        auth_header = request.META.get("HTTP_AUTHORIZATION", "")
-        if not auth_header:
-            return {"error": True, "message": "Authorization header missing"}
-
-        parts = auth_header.split(" ")
-        if len(parts) != 2 or parts[0].lower() != "bearer":
-            return {"error": True, "message": "Invalid authorization header format"}
-
-        token = parts[1]
-        decoded = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
-        )
-
-        user_id = decoded.get("user_id")
-        role = decoded.get("role")
-        exp = decoded.get("exp")
-
-        return {
-            "user_id": user_id,
-            "role": role,
-            "exp": exp,
-        }
-
-    except jwt.ExpiredSignatureError:
-        return {"error": True, "message": "Token has expired. Please relogin"}
-    except jwt.InvalidTokenError:
-        return {"error": True, "message": "Invalid Token.Please Relogin"}
-    except Exception as e:
-        return {"error": True, "message": "Token Error.Please Relogin"}
-
-
+    return authenticate_request(request)
@@ -66,5 +66,13 @@ class Users(models.Model):
         return self.full_name
 
 
+# >>>>>> Revoked tokens, see user/revocation.py
+class RevokedToken(models.Model):
+    revoked_token_id = models.AutoField(primary_key=True, editable=False)
+    jti = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(Users, on_delete=models.CASCADE, null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
-
+    def __str__(self):
+        return self.jti
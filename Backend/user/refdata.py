@@ -0,0 +1,100 @@
+import copy
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+
+#Near-static tables served from memory: name -> (model, primary key)
+REFERENCE_TABLES = {
+    "divisions": ("services.Division", "division_id"),
+    "subdivisions": ("services.SubDivision", "subdivision_id"),
+    "branches": ("services.Branch", "branch_id"),
+    "roles": ("user.Role", "role_id"),
+    "dealers": ("user.Dealer", "dealer_id"),
+}
+
+#table -> (version, loaded_at, rows ordered by pk, rows by pk)
+_tables = {}
+
+
+def version_key(table):
+    return f"refdata_version:{table}"
+
+
+#Version stamp of a table, kept in Django's cache so every process sharing it sees a bump
+def reference_version(table):
+    version = cache.get(version_key(table))
+    if version is None:
+        cache.add(version_key(table), time.time_ns(), None)
+        version = cache.get(version_key(table))
+    return version
+
+
+#Called from the save/delete signals of the reference models
+def invalidate_reference(table):
+    try:
+        cache.incr(version_key(table))
+    except ValueError:
+        cache.set(version_key(table), time.time_ns(), None)
+
+
+def _load(table, version, fresh=False):
+    shared_key = f"refdata_rows:{table}:{version}"
+    rows = cache.get(shared_key) if settings.REFERENCE_CACHE_SHARED and not fresh else None
+    if rows is None:
+        model, pk = REFERENCE_TABLES[table]
+        rows = list(apps.get_model(model).objects.order_by(pk))
+        if settings.REFERENCE_CACHE_SHARED:
+            cache.set(shared_key, rows, settings.REFERENCE_CACHE_TTL)
+    pk = REFERENCE_TABLES[table][1]
+    entry = (version, time.monotonic(), rows, {getattr(row, pk): row for row in rows})
+    _tables[table] = entry
+    return entry
+
+
+#Loaded table, reloaded when its version moved or the local copy outlived REFERENCE_CACHE_TTL
+def _entry(table):
+    version = reference_version(table)
+    entry = _tables.get(table)
+    if entry is None or entry[0] != version or time.monotonic() - entry[1] > settings.REFERENCE_CACHE_TTL:
+        entry = _load(table, version)
+    return entry
+
+
+#All rows of a reference table ordered by primary key. The instances are shared, do not modify them.
+def reference_rows(table):
+    return _entry(table)[2]
+
+
+#One row by primary key or None. A copy is returned so it can be assigned to a foreign key safely.
+def reference_get(table, pk):
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    row = _entry(table)[3].get(pk)
+    if row is None and resolve_reference_ids(table, [pk]):
+        row = _tables[table][3].get(pk)
+    return copy.copy(row) if row is not None else None
+
+
+#The primary keys among pks that exist, for ids missing from the loaded copy. Without a shared
+#cache a row written by another process is not in this copy until the TTL runs out, so the
+#database is asked before an id is reported missing, and the table is reloaded when it has any.
+def resolve_reference_ids(table, pks):
+    model, pk = REFERENCE_TABLES[table]
+    found = set(apps.get_model(model).objects.filter(pk__in=pks).values_list(pk, flat=True))
+    if found:
+        _load(table, reference_version(table), fresh=True)
+    return found
+
+
+#Reference table of a model, or None when the model is not cached
+def reference_table(model):
+    label = model._meta.label
+    for table, (model_label, pk) in REFERENCE_TABLES.items():
+        if model_label == label:
+            return table
+    return None
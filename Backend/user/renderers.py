@@ -0,0 +1,34 @@
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+#The stdlib encoder, same output JsonResponse gives
+def stdlib_dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+#orjson encodes datetimes, dates and UUIDs natively (datetimes keep their microseconds);
+#Decimals, durations and lazy strings fall back to DjangoJSONEncoder
+def orjson_dumps(data):
+    return orjson.dumps(data, default=DjangoJSONEncoder().default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+@lru_cache(maxsize=None)
+def get_renderer(path):
+    if path:
+        return import_string(path)
+    return orjson_dumps if orjson is not None else stdlib_dumps
+
+
+#Encodes a response body with settings.JSON_RENDERER, or orjson when it is installed
+def render_json(data):
+    return get_renderer(getattr(settings, "JSON_RENDERER", None))(data)
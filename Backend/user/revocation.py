@@ -0,0 +1,73 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+
+from .models import RevokedToken
+
+
+#In-memory set of revoked token ids. Each process reads the revocation table at most once every
+#REVOCATION_REFRESH_SECONDS and then only the rows revoked since its watermark, so checking a
+#token never touches the database. Rows are re-read for a short overlap behind the watermark
+#because a revocation can commit after a later one was already seen.
+class RevocationSet:
+    overlap = timedelta(seconds=30)
+
+    def __init__(self):
+        self.revoked = {}
+        self.watermark = None
+        self.refreshed_at = None
+        self.lock = threading.Lock()
+
+    def refresh(self, force=False):
+        with self.lock:
+            if not force and self.refreshed_at is not None and \
+                    time.monotonic() - self.refreshed_at < settings.REVOCATION_REFRESH_SECONDS:
+                return
+            now = datetime.now(timezone.utc)
+            rows = RevokedToken.objects.filter(expires_at__gt=now)
+            if self.watermark is not None:
+                rows = rows.filter(revoked_at__gte=self.watermark - self.overlap)
+            for jti, expires_at, revoked_at in rows.values_list("jti", "expires_at", "revoked_at"):
+                self.revoked[jti] = expires_at
+                if self.watermark is None or revoked_at > self.watermark:
+                    self.watermark = revoked_at
+            if self.watermark is None:
+                self.watermark = now
+            # expired tokens fail signature checks anyway
+            self.revoked = {jti: expires_at for jti, expires_at in self.revoked.items() if expires_at > now}
+            self.refreshed_at = time.monotonic()
+
+    def add(self, jti, expires_at):
+        with self.lock:
+            self.revoked[jti] = expires_at
+
+    def __contains__(self, jti):
+        self.refresh()
+        return jti in self.revoked
+
+    def reset(self):
+        with self.lock:
+            self.revoked = {}
+            self.watermark = None
+            self.refreshed_at = None
+
+
+revoked_tokens = RevocationSet()
+
+
+def is_revoked(jti):
+    return bool(jti) and jti in revoked_tokens
+
+
+#Revokes a decoded token; this process rejects it at once, the others on their next refresh
+def revoke_token(decoded, user_id=None):
+    jti = decoded.get("jti")
+    if not jti:
+        return False
+    expires_at = datetime.fromtimestamp(decoded["exp"], tz=timezone.utc)
+    RevokedToken.objects.get_or_create(jti=jti, defaults={"user_id": user_id, "expires_at": expires_at})
+    RevokedToken.objects.filter(expires_at__lt=datetime.now(timezone.utc)).delete()
+    revoked_tokens.add(jti, expires_at)
+    return True
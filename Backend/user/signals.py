@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_principals
+from .models import Dealer, Role, Users
+from .refdata import invalidate_reference
+
+
+#Roles and dealers are served from the reference cache, writes invalidate it
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_roles(sender, **kwargs):
+    invalidate_reference("roles")
+
+
+@receiver([post_save, post_delete], sender=Dealer)
+def invalidate_dealers(sender, **kwargs):
+    invalidate_reference("dealers")
+
+
+#Status, role and dealer of a user are cached for authentication
+@receiver([post_save, post_delete], sender=Users)
+def invalidate_user_principals(sender, instance, **kwargs):
+    invalidate_principals(instance.user_id)
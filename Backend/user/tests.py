@@ -1,3 +1,213 @@
-from django.test import TestCase
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import skipIf
 
-# Create your tests here.
+import jwt
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .authentication import JWTAuthentication, principals
+from .essentials import createToken, decodeToken, sendError, sendSuccess
+from .models import Dealer, RevokedToken, Role, Users
+from .renderers import orjson, orjson_dumps, stdlib_dumps
+from .revocation import revoked_tokens
+
+
+class RendererTests(SimpleTestCase):
+    payload = {
+        "data": [{"lead_id": 1, "name": "Ramesh", "created_at": datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+                  "amount": Decimal("12.50"), "followup": [], "branch": None}],
+        "message": "ok",
+    }
+
+    @skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_matches_stdlib_output(self):
+        self.assertEqual(json.loads(orjson_dumps(self.payload)), json.loads(stdlib_dumps(self.payload)))
+
+    @override_settings(JSON_RENDERER="user.renderers.stdlib_dumps")
+    def test_renderer_is_pluggable(self):
+        response = sendSuccess({"n": 1}, "done")
+        self.assertEqual(response.content, b'{"success": true, "data": {"n": 1}, "message": "done"}')
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    def test_send_error(self):
+        response = sendError("nope")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {"success": False, "message": "nope"})
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_json", iterations=1, stdout=out)
+        self.assertIn("us/encode", out.getvalue())
+
+
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.role = Role.objects.create(role_name="admin")
+        user = Users.objects.create(full_name="Tester", contact=9800000000, password="secret",
+                                    role=self.role, gender="male", status="active")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {createToken(user)}")
+
+    def test_roles_and_dealers_are_cached_until_written(self):
+        self.assertEqual(len(self.client.get("/api/user/allroles").json()["data"]), 1)
+        with self.assertNumQueries(0):
+            self.client.get("/api/user/allroles")
+
+        Role.objects.create(role_name="sales")
+        Dealer.objects.create(name="Everest Traders", contact=9800000001, status="active")
+        self.assertEqual([r["role_name"] for r in self.client.get("/api/user/allroles").json()["data"]], ["admin", "sales"])
+        self.assertEqual([d["name"] for d in self.client.get("/api/user/getdealers").json()["data"]], ["Everest Traders"])
+
+
+class AuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        principals.clear()
+        self.enterContext(override_settings(REVOCATION_REFRESH_SECONDS=3600))
+        revoked_tokens.refresh(force=True)
+        self.role = Role.objects.create(role_name="admin")
+        self.user = Users.objects.create(full_name="Tester", contact=9800000000, password="secret",
+                                         role=self.role, gender="male", status="active")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {createToken(self.user)}")
+
+    def test_principal_is_cached_across_requests(self):
+        with self.assertNumQueries(1):
+            body = self.client.get("/api/user/checktoken").json()
+        self.assertEqual(body["user_id"], str(self.user.user_id))
+        with self.assertNumQueries(0):
+            self.client.get("/api/user/checktoken")
+
+    def test_user_save_invalidates(self):
+        self.client.get("/api/user/checktoken")
+        self.user.role = Role.objects.create(role_name="sales")
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.client.get("/api/user/checktoken")
+
+        self.user.delete()
+        body = self.client.get("/api/user/checktoken").json()
+        self.assertEqual(body["message"], "User not found. Please login again.")
+
+    def test_invalidation_is_per_user(self):
+        self.client.get("/api/user/checktoken")
+        other = Users.objects.create(full_name="Other", contact=9800000001, password="secret",
+                                     role=self.role, gender="female", status="active")
+        other.status = "inactive"
+        other.save()
+        with self.assertNumQueries(0):
+            self.client.get("/api/user/checktoken")
+
+    @override_settings(PRINCIPAL_CACHE_TTL=0)
+    def test_entries_expire_after_the_ttl(self):
+        # a change made through another process reaches this one once the entry expires
+        self.client.get("/api/user/checktoken")
+        with self.assertNumQueries(1):
+            self.client.get("/api/user/checktoken")
+
+    def test_token_errors_keep_their_messages(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get("/api/user/checktoken").json()["message"], "Authorization header missing")
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer nonsense")
+        self.assertEqual(self.client.get("/api/user/checktoken").json()["message"], "Invalid token. Please login again")
+
+    def test_drf_request_carries_the_principal(self):
+        http_request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {createToken(self.user)}")
+        request = Request(http_request, authenticators=[JWTAuthentication()])
+        self.assertEqual(request.user.user_id, self.user.user_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(decodeToken(request)["role"], self.role.role_id)
+
+
+class RevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        revoked_tokens.reset()
+        role = Role.objects.create(role_name="admin")
+        self.user = Users.objects.create(full_name="Tester", contact=9800000000, password="secret",
+                                         role=role, gender="male", status="active")
+        self.token = createToken(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+    def test_logout_revokes_the_token(self):
+        self.assertFalse(self.client.get("/api/user/checktoken").json()["expired"])
+        self.client.post("/api/user/logout", {"user_id": self.user.user_id})
+        self.assertTrue(RevokedToken.objects.filter(user=self.user).exists())
+        self.assertTrue(self.client.get("/api/user/checktoken").json()["expired"])
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {createToken(self.user)}")
+        self.assertFalse(self.client.get("/api/user/checktoken").json()["expired"])
+
+    @override_settings(REVOCATION_REFRESH_SECONDS=0)
+    def test_revocations_from_other_processes_are_picked_up_by_watermark(self):
+        self.assertFalse(self.client.get("/api/user/checktoken").json()["expired"])
+        # written by another worker, this process only learns of it through the refresh
+        jti = jwt.decode(self.token, options={"verify_signature": False})["jti"]
+        RevokedToken.objects.create(jti=jti, user=self.user, expires_at=datetime(2100, 1, 1, tzinfo=timezone.utc))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(self.client.get("/api/user/checktoken").json()["expired"])
+        self.assertIn('"user_revokedtoken"."revoked_at" >=', ctx.captured_queries[0]["sql"])
+
+    def test_checks_are_in_memory_between_refreshes(self):
+        self.client.get("/api/user/checktoken")
+        with override_settings(REVOCATION_REFRESH_SECONDS=3600), self.assertNumQueries(0):
+            self.client.get("/api/user/checktoken")
+
+
+class DirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        principals.clear()
+        self.enterContext(override_settings(REVOCATION_REFRESH_SECONDS=3600))
+        revoked_tokens.refresh(force=True)
+        admin = Role.objects.create(role_id=1, role_name="admin")
+        manager = Role.objects.create(role_id=2, role_name="manager")
+        staff = Role.objects.create(role_id=3, role_name="staff")
+        dealer = Dealer.objects.create(name="Everest Traders", contact=9800000001, status="active")
+        Users.objects.create(full_name="Admin", contact=9800000000, password="secret", role=admin, gender="male")
+        self.manager = Users.objects.create(full_name="Manager", contact=9800000002, password="secret",
+                                            role=manager, gender="male")
+        Users.objects.create(full_name="Other Manager", contact=9800000003, password="secret", role=manager, gender="male")
+        for n in range(12):
+            Users.objects.create(full_name=f"Staff {n}", email=f"staff{n}@example.com", contact=9810000000 + n,
+                                 password="secret", role=staff, dealer=dealer, gender="female")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {createToken(self.manager)}")
+
+    def test_allusers_lists_roles_below_the_viewer(self):
+        data = self.client.get("/api/user/allusers").json()["data"]
+        self.assertEqual(len(data), 12)
+        self.assertEqual({row["role"]["role_name"] for row in data}, {"staff"})
+        self.assertEqual(data[0]["dealer_name"], "Everest Traders")
+
+    def test_allusers_query_count_is_flat(self):
+        self.client.get("/api/user/allusers")
+        with self.assertNumQueries(1):
+            self.client.get("/api/user/allusers")
+
+    def test_search_and_pagination(self):
+        body = self.client.get("/api/user/allusers", {"q": "staff1", "page": 1, "limit": 2}).json()
+        self.assertEqual([row["full_name"] for row in body["data"]], ["Staff 1", "Staff 10"])
+        self.assertEqual((body["total_users"], body["total_pages"]), (3, 2))
+        self.assertEqual(len(self.client.get("/api/user/allusers", {"q": "981000000"}).json()["data"]), 10)
+
+        body = self.client.get("/api/user/getusers", {"page": 2, "limit": 10}).json()
+        self.assertEqual((len(body["data"]), body["total_users"]), (5, 15))
+        with self.assertNumQueries(1):
+            self.client.get("/api/user/getusers")
+
+    def test_role_changes_reach_the_hierarchy(self):
+        self.client.get("/api/user/allusers")
+        Role.objects.create(role_id=4, role_name="intern")
+        Users.objects.create(full_name="Intern", contact=9820000000, password="secret", role_id=4, gender="male")
+        self.assertEqual(len(self.client.get("/api/user/allusers").json()["data"]), 13)
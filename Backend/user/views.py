@@ -1,8 +1,10 @@
 import os
-from django.http import JsonResponse
 from rest_framework.decorators import api_view
 from user.serializers import AdminSerializer
 from .essentials import *
+from .refdata import reference_get, reference_rows
+from .revocation import revoke_token
+from .directory import directory_row, paginate_users, search_users, subordinate_users
 from .models import Users
 from .serializers import *
 from django.contrib.auth.hashers import make_password
@@ -36,31 +38,32 @@ def createDealer(request):
     except Exception as e:
         return sendError(str(e))
 
+#Rows of getDealers, also part of the bootstrap response
+def dealer_rows():
+    return [
+        {
+            "dealer_id": dealer.dealer_id,
+            "name": dealer.name,
+            "email": dealer.email,
+            "contact": dealer.contact,
+            "address": dealer.address,
+            "city": dealer.city,
+            "landmark": dealer.landmark,
+            "state": dealer.state,
+            "pincode": dealer.pincode,
+            "country": dealer.country,
+            "status": dealer.status,
+        } for dealer in reference_rows("dealers")
+    ]
+
+
 @api_view(["GET"])
 def getDealers(request):
     token = decodeToken(request)
     if token.get("error"):
         return sendError(token.get("message"))
     try:
-        dealers = Dealer.objects.all()
-        dealer_list = []
-        for dealer in dealers:
-            dealer_list.append(
-                {
-                    "dealer_id": dealer.dealer_id,
-                    "name": dealer.name,
-                    "email": dealer.email,
-                    "contact": dealer.contact,
-                    "address": dealer.address,
-                    "city": dealer.city,
-                    "landmark": dealer.landmark,
-                    "state": dealer.state,
-                    "pincode": dealer.pincode,
-                    "country": dealer.country,
-                    "status": dealer.status,
-                }
-            )
-        return sendSuccess(dealer_list, None)
+        return sendSuccess(dealer_rows(), None)
     except Exception as e:
         return sendError(str(e))
 
@@ -143,54 +146,8 @@ def deleteDealer(request, id):
 def checkToken(request):
     token_data = decodeToken(request)
     if token_data.get("error"):
-        return JsonResponse({"expired": True, "message": token_data.get("message"),"status": status.HTTP_400_BAD_REQUEST})
-    return JsonResponse({"expired": False, "user_id": token_data.get("user_id"), "status": status.HTTP_200_OK})
-
-def decodeToken(request):
-    try:
-        auth_header = request.META.get("HTTP_AUTHORIZATION", "")
-        if not auth_header:
-            return {"error": True, "message": "Authorization header missing"}
-        
-        token_parts = auth_header.split(" ")
-        if len(token_parts) != 2 or token_parts[0] != "Bearer":
-            return {"error": True, "message": "Invalid authorization format"}
-        
-        token = token_parts[1]
-        
-        decoded = jwt.decode(
-            token, 
-            settings.SECRET_KEY, 
-            algorithms=[settings.JWT_ALGORITHM] 
-        )
-        
-        user_id = decoded.get("user_id")
-        if not user_id:
-            return {"error": True, "message": "Invalid token: missing user_id"}
-        
-        user = Users.objects.filter(user_id=user_id)
-        if not user.exists():
-            return {"error": True, "message": "User not found. Please login again."}
-        
-        # Extract other token data
-        role = decoded.get("role")
-        exp = decoded.get("exp")
-        
-        return {
-            "user_id": user_id, 
-            "role": role, 
-            "exp": exp,
-            "user": user.first()  # Include user object if needed
-        }
-        
-    except jwt.ExpiredSignatureError:
-        return {"error": True, "message": "Session expired. Please login again"}
-    except jwt.InvalidTokenError:
-        return {"error": True, "message": "Invalid token. Please login again"}
-    except Exception as e:
-        # Log the actual error for debugging
-        print(f"Token decode error: {str(e)}")
-        return {"error": True, "message": "Authentication failed. Please login again"}
+        return sendJson({"expired": True, "message": token_data.get("message"),"status": status.HTTP_400_BAD_REQUEST})
+    return sendJson({"expired": False, "user_id": token_data.get("user_id"), "status": status.HTTP_200_OK})
 
 
 # admin login
@@ -200,7 +157,7 @@ def adminLogin(request):
         data = request.data
         success, token, user_details = AdminSerializer.login(data)
         if success:
-            return JsonResponse(
+            return sendJson(
                 {
                     "token": token,
                     "message": "Login Successfully",
@@ -209,13 +166,13 @@ def adminLogin(request):
                     "status": status.HTTP_200_OK,
                 }
             )
-        return JsonResponse(
+        return sendJson(
             {"success": False, "message": "Credentials do not match"},
             status=status.HTTP_401_UNAUTHORIZED,
         )
     except Exception as e:
         print(f"{e}")
-        return JsonResponse(
+        return sendJson(
             {"success": False, "message": "An error occurred"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
@@ -232,6 +189,10 @@ def logout(request):
         user = Users.objects.get(user_id=user_id)
         user.status = "inactive"
         user.save()
+        # the presented token stops working everywhere within REVOCATION_REFRESH_SECONDS
+        token = decodeToken(request)
+        if not token.get("error"):
+            revoke_token(token, user_id=user.user_id)
         return sendSuccess(None, "Logout successful.")
     except Users.DoesNotExist:
         return sendError("No User Found with the provided ID.")
@@ -284,34 +245,37 @@ def updateuser(request, id):
         print(f"Update error: {e}")
         return sendError(str(e))
 
+#Row of get_users
+def user_row(user):
+    return {
+        "user_id": user.user_id,
+        "full_name": user.full_name,
+        "email": user.email,
+        "contact": user.contact,
+        "is_active": user.status,
+        "date_joined": user.date_joined,
+        "image": user.image.url if user.image else None,
+        "gender": user.gender,
+        "country": user.country,
+        "status": user.status,
+        "role_id": user.role.role_id,
+        "role_name": user.role.role_name,
+        "dealer_id": user.dealer.dealer_id if user.dealer else None,
+        "dealer_name": user.dealer.name if user.dealer else None,
+    }
+
+
 @api_view(["GET"])
 def get_users(request):
     token = decodeToken(request)
     if token.get("error"):
         return sendError(token.get("message"))
     try:
-        users = Users.objects.all()
-        user_list = []
-        for user in users:
-            user_list.append(
-                     {
-                      "user_id": user.user_id,
-                     "full_name": user.full_name,
-                     "email": user.email,
-                     "contact": user.contact,
-                     "is_active": user.status,
-                     "date_joined": user.date_joined,
-                     "image": user.image.url if user.image else None,
-                     "gender": user.gender,
-                     "country": user.country,
-                     "status": user.status,
-                     "role_id": user.role.role_id,
-                     "role_name": user.role.role_name,
-                     "dealer_id": user.dealer.dealer_id if user.dealer else None,
-                     "dealer_name": user.dealer.name if user.dealer else None,
-                                 }
-            )
-        return sendSuccess(user_list, None)
+        users = Users.objects.select_related("role", "dealer").order_by("user_id")
+        if q := request.GET.get("q"):
+            users = search_users(users, q)
+        users_page, meta = paginate_users(users, request.GET)
+        return sendJson({"success": True, "data": [user_row(user) for user in users_page], "message": None, **meta})
     except Exception as e:
         return sendError(str(e))
 
@@ -349,51 +313,35 @@ def allusers(request):
     if token.get("error"):
         return sendError(token.get("message"))
     try:
-        users = Users.objects.all()
-        getuser = Users.objects.get(user_id=token["user_id"])
-        user_list = []
-        for user in users:
-            if user.role.role_id != 1:
-                if token["user_id"] != user.user_id:
-                    if user.role.role_id > getuser.role.role_id:
-                        if user.role.role_id < 1000:
-                            user_list.append(
-                                {
-                                    "user_id": user.user_id,
-                                    "full_name": user.full_name,
-                                    "email": user.email,
-                                    "contact_no": user.contact,
-                                    "is_active": user.status,
-                                    "date_joined": user.date_joined,
-                                    "dealer_id": user.dealer.dealer_id if user.dealer else None,
-                                    "dealer_name": user.dealer.name if user.dealer else None,
-                                    "role": {
-                                        "role_id": user.role.role_id,
-                                        "role_name": user.role.role_name,
-                                    },
-                                }
-                            )
-        return sendSuccess(user_list, None)
+        users = subordinate_users(token["role"])
+        if q := request.GET.get("q"):
+            users = search_users(users, q)
+        users_page, meta = paginate_users(users, request.GET)
+        return sendJson({"success": True, "data": [directory_row(user) for user in users_page], "message": None, **meta})
 
     except Exception as e:
         return sendError(f"{e}")
 
 
+#Rows of allroles, also part of the bootstrap response
+def role_rows(roles=None):
+    return [
+        {"role_id": role.role_id, "role_name": role.role_name,
+         "created_at": role.created_at, "updated_at": role.updated_at}
+        for role in (reference_rows("roles") if roles is None else roles)
+    ]
+
+
 # for all roles
 @api_view(["GET"])
 def allroles(request):
     try:
         role = request.data.get("role_id")
         if role:
-            roles = Role.objects.filter(role=role.role_id)
+            roles = [r for r in [reference_get("roles", role)] if r is not None]
         else:
-            roles = Role.objects.all()
-        getRoleList = []
-        for role in roles:
-            role_list = {"role_id": role.role_id, "role_name": role.role_name,
-            "created_at": role.created_at, "updated_at": role.updated_at}
-            getRoleList.append(role_list)
-        return sendSuccess(getRoleList, None)
+            roles = None
+        return sendSuccess(role_rows(roles), None)
 
     except Exception as e:
         return sendError(f"{e}")